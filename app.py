@@ -1,8 +1,7 @@
+import json
 import os
-import tempfile
-import uuid
+import time
 import numpy as np
-from PIL import Image
 import streamlit as st
 import torch
 
@@ -14,33 +13,96 @@ os.environ["STREAMLIT_DISABLE_FILE_WATCHER"] = "true"
 # Additional PyTorch path fix
 torch.classes.__path__ = []
 
-from ultralytics import SAM
 from package import (
-    pick_wall_point,
-    save_image,
-    save_image_with_point,
-    draw_result_on_image,
-    draw_points,
-    connect_points,
+    ArtifactStore,
+    Frame,
+    commands_csv,
+    StageCache,
+    StageScheduler,
+    WallPipeline,
+    registry,
+    tracing,
+    warm_up,
 )
 
 SAM_WEIGHTS = "sam2_t.pt"
+DEPTH_MODEL = "Intel/zoedepth-nyu"
+
+
+@st.cache_resource(show_spinner="🔥 Loading models...")
+def warm_up_models():
+    """Load Segformer and SAM once per process, before the first upload"""
+    return warm_up(sam_weights=SAM_WEIGHTS)
+
+
+@st.cache_resource
+def get_stage_cache():
+    """Step results shared across reruns and sessions, keyed by image hash and parameters"""
+    return StageCache()
+
+
+@st.cache_resource
+def get_artifact_store():
+    """On-disk, size-bounded copy of the step results that survives restarts"""
+    return ArtifactStore()
+
+
+def show_model_stats():
+    with st.sidebar.expander("🧠 Loaded models"):
+        for stat in registry.stats():
+            st.markdown(
+                f"**{stat['slot']}** `{stat['key']}`  \n"
+                f"⏱️ {stat['load_seconds']}s · "
+                f"💾 {stat['param_mb']} MB params · "
+                f"{stat['rss_delta_mb']} MB RSS")
+    with st.sidebar.expander("💽 Result cache"):
+        mem = get_stage_cache().stats()
+        disk = get_artifact_store().stats()
+        st.markdown(
+            f"**memory** {mem['entries']} entries · "
+            f"{mem['hits']} hits / {mem['misses']} misses  \n"
+            f"**disk** {disk['entries']} entries · "
+            f"{disk['bytes'] / 2**20:.1f} / {disk['max_bytes'] / 2**20:.0f} MB · "
+            f"{disk['hits']} hits / {disk['misses']} misses · "
+            f"{disk['evictions']} evicted")
+
+def show_trace(trace_id):
+    """Per-stage timings of one run, plus its Chrome trace for chrome://tracing or Perfetto"""
+    if not tracing.enabled():
+        return
+    summary = tracing.summary(trace_id)
+    with st.expander("⏱️ Trace"):
+        st.dataframe({"span": list(summary["spans"]),
+                      "count": [s["count"] for s in summary["spans"].values()],
+                      "total ms": [s["total_ms"] for s in summary["spans"].values()],
+                      "max ms": [s["max_ms"] for s in summary["spans"].values()]},
+                     use_container_width=True)
+        for name, c in summary["counters"].items():
+            st.caption(f"{name}: {c['last']} (max {c['max']})")
+        st.download_button("⬇️ Download trace.json",
+                           json.dumps(tracing.chrome_trace(trace_id), default=str),
+                           file_name="trace.json", mime="application/json")
+
 
 def initialize_drone():
     """Initialize drone connection and store in session state"""
     if 'drone_instance' not in st.session_state:
         try:
-            from djitellopy import Tello
-            
-            # Create drone instance
-            drone = Tello()
-            drone.RESPONSE_TIMEOUT = 5  # Increase timeout for stability
+            from services.backends import TelloBackend, create_backend
+            from services.telemetry import TelemetryCache
+
+            # Create drone instance (DRONE_BACKEND=sim runs the simulator)
+            drone = create_backend()
+            if isinstance(drone, TelloBackend):
+                drone.response_timeout = 5  # Increase timeout for stability
             drone.connect()
             
-            # Get battery and store in session state
-            battery = drone.get_battery()
+            # Battery and the rest of the state stream, kept fresh in the background
+            telemetry = TelemetryCache(drone).start()
+            battery = telemetry.refresh().battery
             
             st.session_state.drone_instance = drone
+            st.session_state.telemetry = telemetry
             st.session_state.battery_level = battery
             st.session_state.is_connected = True
             st.session_state.drone_flying = False
@@ -55,7 +117,14 @@ def initialize_drone():
             return False, 0, None
     
     else:
-        # Use existing drone instance
+        # Use existing drone instance, with the battery as of the latest state packet
+        telemetry = st.session_state.get('telemetry')
+        if telemetry is not None:
+            try:
+                st.session_state.battery_level = telemetry.battery()
+            except Exception as e:
+                print(f"Battery reading unavailable: {e}")
+                st.session_state.battery_level = None
         return (st.session_state.is_connected, 
                 st.session_state.battery_level, 
                 st.session_state.drone_instance)
@@ -67,22 +136,36 @@ def main():
     st.markdown(
         "Upload an image or use drone controls to capture and process wall segmentation.")
 
+    warm_up_models()
+    show_model_stats()
+    if st.sidebar.checkbox("⏱️ Trace pipeline stages", value=tracing.enabled()):
+        tracing.enable()
+    else:
+        tracing.disable()
+
     # Initialize drone connection (only once)
     is_connected, battery_level, drone_instance = initialize_drone()
     
     # GAP slider - always visible
     gap = st.slider("🔢 Select GAP (grid spacing)",
                     min_value=30, max_value=100, value=30, step=1)
+    # one SAM prompt per large wall region; re-prompting reuses the image embedding
+    max_points = st.slider("📍 SAM prompt points (one per wall region)",
+                           min_value=1, max_value=6, value=1, step=1)
+    # runs alongside Steps 3-4 and fills in the wall distance for the flight commands
+    estimate_depth = st.checkbox("📏 Estimate the wall distance from depth", value=False)
 
-    image_path = None
-    image = None
+    frame = None
+    distance_from_wall = 2.0
 
     if is_connected and drone_instance:
         st.markdown("---")
         st.markdown("### 🚁 Drone Controls")
         
         # Battery status with color coding
-        if battery_level > 80:
+        if battery_level is None:
+            st.warning("🔋 Battery: unknown")
+        elif battery_level > 80:
             st.success(f"🔋 Battery: {battery_level}%")
         elif battery_level > 20:
             st.warning(f"🔋 Battery: {battery_level}%")
@@ -149,25 +232,17 @@ def main():
                             drone_instance.move_forward(distance_cm)
                         
                         # Wait a moment for stabilization
-                        import time
                         time.sleep(2)
                         
                         # Capture image
-                        frame = drone_instance.get_frame_read().frame
-                        
-                        if frame is not None and not np.all(frame == 0):
-                            # Convert BGR to RGB
-                            frame_rgb = frame[:, :, ::-1]
-                            image = Image.fromarray(frame_rgb)
+                        captured = drone_instance.get_frame_read().frame
 
-                            session_dir = tempfile.mkdtemp(
-                                prefix="drone_", suffix=str(uuid.uuid4()))
-                            image_path = os.path.join(
-                                session_dir, "drone_capture.jpg")
-                            image.save(image_path)
+                        if captured is not None and not np.all(captured == 0):
+                            frame = Frame(captured, "drone_capture.jpg")
+                            st.session_state.captured_frame = frame
 
                             st.image(
-                                image, caption="📸 Drone Captured Image", use_container_width=True)
+                                frame.bgr, channels="BGR", caption="📸 Drone Captured Image", use_container_width=True)
                             st.success("✅ Image captured successfully!")
                         else:
                             st.error("❌ Failed to capture valid image. Please try again.")
@@ -188,6 +263,12 @@ def main():
                 except Exception as e:
                     st.error(f"❌ Landing error: {str(e)}")
         
+        if frame is None and 'captured_frame' in st.session_state:
+            # Reuse the last capture on reruns (e.g. when only GAP changed)
+            frame = st.session_state.captured_frame
+            st.image(frame.bgr, channels="BGR", caption="📸 Last Captured Image",
+                     use_container_width=True)
+
         st.markdown("---")
         
     else:
@@ -200,57 +281,86 @@ def main():
             "📷 Upload an Image", type=["jpg", "jpeg", "png"])
 
         if uploaded_file:
-            session_dir = tempfile.mkdtemp(
-                prefix="seg_", suffix=str(uuid.uuid4()))
-            image_path = os.path.join(session_dir, uploaded_file.name)
-            with open(image_path, "wb") as f:
-                f.write(uploaded_file.read())
-            image = Image.open(image_path).convert("RGB")
-            st.image(image, caption="📥 Uploaded Image",
+            frame = Frame.from_bytes(uploaded_file.getvalue(), uploaded_file.name)
+            st.image(frame.bgr, channels="BGR", caption="📥 Uploaded Image",
                      use_container_width=True)
 
     # Process the image if we have one (from either upload or drone)
-    if image_path and image:
-        session_dir = os.path.dirname(image_path)
-
-        with st.spinner("🧠 Step 1: Picking the best wall point..."):
-            bw_image, pt = pick_wall_point(image)
-            bw_path = os.path.join(session_dir, "01_black_and_white.jpg")
-            pt_path = os.path.join(session_dir, "02_best_point.jpg")
-            save_image(bw_image, bw_path)
-            save_image_with_point(image, pt, pt_path)
-        st.success("✅ Step 1 Done: Wall point selected.")
-        st.image(bw_path, caption="🖼️ Step 1: Black & White Image",
-                 use_container_width=True)
-        st.image(pt_path, caption="🎯 Step 1: Selected Wall Point",
-                 use_container_width=True)
-
-        with st.spinner("📦 Step 2: Running SAM segmentation..."):
-            sam = SAM(SAM_WEIGHTS)
-            results = sam.predict(source=image_path, points=[
-                                  pt], save=False, verbose=False)
-            seg_image = draw_result_on_image(image, results)
-            seg_path = os.path.join(session_dir, "03_segmentation.jpg")
-            save_image(seg_image, seg_path)
-        st.success("✅ Step 2 Done: Segmentation complete.")
-        st.image(seg_path, caption="📐 Step 2: Wall Segmentation",
-                 use_container_width=True)
-
-        with st.spinner(f"🔲 Step 3: Drawing grid points (GAP = {gap})..."):
-            img_points, grid = draw_points(results, image_path, gap)
-            points_path = os.path.join(session_dir, "04_points.jpg")
-            save_image(img_points, points_path)
-        st.success("✅ Step 3 Done: Grid points added.")
-        st.image(points_path, caption="🧮 Step 3: Grid Points",
-                 use_container_width=True)
-
-        with st.spinner("➡️ Step 4: Connecting points to form path..."):
-            img_path, _ = connect_points(grid, results, image_path, gap)
-            path_img_path = os.path.join(session_dir, "05_path.jpg")
-            save_image(img_path, path_img_path)
-        st.success("✅ Step 4 Done: Path connected.")
-        st.image(path_img_path, caption="🛣️ Step 4: Final Path",
-                 use_container_width=True)
+    if frame is not None:
+        # every span recorded while processing this run is tagged with its id
+        trace_id = f"{frame.digest[:12]}@{time.strftime('%H:%M:%S')}"
+        with tracing.request(trace_id):
+            pipeline = WallPipeline(frame, sam_weights=SAM_WEIGHTS,
+                                    cache=get_stage_cache(),
+                                    store=get_artifact_store(),
+                                    max_points=max_points)
+
+            def cached_note(stage):
+                return " ⚡ (cached)" if stage in pipeline.cached_stages else ""
+
+            # one placeholder per step, filled in as soon as that step's future is done
+            steps = {
+                "pick_wall_point": "🧠 Step 1: Picking the best wall point...",
+                "segment": "📦 Step 2: Running SAM segmentation...",
+                "draw_points": f"🔲 Step 3: Drawing grid points (GAP = {gap})...",
+                "connect_points": "➡️ Step 4: Connecting points to form path...",
+            }
+            if estimate_depth:
+                steps["wall_depth"] = "📏 Estimating the wall distance..."
+            slots = {name: st.empty() for name in steps}
+            for name, message in steps.items():
+                slots[name].info("⏳ " + message)
+
+            with StageScheduler() as scheduler:
+                pipeline.schedule(scheduler, gap,
+                                  depth_model=DEPTH_MODEL if estimate_depth else None)
+                for name, future in scheduler.as_completed(list(steps)):
+                    with slots[name].container():
+                        if future.exception() is not None:
+                            st.error(f"❌ {steps[name].rstrip('.')}: {future.exception()}")
+                        elif name == "pick_wall_point":
+                            bw_image, pt_image, _ = future.result()
+                            st.success("✅ Step 1 Done: Wall point selected." + cached_note(name))
+                            st.image(bw_image, caption="🖼️ Step 1: Black & White Image",
+                                     use_container_width=True)
+                            st.image(pt_image, channels="BGR", caption="🎯 Step 1: Selected Wall Point",
+                                     use_container_width=True)
+                        elif name == "segment":
+                            st.success("✅ Step 2 Done: Segmentation complete." + cached_note(name))
+                            st.image(future.result(), caption="📐 Step 2: Wall Segmentation",
+                                     use_container_width=True)
+                        elif name == "draw_points":
+                            st.success("✅ Step 3 Done: Grid points added." + cached_note(name))
+                            st.image(future.result(), channels="BGR", caption="🧮 Step 3: Grid Points",
+                                     use_container_width=True)
+                        elif name == "connect_points":
+                            st.success("✅ Step 4 Done: Path connected." + cached_note(name))
+                            st.image(future.result(), channels="BGR", caption="🛣️ Step 4: Final Path",
+                                     use_container_width=True)
+                        else:
+                            stats = future.result()
+                            st.success(f"✅ Wall distance: median {stats.median:.2f} m "
+                                       f"({stats.min:.2f}–{stats.max:.2f} m)" + cached_note(name))
+                scheduler.wait()
+                report = scheduler.report()
+            st.caption(f"⏱️ {report['elapsed_s']}s for {report['busy_s']}s of work · "
+                       f"critical path: {' → '.join(report['critical_path'])} "
+                       f"({report['critical_s']}s)")
+
+            if pipeline.movement is not None:
+                st.markdown("### 🛩️ Flight Commands")
+                if pipeline.depth_stats is not None:
+                    distance_from_wall = round(min(10.0, max(0.5, pipeline.depth_stats.median)), 1)
+                wall_distance = st.number_input(
+                    "📏 Wall distance used to scale the path (meters)",
+                    min_value=0.5, max_value=10.0, value=float(distance_from_wall), step=0.1)
+                commands = pipeline.flight_commands(wall_distance)
+                st.caption(f"{len(pipeline.movement)} path pixels → {len(commands)} commands")
+                st.dataframe({"action": [a for a, _ in commands],
+                              "value": [v for _, v in commands]}, use_container_width=True)
+                st.download_button("⬇️ Download commands.csv", commands_csv(commands),
+                                   file_name="commands.csv", mime="text/csv")
+        show_trace(trace_id)
 
         st.balloons()
         st.markdown(
@@ -0,0 +1,115 @@
+"""
+CPU latency and accuracy of the Segformer / depth inference backends.
+
+    python -m benchmarks.bench_cpu_backend [--backends torch,onnx,onnx-int8]
+        [--threads 4] [--limit 8] [--depth] [--output results.json]
+
+Hides any GPU, then for every backend (``package.cpu_backend``) reports the
+load time (the first ONNX run includes the export and quantisation, later
+runs load the cached files from ``WALL_EXPORT_DIR``), p50/p90 latency of
+Step 1 (``pick_wall_points`` in logits mode) and, with ``--depth``, of the
+depth model, on ``sample_input/*.jpg`` and the ``assets/`` photos.  Every
+non-torch backend is then checked against torch fp32: wall-mask IoU and
+depth error on the wall pixels.
+
+Needs torch, transformers, onnx, onnxruntime and the model weights; there
+is no stand-in mode, since the stand-ins have nothing to export.
+"""
+import argparse
+import glob
+import json
+import os
+import time
+
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")
+
+import numpy as np
+from PIL import Image
+
+from package import cpu_backend
+from package.model_registry import (DEFAULT_DEPTH_MODEL, DEFAULT_SEMSEG_MODEL,
+                                    get_depth_pipeline, get_semseg_pipeline, registry)
+from package.pick_wall_point import pick_wall_points
+
+
+IMAGE_GLOBS = ("sample_input/*.jpg", "assets/*.jpg", "assets/*.png")
+
+
+def _images(limit):
+    paths = sorted(p for pattern in IMAGE_GLOBS for p in glob.glob(pattern))
+    paths = paths[:limit] if limit else paths
+    return [Image.open(p).convert("RGB") for p in paths]
+
+
+def _latency(fn, images):
+    fn(images[0])  # warm-up: lazy init, allocator, ORT graph caches
+    times = []
+    for image in images:
+        start = time.perf_counter()
+        fn(image)
+        times.append(time.perf_counter() - start)
+    ms = np.asarray(times) * 1000
+    return {"p50_ms": round(float(np.percentile(ms, 50)), 2),
+            "p90_ms": round(float(np.percentile(ms, 90)), 2)}
+
+
+def run_backend(backend, images, semseg_model, depth_model):
+    registry.clear()
+    result = {"backend": backend, "threads": cpu_backend.cpu_threads()}
+
+    start = time.perf_counter()
+    get_semseg_pipeline(semseg_model, backend)
+    result["semseg_load_s"] = round(time.perf_counter() - start, 2)
+    result["semseg"] = _latency(
+        lambda im: pick_wall_points(im, semseg_model, max_points=1, mode="logits",
+                                    return_mask=False, backend=backend), images)
+
+    if depth_model:
+        start = time.perf_counter()
+        depth = get_depth_pipeline(depth_model, backend)
+        result["depth_load_s"] = round(time.perf_counter() - start, 2)
+        result["depth"] = _latency(depth, images)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--backends", default=",".join(cpu_backend.INFERENCE_BACKENDS))
+    parser.add_argument("--threads", type=int, help="intra-op threads (default: physical cores)")
+    parser.add_argument("--limit", type=int, default=8, help="only the first N images (0 = all)")
+    parser.add_argument("--semseg-model", default=DEFAULT_SEMSEG_MODEL)
+    parser.add_argument("--depth", action="store_true", help="also benchmark the depth model")
+    parser.add_argument("--depth-model", default=DEFAULT_DEPTH_MODEL)
+    parser.add_argument("--output", help="write the results as JSON here")
+    args = parser.parse_args()
+
+    if args.threads:
+        os.environ["WALL_CPU_THREADS"] = str(args.threads)
+    images = _images(args.limit)
+    depth_model = args.depth_model if args.depth else None
+    backends = args.backends.split(",")
+
+    results = [run_backend(b, images, args.semseg_model, depth_model) for b in backends]
+    for b in backends:
+        if b != "torch":
+            check = cpu_backend.validate(b, images, args.semseg_model, depth_model)
+            next(r for r in results if r["backend"] == b)["accuracy"] = check
+    registry.clear()
+
+    print(f"{len(images)} images, {cpu_backend.cpu_threads()} threads")
+    print(f"{'backend':<12}{'load s':>8}{'semseg p50':>12}{'p90':>8}"
+          f"{'depth p50':>11}{'p90':>8}{'IoU min':>9}{'depth rel':>11}")
+    for r in results:
+        depth = r.get("depth", {})
+        acc = r.get("accuracy", {})
+        print(f"{r['backend']:<12}{r['semseg_load_s']:>8}{r['semseg']['p50_ms']:>12}"
+              f"{r['semseg']['p90_ms']:>8}{depth.get('p50_ms', '-'):>11}{depth.get('p90_ms', '-'):>8}"
+              f"{acc.get('iou_min', '-'):>9}{acc.get('depth_abs_rel_mean', '-'):>11}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"images": len(images), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
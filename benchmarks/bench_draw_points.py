@@ -0,0 +1,113 @@
+"""
+Compare the vectorised ``draw_points`` with the original nested-loop version.
+
+    python -m benchmarks.bench_draw_points [--image assets/lab.jpg] [--repeat 5]
+
+A synthetic wall mask (a large rectangle with a window cut out) is laid over
+the image so the benchmark runs without SAM.  Both versions must produce the
+same 'G'/'Y'/'R' grid; the script exits non-zero if they do not.
+"""
+import argparse
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from package.draw_points import classify_grid, draw_points
+
+
+def legacy_draw_points(combined_mask, image, gap=50, point_radius=5, thickness=-1):
+    # the original body, except that it copies ``image`` instead of re-reading a file
+    H, W = combined_mask.shape
+
+    ys = list(range(0, H, gap))
+    xs = list(range(0, W, gap))
+    grid = [['' for _ in xs] for _ in ys]
+
+    for i, y in enumerate(ys):
+        for j, x in enumerate(xs):
+            grid[i][j] = 'G' if combined_mask[y, x] else 'R'
+
+    neigh8 = [(-1, -1), (-1, 0), (-1, 1), (0, -1),
+              (0, 1), (1, -1), (1, 0), (1, 1)]
+    for i in range(len(ys)):
+        for j in range(len(xs)):
+            if grid[i][j] == 'G':
+                for dy, dx in neigh8:
+                    ni, nj = i+dy, j+dx
+                    if 0 <= ni < len(ys) and 0 <= nj < len(xs):
+                        if grid[ni][nj] == 'R':
+                            grid[i][j] = 'Y'
+                            break
+
+    last_i, last_j = len(ys)-1, len(xs)-1
+    for j in range(len(xs)):
+        grid[0][j] = 'R'
+        grid[last_i][j] = 'R'
+    for i in range(len(ys)):
+        grid[i][0] = 'R'
+        grid[i][last_j] = 'R'
+
+    img = image.copy()
+    color_map = {
+        'G': (0, 255,   0),
+        'Y': (0, 255, 255),
+        'R': (0,   0, 255),
+    }
+    for i, y in enumerate(ys):
+        for j, x in enumerate(xs):
+            col = color_map[grid[i][j]]
+            cv2.circle(img, (x, y), point_radius, col, thickness)
+    return img, grid
+
+
+def synthetic_mask(h, w):
+    mask = np.zeros((h, w), dtype=bool)
+    mask[h // 10: h - h // 10, w // 12: w - w // 12] = True
+    mask[h // 3: h // 2, w // 3: w // 2] = False
+    return mask
+
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--image", default="assets/lab.jpg")
+    parser.add_argument("--size", default="1600x1200",
+                        help="resize the image to WxH before benchmarking")
+    parser.add_argument("--gaps", default="10,20,30,50,100")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    w, h = map(int, args.size.lower().split("x"))
+    image = cv2.resize(cv2.imread(args.image), (w, h))
+    mask = synthetic_mask(h, w)
+
+    print(f"{'gap':>5} {'cells':>7} {'legacy ms':>10} {'numpy ms':>10} "
+          f"{'speedup':>8} {'grid only ms':>13}")
+    ok = True
+    for gap in map(int, args.gaps.split(",")):
+        t_old, (_, old_grid) = best_of(
+            lambda: legacy_draw_points(mask, image, gap), args.repeat)
+        t_new, (_, new_grid) = best_of(
+            lambda: draw_points(mask, image, gap), args.repeat)
+        t_grid, _ = best_of(lambda: classify_grid(mask, gap), args.repeat)
+        same = new_grid.to_strings() == old_grid
+        ok &= same
+        cells = new_grid.labels.size
+        print(f"{gap:>5} {cells:>7} {t_old * 1e3:>10.2f} {t_new * 1e3:>10.2f} "
+              f"{t_old / t_new:>7.1f}x {t_grid * 1e3:>13.3f}"
+              + ("" if same else "  GRID MISMATCH"))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
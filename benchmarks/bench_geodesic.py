@@ -0,0 +1,64 @@
+"""
+Flown path length and planning time with Chebyshev vs geodesic tour distances.
+
+    python -m benchmarks.bench_geodesic [--gaps 30,50]
+
+Uses synthetic L-shaped and window-broken wall masks, where straight-line
+distances between waypoints differ most from what the drone has to fly.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from package.connect_points import connect_points
+from package.draw_points import classify_grid
+from package.wall_mask import WallMask
+
+
+def l_shaped(h, w):
+    mask = np.zeros((h, w), dtype=bool)
+    mask[h // 12: h - h // 12, w // 16: w // 3] = True
+    mask[2 * h // 3: h - h // 12, w // 16: w - w // 16] = True
+    return mask
+
+
+def windowed(h, w):
+    mask = np.zeros((h, w), dtype=bool)
+    mask[h // 12: h - h // 12, w // 16: w - w // 16] = True
+    for x0 in (w // 6, w // 2 - w // 12, 3 * w // 4 - w // 12):
+        mask[h // 5: 3 * h // 4, x0: x0 + w // 8] = False
+    return mask
+
+
+def path_length(movement):
+    pts = np.asarray(movement, dtype=float)
+    return float(np.hypot(*np.diff(pts, axis=0).T).sum())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", default="1600x1200")
+    parser.add_argument("--gaps", default="30,50,80")
+    args = parser.parse_args()
+    w, h = map(int, args.size.split("x"))
+    image = np.zeros((h, w, 3), dtype=np.uint8)
+
+    print(f"{'mask':>9} {'gap':>4} {'points':>7} {'distance':>10} "
+          f"{'seconds':>8} {'path px':>9}")
+    for name, build in (("L-shaped", l_shaped), ("windowed", windowed)):
+        wall = WallMask(build(h, w))
+        for gap in map(int, args.gaps.split(",")):
+            grid = classify_grid(wall.mask, gap)
+            n = len(grid.cells())
+            for distance in ("chebyshev", "geodesic"):
+                start = time.perf_counter()
+                _, movement = connect_points(grid, wall, image, gap,
+                                             distance=distance)
+                seconds = time.perf_counter() - start
+                print(f"{name:>9} {gap:>4} {n:>7} {distance:>10} "
+                      f"{seconds:>8.3f} {path_length(movement):>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
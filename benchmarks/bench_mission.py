@@ -0,0 +1,63 @@
+"""
+Full mission timing against the simulated Tello, no hardware needed.
+
+    python -m benchmarks.bench_mission [--commands data/commands.csv] [--runs 2] [--time-scale 1.0]
+
+Runs ``helpers/path_following.main`` end to end on a ``SimulatedTello`` that
+replays ``sample_input/`` as its video stream: connect, takeoff, every
+command through the ``MissionEngine`` (ACK, settle, frame saves) and
+landing.  Times are reported in simulated seconds, i.e. wall time divided
+by ``--time-scale``.  Only the simulator is scaled; the engine's settle hold
+and the script's post-takeoff pause run in real time, so scales below 1
+overstate ``settle_s`` and ``wall_s``.
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from helpers import path_following
+from services.backends import SimulatedTello
+
+
+def run_once(commands, time_scale, save_mode):
+    drone = SimulatedTello(time_scale=time_scale)
+    with tempfile.TemporaryDirectory() as save_dir:
+        start = time.perf_counter()
+        engine = path_following.main(drone, commands, save_dir, save_mode, confirm=False)
+        wall = time.perf_counter() - start
+        writer = path_following.frame_writer.stats()
+    if engine is None:
+        raise RuntimeError("mission did not start")
+    return {
+        "mission_s": engine.mission_s / time_scale,
+        "wall_s": wall / time_scale,
+        "commands": len(engine.timings),
+        "ack_s": sum(t.ack_s for t in engine.timings) / time_scale,
+        "settle_s": sum(t.settle_s for t in engine.timings) / time_scale,
+        "save_s": sum(t.save_s for t in engine.timings) / time_scale,
+        "frames": writer["written"],
+        "battery_used": 100 - drone.battery,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--commands", default="data/commands.csv")
+    parser.add_argument("--runs", type=int, default=2)
+    parser.add_argument("--time-scale", type=float, default=1.0)
+    parser.add_argument("--save-mode", default="jpeg", choices=("jpeg", "raw", "video"))
+    args = parser.parse_args()
+
+    rows = [run_once(args.commands, args.time_scale, args.save_mode)
+            for _ in range(args.runs)]
+    print(f"\n{args.commands}: {rows[0]['commands']} commands, "
+          f"{args.runs} runs, time scale {args.time_scale}")
+    for key in ("mission_s", "wall_s", "ack_s", "settle_s", "save_s", "frames", "battery_used"):
+        vals = np.array([r[key] for r in rows], dtype=float)
+        print(f"  {key:<13}{vals.mean():9.2f}  (min {vals.min():.2f}, max {vals.max():.2f})")
+
+
+if __name__ == "__main__":
+    main()
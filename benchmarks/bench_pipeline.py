@@ -0,0 +1,247 @@
+"""
+Per-stage latency, memory and allocation benchmark of the wall pipeline.
+
+    python -m benchmarks.bench_pipeline --stand-in [--gaps 30,50,80] [--limit 5]
+        [--output results.json] [--baseline benchmarks/baselines/pipeline_standin.json]
+
+Runs every stage on each ``sample_input/*.jpg`` frame and ``assets/`` photo:
+``pick_wall_point`` (pipeline masks, then logits), SAM predict, a SAM re-prompt on the cached image
+embedding (``SegmentationService``), the mask union, ``draw_result_on_image``,
+``distance_estimator``, then ``draw_points`` and ``connect_points`` (once per
+planner) at every GAP, and finally the whole ``WallPipeline`` with depth at
+the first GAP, step by step and on a ``StageScheduler``.  Reports p50/p90/p99 latency per stage, the largest
+Python/numpy allocation peak of one call (``tracemalloc``, on the first image
+only, so the timed calls run untraced) and the largest RSS seen right after a
+call (``rss_after_mb``; the process-wide peak is ``meta.peak_rss_mb``).
+
+``--stand-in`` pins the CPU stand-ins from ``benchmarks.standins`` in place
+of Segformer, SAM and the depth model, so the suite runs offline.  With
+``--baseline`` every stage whose p50 is more than ``--tolerance`` slower
+than the baseline's is reported and the exit status is 1.  A baseline
+recorded with other inputs or on another core count (``meta`` keys
+``stand_in``, ``images``, ``gaps``, ``planners``, ``cpus``) is not compared
+at all and the exit status is 2; regenerate it on the machine that runs the
+gate with the full image set:
+
+    python -m benchmarks.bench_pipeline --stand-in \
+        --output benchmarks/baselines/pipeline_standin.json
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+
+import numpy as np
+import psutil
+
+from package.connect_points import EXACT_LIMIT, connect_points
+from package.distance_estimation import distance_estimator
+from package.draw_points import draw_points
+from package.draw_result_on_image import draw_result_on_image
+from package.frame import Frame
+from package.model_registry import (DEFAULT_DEPTH_MODEL, DEFAULT_SAM_WEIGHTS,
+                                    DEFAULT_SEMSEG_MODEL, get_sam)
+from package.pick_wall_point import pick_wall_point
+from package.pipeline import WallPipeline
+from package.scheduler import StageScheduler
+from package.segmentation_service import get_segmentation_service
+from package.wall_mask import WallMask
+
+
+PLANNERS = ("auto", "held_karp", "nearest_neighbor_2opt", "boustrophedon", "auto+geodesic")
+IMAGE_GLOBS = ("sample_input/*.jpg", "assets/*.jpg", "assets/*.png")
+
+
+class Recorder:
+    def __init__(self, trace_allocs):
+        self.times = defaultdict(list)
+        self.alloc_peak = defaultdict(int)
+        self.rss_after = defaultdict(int)
+        self.trace_allocs = trace_allocs
+        self.process = psutil.Process()
+
+    def __call__(self, stage, fn):
+        start = time.perf_counter()
+        out = fn()
+        self.times[stage].append(time.perf_counter() - start)
+        rss = self.process.memory_info().rss
+        self.rss_after[stage] = max(self.rss_after[stage], rss)
+        if self.trace_allocs:
+            tracemalloc.start()
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.alloc_peak[stage] = max(self.alloc_peak[stage], peak)
+        return out
+
+    def summary(self):
+        stages = {}
+        for stage, times in self.times.items():
+            ms = np.asarray(times) * 1000
+            stages[stage] = {
+                "n": len(times),
+                "mean_ms": round(float(ms.mean()), 3),
+                "p50_ms": round(float(np.percentile(ms, 50)), 3),
+                "p90_ms": round(float(np.percentile(ms, 90)), 3),
+                "p99_ms": round(float(np.percentile(ms, 99)), 3),
+                "alloc_peak_mb": round(self.alloc_peak.get(stage, 0) / 2**20, 2),
+                "rss_after_mb": round(self.rss_after[stage] / 2**20, 1),
+            }
+        return stages
+
+
+def _images(limit):
+    paths = sorted(p for pattern in IMAGE_GLOBS for p in glob.glob(pattern))
+    return paths[:limit] if limit else paths
+
+
+def _whole_pipeline(frame, gap, scheduled):
+    pipeline = WallPipeline(frame)
+    if not scheduled:
+        pipeline.pick_wall_point()
+        pipeline.segment()
+        pipeline.draw_points(gap)
+        pipeline.connect_points(gap)
+        return pipeline.wall_depth(DEFAULT_DEPTH_MODEL)
+    with StageScheduler() as scheduler:
+        pipeline.schedule(scheduler, gap, depth_model=DEFAULT_DEPTH_MODEL)
+        scheduler.future("connect_points").result()
+        return scheduler.future("wall_depth").result()
+
+
+def run(paths, gaps, planners, depth_model, input_size=518):
+    sam = get_sam(DEFAULT_SAM_WEIGHTS)
+    service = get_segmentation_service(DEFAULT_SAM_WEIGHTS)
+    rec = Recorder(trace_allocs=False)
+    for k, path in enumerate(paths):
+        rec.trace_allocs = k == 0
+        frame = rec("decode", lambda: Frame.from_path(path))
+        _, point = rec("pick_wall_point", lambda: pick_wall_point(frame.pil, DEFAULT_SEMSEG_MODEL))
+        rec("pick_wall_point[logits]",
+            lambda: pick_wall_point(frame.pil, DEFAULT_SEMSEG_MODEL, mode="logits"))
+        results = rec("sam_predict", lambda: sam.predict(source=frame.bgr, points=[point],
+                                                         save=False, verbose=False))
+        service.predict(frame, [point])  # encode once, untimed
+        rec("sam_reprompt", lambda: service.predict(frame, [point]))
+        wall = rec("wall_mask", lambda: WallMask.from_results(results))
+        rec("draw_result_on_image", lambda: draw_result_on_image(frame.bgr, wall))
+        try:
+            rec("distance_estimator",
+                lambda: distance_estimator(frame.bgr, wall, depth_model, input_size))
+        except ValueError:
+            pass  # no wall pixels in this frame
+
+        for gap in gaps:
+            _, grid = rec(f"draw_points[gap={gap}]", lambda: draw_points(wall, frame.bgr, gap))
+            n = int(grid.selected(1).sum())
+            for planner in planners:
+                if planner == "held_karp" and n > EXACT_LIMIT:
+                    continue
+                name, _, distance = planner.partition("+")
+                kwargs = {"planner": name, "distance": distance or "chebyshev"}
+                # a fresh WallMask so no planner reuses another's cached cost map
+                rec(f"connect_points[{planner},gap={gap}]",
+                    lambda: connect_points(grid, WallMask(wall.mask), frame.bgr, gap, **kwargs))
+
+        for mode in ("sequential", "scheduled"):
+            try:
+                # a frame SAM has not encoded yet, as in the app
+                rec(f"pipeline[{mode}]", lambda: (service.forget(),
+                                                  _whole_pipeline(frame, gaps[0], mode == "scheduled")))
+            except ValueError:
+                pass
+        print(f"[{k + 1}/{len(paths)}] {os.path.basename(path)}", file=sys.stderr)
+    return rec.summary()
+
+
+def compare(stages, baseline, tolerance, min_ms=1.0):
+    """Stages whose p50 grew by more than ``tolerance`` (and ``min_ms``) over the baseline."""
+    regressions = []
+    for stage, cur in sorted(stages.items()):
+        base = baseline.get("stages", {}).get(stage)
+        if base is None:
+            continue
+        if cur["p50_ms"] > base["p50_ms"] * (1 + tolerance) and cur["p50_ms"] - base["p50_ms"] > min_ms:
+            regressions.append((stage, base["p50_ms"], cur["p50_ms"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--stand-in", action="store_true",
+                        help="use the CPU stand-in models (no GPU, network or weights)")
+    parser.add_argument("--gaps", default="30,50,80")
+    parser.add_argument("--planners", default=",".join(PLANNERS))
+    parser.add_argument("--limit", type=int, default=0, help="only the first N images")
+    parser.add_argument("--output", help="write the results as JSON here")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed p50 slowdown over the baseline (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    if args.stand_in:
+        from benchmarks import standins
+        depth_model = standins.install()
+    else:
+        from package.model_registry import get_depth_pipeline
+        depth_model = get_depth_pipeline()  # DepthEngine takes pipelines as they are
+
+    paths = _images(args.limit)
+    gaps = [int(g) for g in args.gaps.split(",")]
+    planners = args.planners.split(",")
+    start = time.perf_counter()
+    stages = run(paths, gaps, planners, depth_model)
+
+    result = {
+        "meta": {
+            "stand_in": args.stand_in,
+            "images": len(paths),
+            "gaps": gaps,
+            "planners": planners,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "seconds": round(time.perf_counter() - start, 2),
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        },
+        "stages": stages,
+    }
+
+    print(f"{'stage':<44}{'n':>5}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'alloc MB':>10}")
+    for stage, s in stages.items():
+        print(f"{stage:<44}{s['n']:>5}{s['p50_ms']:>10.2f}{s['p90_ms']:>10.2f}"
+              f"{s['p99_ms']:>10.2f}{s['alloc_peak_mb']:>10.2f}")
+    print(f"peak RSS {result['meta']['peak_rss_mb']} MB, {result['meta']['seconds']}s total")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        mismatched = [key for key in ("stand_in", "images", "gaps", "planners", "cpus")
+                      if baseline.get("meta", {}).get(key) != result["meta"][key]]
+        for key in mismatched:
+            print(f"baseline {key}={baseline.get('meta', {}).get(key)!r} differs "
+                  f"from this run's {result['meta'][key]!r}")
+        if mismatched:
+            print("latencies are not like for like, not compared; regenerate the "
+                  "baseline with --output (see the module docstring)")
+            sys.exit(2)
+        regressions = compare(stages, baseline, args.tolerance)
+        for stage, base, cur in regressions:
+            print(f"REGRESSION {stage}: p50 {base:.2f} ms -> {cur:.2f} ms")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
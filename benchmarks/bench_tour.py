@@ -0,0 +1,87 @@
+"""
+Tour length against solve time for the large-tour solver.
+
+    python -m benchmarks.bench_tour [--gap 30] [--budgets 0.1,0.5,2]
+
+Synthetic wall masks of increasing size (a wall with two windows cut out)
+are turned into waypoint grids with ``classify_grid``.  Each grid is solved
+by the original nearest-neighbour + full-sweep 2-opt (up to ``--legacy-max``
+points, it has no time limit) and by ``solve_tour`` at each time budget.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from package.connect_points import chebyshev_matrix
+from package.draw_points import classify_grid
+from package.tour_solver import solve_tour, tour_length
+
+
+def legacy_nearest_neighbor_2opt(dist):
+    n = len(dist)
+    tour = [0]
+    unv = set(range(1, n))
+    cur = 0
+    while unv:
+        nxt = min(unv, key=lambda k: dist[cur][k])
+        unv.remove(nxt)
+        tour.append(nxt)
+        cur = nxt
+    tour.append(0)
+
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, n - 1):
+            for j in range(i + 1, n):
+                a, b = tour[i - 1], tour[i]
+                c, d = tour[j], tour[j + 1]
+                old = dist[a][b] + dist[c][d]
+                new = dist[a][c] + dist[b][d]
+                if new < old:
+                    tour[i: j + 1] = reversed(tour[i: j + 1])
+                    improved = True
+    return tour
+
+
+def synthetic_mask(h, w):
+    mask = np.zeros((h, w), dtype=bool)
+    mask[h // 10: h - h // 10, w // 20: w - w // 20] = True
+    mask[h // 4: h // 2, w // 5: w // 3] = False
+    mask[h // 3: 2 * h // 3, w // 2: 3 * w // 4] = False
+    return mask
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--gap", type=int, default=30)
+    parser.add_argument("--sizes", default="400x300,800x600,1600x1200,3200x2400")
+    parser.add_argument("--budgets", default="0.1,0.5,2")
+    parser.add_argument("--legacy-max", type=int, default=600)
+    args = parser.parse_args()
+
+    print(f"{'size':>10} {'points':>7} {'solver':>16} {'seconds':>9} {'length':>9}")
+    for size in args.sizes.split(","):
+        w, h = map(int, size.split("x"))
+        coords = classify_grid(synthetic_mask(h, w), args.gap).coords()
+        n = len(coords)
+
+        if n <= args.legacy_max:
+            dist = chebyshev_matrix(coords).tolist()
+            start = time.perf_counter()
+            tour = legacy_nearest_neighbor_2opt(dist)
+            seconds = time.perf_counter() - start
+            print(f"{size:>10} {n:>7} {'legacy':>16} {seconds:>9.3f} "
+                  f"{tour_length(tour, coords):>9.0f}")
+
+        for budget in map(float, args.budgets.split(",")):
+            tour, stats = solve_tour(coords, time_budget=budget, return_stats=True)
+            label = f"budget {budget:g}s" + ("" if stats["converged"] else "*")
+            print(f"{size:>10} {n:>7} {label:>16} {stats['seconds']:>9.3f} "
+                  f"{tour_length(tour, coords):>9.0f}")
+    print("* stopped at the time budget before converging")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Small CPU-only stand-ins for the pipeline's models, for benchmarks that must
+run without a GPU, network access or downloaded weights.
+
+They are not accurate; they only do a comparable kind of work (a pass over
+the image at model resolution) and return outputs of the real shapes and
+types, so every downstream stage runs on realistic masks.
+"""
+import types
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from package.model_registry import registry
+
+
+class StandInSegformer:
+    """
+    ``image-segmentation`` pipeline look-alike: the largest flat region is 'wall'.
+    ``image_processor``/``model`` expose the same result as 1/4-resolution
+    logits, like the pipeline's Segformer.
+    """
+
+    framework = "np"
+
+    def __init__(self, size=512):
+        self.size = size
+        self.image_processor = self._preprocess
+        self.model = _StandInSegformerModel(self)
+
+    def _wall(self, rgb, size):
+        small = cv2.resize(rgb, size, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_RGB2GRAY)
+        edges = cv2.dilate(cv2.Canny(gray, 40, 120), np.ones((5, 5), np.uint8))
+        n, labels, stats, _ = cv2.connectedComponentsWithStats(
+            (edges == 0).astype(np.uint8), connectivity=4)
+        wall = np.zeros(gray.shape, dtype=np.uint8)
+        if n > 1:
+            wall[labels == 1 + int(np.argmax(stats[1:, cv2.CC_STAT_AREA]))] = 255
+        return wall
+
+    def __call__(self, image):
+        rgb = np.asarray(image.convert("RGB"))
+        h, w = rgb.shape[:2]
+        scale = self.size / max(h, w)
+        wall = self._wall(rgb, (max(1, int(w * scale)), max(1, int(h * scale))))
+        rest = np.where(wall > 0, 0, 255).astype(np.uint8)
+        return [{"label": "wall", "score": None, "mask": Image.fromarray(wall)},
+                {"label": "other", "score": None, "mask": Image.fromarray(rest)}]
+
+    def _preprocess(self, images, return_tensors="np"):
+        return {"pixel_values": np.asarray(images.convert("RGB"))}
+
+
+class _StandInSegformerModel:
+    config = types.SimpleNamespace(label2id={"wall": 0, "other": 1})
+
+    def __init__(self, segformer):
+        self.segformer = segformer
+
+    def __call__(self, pixel_values):
+        size = self.segformer.size
+        wall = self.segformer._wall(pixel_values, (size, size))
+        wall = cv2.resize(wall, (size // 4, size // 4),
+                          interpolation=cv2.INTER_AREA).astype(np.float32) / 127.5 - 1.0
+        logits = np.stack([wall, np.zeros_like(wall)])[None]
+        return types.SimpleNamespace(logits=logits)
+
+
+class StandInSAM:
+    """
+    ``ultralytics.SAM`` look-alike: a colour flood fill from each prompt point.
+    ``embed``/``decode`` split it like SAM's encoder and prompt decoder.
+    """
+
+    def __init__(self, size=1024, tolerance=12):
+        self.size = size
+        self.tolerance = tolerance
+
+    def predict(self, source, points, **kwargs):
+        bgr = np.asarray(source)
+        return self.decode(bgr, self.embed(bgr), points)
+
+    def embed(self, bgr):
+        """The 'encoder': a blurred copy at model resolution, reused by ``decode``."""
+        h, w = bgr.shape[:2]
+        scale = min(1.0, self.size / max(h, w))
+        small = cv2.resize(bgr, (max(1, int(w * scale)), max(1, int(h * scale))),
+                           interpolation=cv2.INTER_AREA)
+        return scale, cv2.GaussianBlur(small, (5, 5), 0)
+
+    def decode(self, bgr, embedding, points):
+        h, w = bgr.shape[:2]
+        scale, small = embedding
+        sh, sw = small.shape[:2]
+        masks = []
+        for x, y in points:
+            seed = (min(sw - 1, int(x * scale)), min(sh - 1, int(y * scale)))
+            fill = np.zeros((sh + 2, sw + 2), dtype=np.uint8)
+            tol = (self.tolerance,) * 3
+            cv2.floodFill(small.copy(), fill, seed, (0, 0, 0), tol, tol,
+                          4 | cv2.FLOODFILL_MASK_ONLY | (255 << 8))
+            mask = cv2.resize(fill[1:-1, 1:-1], (w, h), interpolation=cv2.INTER_NEAREST)
+            masks.append(mask > 0)
+        data = np.stack(masks) if masks else np.zeros((0, h, w), dtype=bool)
+        return [types.SimpleNamespace(masks=types.SimpleNamespace(data=data))]
+
+
+class StandInDepth:
+    """``DepthAnythingV2.infer_image`` look-alike: metres from blurred brightness."""
+
+    def infer_image(self, rgb, input_size=518):
+        h, w = rgb.shape[:2]
+        scale = input_size / min(h, w)
+        small = cv2.resize(rgb, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_RGB2GRAY), (15, 15), 0)
+        depth = 1.0 + 3.0 * (1.0 - gray.astype(np.float32) / 255.0)
+        return cv2.resize(depth, (w, h), interpolation=cv2.INTER_LINEAR)
+
+
+def install():
+    """Pin the stand-ins into the model registry; returns the depth stand-in."""
+    registry.pin("semseg", StandInSegformer(), "stand-in")
+    registry.pin("sam", StandInSAM(), "stand-in")
+    return registry.pin("depth", StandInDepth(), "stand-in")
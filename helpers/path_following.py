@@ -1,67 +1,51 @@
-import cv2
-import numpy as np
+import argparse
+import asyncio
 import threading
 import queue
 import time
 import os
+import sys
 import pandas as pd
-from djitellopy import Tello
 import matplotlib.pyplot as plt
 
-# Create folder to save input frames
-os.makedirs("sample_input", exist_ok=True)
-
-# Global variables
-latest_frame = None
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from package import tracing
+from services.backends import create_backend
+from services.frame_buffer import FrameBuffer, FrameReader
+from services.frame_writer import FrameWriter
+from services.mission import MissionEngine
+from services.telemetry import TelemetryCache
+
+# How mission frames are saved: "jpeg" (one file per frame),
+# "raw" (one memory-mappable recording.raw) or "video" (recording.mp4)
+SAVE_MODE = "jpeg"
+# Mission frames go to a new missions/<timestamp> folder unless --save-dir is given
+MISSIONS_DIR = "missions"
+
+# Global variables (reset by main() for every mission)
+frame_buffer = FrameBuffer()  # Ring of recent frames with capture times and sequence numbers
+frame_writer = None  # FrameWriter that saves frames off the control loop
+mission_engine = None  # MissionEngine of the last mission, for its timings
+telemetry = None  # TelemetryCache fed by the drone's state stream
 exit_event = threading.Event()  # Event to signal all threads to exit
-frame_counter = 0  # For naming saved frames
 commands_finished_event = threading.Event()  # Event to signal command execution completion
 mission_cancelled_event = threading.Event()  # Event to signal immediate mission cancellation and landing
-save_frame_event = threading.Event()  # Event to signal when to save a frame
 
 # Queues for inter-thread communication
 command_request_queue = queue.Queue()  # For command_executor_thread to send command details to user_input_thread
 user_response_queue = queue.Queue()  # For user_input_thread to send user's decision back to command_executor_thread
 
-# Initialize the Tello drone
-drone = Tello()
-try:
-    drone.connect()
-    drone.streamon()
-    print('-----------------')
-    print(f' Battery Level: {drone.get_battery()}%')
-    print('-----------------')
-    input('Check battery level and press Enter to continue...')
-    drone.takeoff()
-    drone.move_up(int(100))  # Initial upward movement to a good height
-    time.sleep(3)
-    # Read a frame to clear buffer after initial movements, before first action
-    dump_data = drone.get_frame_read().frame
-    time.sleep(1) # Give a moment for the frame to be ready
-    save_frame_event.set() # Save initial frame after drone stabilizes from takeoff and initial move_up
-
-except Exception as e:
-    print(f"Failed to connect to Tello drone or perform initial commands: {e}")
-    print("Please ensure the drone is on, connected to Wi-Fi, and try again.")
-    exit_event.set()  # Set exit event to ensure clean shutdown if connection fails
-    exit()  # Exit if drone connection fails
-
 def frame_reader_thread(drone_obj, exit_event):
     """
-    Continuously reads frames from the Tello drone and updates the global latest_frame.
+    Continuously reads frames from the Tello drone into frame_buffer.
     This runs in a separate thread to ensure continuous frame updates,
     independent of drone command execution or user input.
     """
-    global latest_frame
     print("Starting frame reader thread...")
-    while not exit_event.is_set():
-        try:
-            latest_frame = drone_obj.get_frame_read().frame
-        except Exception as e:
-            print(f"Error fetching frame: {e}")
-            # Do not set exit_event here, as temporary frame errors shouldn't crash mission
-        time.sleep(0.03)  # Small delay to prevent busy-waiting
-    print("Frame reader thread finished.")
+    reader = FrameReader(lambda: drone_obj.get_frame_read().frame, frame_buffer,
+                         interval=0.03, stop_event=exit_event)
+    reader.run()  # Temporary frame errors are logged, they don't crash the mission
+    print(f"Frame reader thread finished. {frame_buffer.stats()}")
 
 def user_input_thread(command_req_q, user_resp_q, exit_event):
     """
@@ -92,212 +76,210 @@ def user_input_thread(command_req_q, user_resp_q, exit_event):
             exit_event.set()  # Signal exit on unexpected error
     print("User input thread finished.")
 
-def command_executor_thread(drone_obj, commands_df, command_req_q, user_resp_q, mission_cancelled_event, commands_finished_event, exit_event, save_frame_event):
+def command_executor_thread(drone_obj, commands_df, command_req_q, user_resp_q, mission_cancelled_event, commands_finished_event, exit_event):
     """
-    Executes drone commands read from an Excel DataFrame, after user confirmation.
-    Sends zero RC control commands when idle to keep the drone stable.
-    Signals the main loop to save frames before and after each action.
+    Executes drone commands read from an Excel DataFrame with a MissionEngine:
+    each command moves on once the drone ACKed it, its velocity and attitude
+    have settled and the after-action frame is saved, instead of after fixed sleeps.
     """
     print("Starting command executor thread...")
-    command_index = 0
-    num_commands = len(commands_df)
+    commands = [(str(action).strip().lower(), int(value))
+                for action, value in zip(commands_df['action'], commands_df['value'])]
+    global mission_engine
+    engine = mission_engine = MissionEngine(drone_obj, frame_buffer, frame_writer,
+                                            cancel_event=exit_event, telemetry=telemetry)
 
     try:
-        while not exit_event.is_set() and command_index < num_commands:
-            # Send zero RC control to keep drone stable while waiting for next command or user input
-            try:
-                drone_obj.send_rc_control(0, 0, 0, 0)
-            except Exception as e:
-                print(f"Error sending RC control: {e}")
-
-            row = commands_df.iloc[command_index]
-            action = str(row['action']).strip().lower()
-            value = int(row['value'])  # Ensure value is integer
-
-            # 1. Send command to user_input_thread for confirmation
-            print(f"Awaiting user confirmation for: {action} {value}")
-            # command_req_q.put((action, value))
-
-            # 2. Wait for user response from the user_input_thread
-            # user_response = user_resp_q.get()
-
-            if False:
-                print(f"Mission cancelled by user. Landing drone.")
-                mission_cancelled_event.set()  # Signal immediate landing
-                exit_event.set()  # Signal all threads to exit
-                break  # Exit command loop as mission is cancelled
-
-            # --- Save frame BEFORE executing the action ---
-            print("Signaling to save frame before action...")
-            save_frame_event.set()
-            # Wait a moment for the main loop to process the save request
-            time.sleep(0.1)
-            save_frame_event.clear() # Clear the event after signaling
-
-            # 3. Execute command based on action
-            print(f"Executing: {action} {value}")
-            try:
-                if action == 'move_up':
-                    drone_obj.move_up(int(value))
-                elif action == 'move_down':
-                    drone_obj.move_down(int(value))
-                elif action == 'move_left':
-                    drone_obj.move_left(int(value))
-                elif action == 'move_right':
-                    drone_obj.move_right(int(value))
-                elif action == 'move_forward':
-                    drone_obj.move_forward(int(value))
-                elif action == 'move_back':
-                    drone_obj.move_back(int(value))
-                elif action == 'rotate_clockwise':
-                    drone_obj.rotate_clockwise(int(value))
-                elif action == 'rotate_counter_clockwise':
-                    drone_obj.rotate_counter_clockwise(int(value))
-                elif action == 'takeoff':
-                    drone_obj.takeoff()
-                elif action == 'land':  # If 'land' is explicitly in commands, execute it
-                    drone_obj.land()
-                    exit_event.set()  # Land command means mission is explicitly over
-                    break  # Exit command loop
-                else:
-                    print(f"Unknown action: '{action}'. Skipping.")
-
-                time.sleep(3)  # Allow drone to stabilize after each blocking command
-
-                # --- Save frame AFTER executing the action ---
-                print("Signaling to save frame after action...")
-                save_frame_event.set()
-                # Wait a moment for the main loop to process the save request
-                time.sleep(3)
-                save_frame_event.clear() # Clear the event after signaling
+        asyncio.run(engine.run(commands))
 
-            except Exception as e:
-                print(f"Error executing drone command {action} {value}: {e}")
-                mission_cancelled_event.set()  # Signal cancellation on execution error
-                exit_event.set()
-                break  # Exit command loop on error
-
-            command_index += 1
-            time.sleep(1)  # Small delay between processing commands to prevent busy-waiting
-
-        # After loop, if not cancelled and all commands processed, signal commands finished
-        if not mission_cancelled_event.is_set() and command_index >= num_commands:
+        if any(action == 'land' for action, _ in commands):
+            exit_event.set()  # Land command means mission is explicitly over
+        # After the run, if not cancelled, signal commands finished
+        if not mission_cancelled_event.is_set() and not exit_event.is_set():
             print("All navigation commands from Excel executed.")
             commands_finished_event.set()  # Signal that all commands are done
             exit_event.set()  # Signal main loop to exit after commands are done
 
     except Exception as e:
-        print(f"An unexpected error occurred in command executor thread: {e}")
-        mission_cancelled_event.set()
+        print(f"Error executing drone commands: {e}")
+        mission_cancelled_event.set()  # Signal cancellation on execution error
         exit_event.set()
     finally:
+        print(engine.summary())
         print("Command executor thread finished.")
 
-# --- Excel File Input and Processing ---
-frame_reader_t = None
-user_input_t = None
-command_executor_t = None
+def main(backend=None, commands_path="data/commands.csv", save_dir=None,
+         save_mode=SAVE_MODE, confirm=True):
+    """
+    Flies the commands in commands_path and saves frames to save_dir
+    (default: a new missions/<timestamp> folder).
+    backend is a drone backend ("tello", "sim" or an instance, see services.backends);
+    nothing connects to a drone before this is called.
+    """
+    global frame_buffer, frame_writer, mission_engine, telemetry
+    drone = backend if backend is not None and not isinstance(backend, str) else create_backend(backend)
+    save_dir = save_dir or os.path.join(MISSIONS_DIR, time.strftime("%Y%m%d-%H%M%S"))
+    replay_dir = getattr(drone, "frames_dir", None)
+    if replay_dir is not None and os.path.realpath(save_dir) == os.path.realpath(replay_dir):
+        # the simulator replays these frames; saving there would overwrite them
+        raise ValueError(f"save_dir {save_dir!r} is the simulator's frames_dir; pick another folder")
+
+    frame_buffer = FrameBuffer()
+    frame_writer = FrameWriter(save_dir, mode=save_mode)
+    print(f"Saving frames to {save_dir}")
+    mission_engine = None
+    for event in (exit_event, commands_finished_event, mission_cancelled_event):
+        event.clear()
+
+    # Initialize the drone
+    try:
+        drone.connect()
+        drone.streamon()
+        telemetry = TelemetryCache(drone).start()
+        print('-----------------')
+        battery = telemetry.refresh().battery
+        print(f' Battery Level: {"unknown" if battery is None else f"{battery}%"}')
+        print('-----------------')
+        if confirm:
+            input('Check battery level and press Enter to continue...')
+        drone.takeoff()
+        drone.move_up(int(100))  # Initial upward movement to a good height
+        time.sleep(3)
+        # Start the video decoder so frames are flowing before the first action
+        drone.get_frame_read()
+
+    except Exception as e:
+        print(f"Failed to connect to Tello drone or perform initial commands: {e}")
+        print("Please ensure the drone is on, connected to Wi-Fi, and try again.")
+        exit_event.set()  # Set exit event to ensure clean shutdown if connection fails
+        frame_writer.close()
+        if telemetry is not None:
+            telemetry.stop()
+        return None  # Stop if drone connection fails
+
+    # --- Excel File Input and Processing ---
+    frame_reader_t = None
+    user_input_t = None
+    command_executor_t = None
+
+    try:
+        excel_file_path = commands_path
+
+        if not os.path.exists(excel_file_path):
+            raise FileNotFoundError(f"Error: File not found at '{excel_file_path}'")
+
+        commands_df = pd.read_csv(excel_file_path)
 
-try:
-    excel_file_path = "data/commands.csv"
+        # Validate required columns
+        required_columns = ['action', 'value']
+        if not all(col in commands_df.columns for col in required_columns):
+            raise ValueError(f"Error: Excel file must contain all required columns: {required_columns}")
 
-    if not os.path.exists(excel_file_path):
-        raise FileNotFoundError(f"Error: File not found at '{excel_file_path}'")
+        # Ensure 'value' column is numeric and handle missing values by filling with 0
+        commands_df['value'] = pd.to_numeric(commands_df['value'], errors='coerce').fillna(0).astype(int)
+        # Ensure 'action' column is string
+        commands_df['action'] = commands_df['action'].astype(str)
 
-    commands_df = pd.read_csv(excel_file_path)
+        print("Excel file loaded successfully. Starting drone navigation based on instructions.")
 
-    # Validate required columns
-    required_columns = ['action', 'value']
-    if not all(col in commands_df.columns for col in required_columns):
-        raise ValueError(f"Error: Excel file must contain all required columns: {required_columns}")
+        # Start the threads
+        frame_reader_t = threading.Thread(target=frame_reader_thread, args=(drone, exit_event), name="FrameReaderThread")
+        frame_reader_t.start()
 
-    # Ensure 'value' column is numeric and handle missing values by filling with 0
-    commands_df['value'] = pd.to_numeric(commands_df['value'], errors='coerce').fillna(0).astype(int)
-    # Ensure 'action' column is string
-    commands_df['action'] = commands_df['action'].astype(str)
+        user_input_t = threading.Thread(target=user_input_thread, args=(command_request_queue, user_response_queue, exit_event), name="UserInputThread")
+        user_input_t.start()
 
-    print("Excel file loaded successfully. Starting drone navigation based on instructions.")
+        command_executor_t = threading.Thread(target=command_executor_thread, args=(drone, commands_df, command_request_queue, user_response_queue, mission_cancelled_event, commands_finished_event, exit_event), name="CommandExecutorThread")
+        command_executor_t.start()
 
-    # Start the threads
-    frame_reader_t = threading.Thread(target=frame_reader_thread, args=(drone, exit_event), name="FrameReaderThread")
-    frame_reader_t.start()
+    except FileNotFoundError as e:
+        print(e)
+        exit_event.set()  # Set exit event to stop other threads gracefully
+    except ValueError as e:
+        print(e)
+        exit_event.set()  # Set exit event to stop other threads gracefully
+    except Exception as e:
+        print(f"An unexpected error occurred during Excel processing or thread startup: {e}")
+        exit_event.set()  # Set exit event to stop other threads gracefully
 
-    user_input_t = threading.Thread(target=user_input_thread, args=(command_request_queue, user_response_queue, exit_event), name="UserInputThread")
-    user_input_t.start()
+    # plt.ion()  # Turn on interactive mode for matplotlib for real-time plot updates
+    try:
+        # Main loop for frame display and saving
+        while not exit_event.is_set():
+            # Read-only view of the newest frame; saving happens on the writer threads
+            current = frame_buffer.latest()
+            if current is not None:
+                # Display the frame using matplotlib
+                if 'fig' not in globals():  # Create figure and axis only once
+                    pass
+                    # fig, ax = plt.subplots(figsize=(8, 6))  # Adjust figure size as needed
+                    # img_plot = ax.imshow(cv2.cvtColor(current.image, cv2.COLOR_BGR2RGB))
+                    # ax.set_title("Drone View (Press Ctrl+C in console to stop)")
+                    # ax.axis('off')  # Hide axes ticks and labels
+                    # plt.tight_layout()  # Adjust layout to prevent labels overlapping
+                else:
+                    print()
+                    # img_plot.set_data(cv2.cvtColor(current.image, cv2.COLOR_BGR2RGB))  # Update existing plot data
 
-    command_executor_t = threading.Thread(target=command_executor_thread, args=(drone, commands_df, command_request_queue, user_response_queue, mission_cancelled_event, commands_finished_event, exit_event, save_frame_event), name="CommandExecutorThread")
-    command_executor_t.start()
+                # plt.draw()  # Redraw the plot
+                # plt.pause(0.01)  # Short pause for UI update and to allow other threads to run
 
-except FileNotFoundError as e:
-    print(e)
-    exit_event.set()  # Set exit event to stop other threads gracefully
-except ValueError as e:
-    print(e)
-    exit_event.set()  # Set exit event to stop other threads gracefully
-except Exception as e:
-    print(f"An unexpected error occurred during Excel processing or thread startup: {e}")
-    exit_event.set()  # Set exit event to stop other threads gracefully
+            # Check if mission was cancelled or commands are finished
+            if mission_cancelled_event.is_set() or commands_finished_event.is_set():
+                print("Mission cancelled or all commands executed. Preparing to land.")
+                exit_event.set()  # Signal main loop to exit and trigger the finally block
 
-# plt.ion()  # Turn on interactive mode for matplotlib for real-time plot updates
-try:
-    # Main loop for frame display and saving
-    while not exit_event.is_set():
-        if latest_frame is not None:
-            display_frame = latest_frame.copy()
-
-            # Check if save_frame_event is set
-            if save_frame_event.is_set():
-                frame_path = os.path.join("sample_input", f"frame_{frame_counter:05d}.jpg")
-                cv2.imwrite(frame_path, display_frame)
-                print(f"Saved frame_{frame_counter:05d}.jpg")
-                frame_counter += 1
-                save_frame_event.clear()  # Clear the event after saving the frame
-
-            # Display the frame using matplotlib
-            rgb_frame = cv2.cvtColor(display_frame, cv2.COLOR_BGR2RGB)
-            if 'fig' not in globals():  # Create figure and axis only once
-                pass
-                # fig, ax = plt.subplots(figsize=(8, 6))  # Adjust figure size as needed
-                # img_plot = ax.imshow(rgb_frame)
-                # ax.set_title("Drone View (Press Ctrl+C in console to stop)")
-                # ax.axis('off')  # Hide axes ticks and labels
-                # plt.tight_layout()  # Adjust layout to prevent labels overlapping
-            else:
-                print()
-                # img_plot.set_data(rgb_frame)  # Update existing plot data
-
-            # plt.draw()  # Redraw the plot
-            # plt.pause(0.01)  # Short pause for UI update and to allow other threads to run
-
-        # Check if mission was cancelled or commands are finished
-        if mission_cancelled_event.is_set() or commands_finished_event.is_set():
-            print("Mission cancelled or all commands executed. Preparing to land.")
-            exit_event.set()  # Signal main loop to exit and trigger the finally block
-
-        time.sleep(0.05)  # Small sleep to prevent busy-waiting in the main display loop
-
-finally:
-    print("Program ending. Attempting to land drone and clean up resources...")
-    # Ensure exit event is set for all threads to terminate gracefully
-    exit_event.set()
-
-    # Wait for all threads to finish, with a timeout
-    threads_to_join = [frame_reader_t, user_input_t, command_executor_t]
-    for t in threads_to_join:
-        if t and t.is_alive():
-            print(f"Waiting for {t.name} to finish...")
-            t.join(timeout=5)  # Increased timeout to allow threads to finish their current operations
-            if t.is_alive():
-                print(f"Warning: {t.name} did not terminate gracefully.")
-
-    # Land the drone and stop the video stream
+            time.sleep(0.05)  # Small sleep to prevent busy-waiting in the main display loop
+
+    finally:
+        print("Program ending. Attempting to land drone and clean up resources...")
+        # Ensure exit event is set for all threads to terminate gracefully
+        exit_event.set()
+
+        # Wait for all threads to finish, with a timeout
+        threads_to_join = [frame_reader_t, user_input_t, command_executor_t]
+        for t in threads_to_join:
+            if t and t.is_alive():
+                print(f"Waiting for {t.name} to finish...")
+                # the executor may be waiting on a command the drone has not answered:
+                # landing before it returns could race that command
+                t.join(timeout=None if t is command_executor_t else 5)
+                if t.is_alive():
+                    print(f"Warning: {t.name} did not terminate gracefully.")
+
+        # Flush frames still queued for saving
+        frame_writer.close()
+        print(f"Frame writer: {frame_writer.stats()}")
+        telemetry.stop()
+
+        # Land the drone and stop the video stream
+        try:
+            if drone:  # Check if drone object was successfully initialized
+                drone.land()
+                drone.streamoff()
+                print("Drone landed and stream off.")
+        except Exception as e:
+            print(f"Error during drone landing or stream off: {e}")
+        finally:
+            plt.close('all')  # Close all matplotlib plots
+            print("Program finished.")
+
+        return mission_engine
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fly a command CSV and save frames before/after each move.")
+    parser.add_argument("--backend", default=None, help="'tello' (default, or $DRONE_BACKEND) or 'sim'")
+    parser.add_argument("--commands", default="data/commands.csv")
+    parser.add_argument("--save-dir", default=None, help=f"where frames are saved (default: {MISSIONS_DIR}/<timestamp>)")
+    parser.add_argument("--save-mode", default=SAVE_MODE, choices=("jpeg", "raw", "video"))
+    parser.add_argument("--no-confirm", action="store_true", help="don't wait for Enter before takeoff")
+    parser.add_argument("--trace", metavar="PATH", help="write a Chrome trace (chrome://tracing, Perfetto) of the mission here")
+    args = parser.parse_args()
+    if args.trace:
+        tracing.enable()
     try:
-        if drone:  # Check if drone object was successfully initialized
-            drone.land()
-            drone.streamoff()
-            print("Drone landed and stream off.")
-    except Exception as e:
-        print(f"Error during drone landing or stream off: {e}")
+        main(args.backend, args.commands, args.save_dir, args.save_mode, confirm=not args.no_confirm)
     finally:
-        plt.close('all')  # Close all matplotlib plots
-        print("Program finished.")
\ No newline at end of file
+        if args.trace:
+            print(f"Trace written to {tracing.export_chrome(args.trace)}")
@@ -1,10 +1,30 @@
-from .pick_wall_point import pick_wall_point
-from .draw_points import draw_points
+from .pick_wall_point import pick_wall_point, pick_wall_points
+from .draw_points import draw_points, classify_grid, PointGrid
 from .connect_points import connect_points
 from .distance_estimation import distance_estimator
-from .save_image import save_image, save_image_with_point
+from .save_image import save_image, save_image_with_point, draw_point, ImageSink
 from .draw_result_on_image import draw_result_on_image
+from .model_registry import registry, warm_up, get_sam
+from .frame import Frame
+from .tour_solver import solve_tour, tour_length
+from .routing import LatticeRouter
+from .pipeline import WallPipeline
+from .stage_cache import StageCache
+from .artifact_store import ArtifactStore
+from .wall_mask import WallMask, as_wall_mask
+from .command_compiler import compile_commands, commands_csv, write_commands_csv
+from .depth_engine import DepthEngine, WallDepthStats
+from .scheduler import StageScheduler, StageError
+from .segmentation_service import SegmentationService, get_segmentation_service
+from . import cpu_backend, tracing
 
 
-__all__ = ["pick_wall_point", "draw_points",
-           "connect_points", "distance_estimator", "save_image", "save_image_with_point", "draw_result_on_image"]
+__all__ = ["pick_wall_point", "pick_wall_points", "draw_points",
+           "connect_points", "distance_estimator", "save_image", "save_image_with_point", "draw_result_on_image",
+           "registry", "warm_up", "get_sam", "draw_point", "ImageSink",
+           "Frame", "WallPipeline", "WallMask", "as_wall_mask",
+           "classify_grid", "PointGrid", "solve_tour", "tour_length",
+           "LatticeRouter", "StageCache", "ArtifactStore",
+           "compile_commands", "commands_csv", "write_commands_csv", "tracing", "cpu_backend",
+           "SegmentationService", "get_segmentation_service",
+           "DepthEngine", "WallDepthStats", "StageScheduler", "StageError"]
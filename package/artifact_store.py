@@ -0,0 +1,123 @@
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from . import tracing
+
+
+DEFAULT_ARTIFACT_DIR = os.environ.get(
+    "WALL_ARTIFACT_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "wall-pipeline", "artifacts"))
+
+# Default disk budget for all stored artifacts together.
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class ArtifactStore:
+    """
+    Content-addressed on-disk store of stage outputs, one ``<key>.npz`` each.
+
+    Keys are the pipeline's stage keys (image hash + parameters), so entries
+    are shared by every user and survive restarts.  The directory is kept
+    under ``max_bytes`` by evicting the least recently used files; recency is
+    the file mtime, which ``load`` refreshes, so the order survives restarts
+    too.  Writes go to a temporary file and are renamed into place.
+    """
+
+    def __init__(self, root=DEFAULT_ARTIFACT_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = os.fspath(root)
+        self.max_bytes = max_bytes
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._sizes = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._scan()
+
+    def _path(self, key):
+        return os.path.join(self.root, f"{key}.npz")
+
+    def _scan(self):
+        entries = []
+        for name in os.listdir(self.root):
+            if not name.endswith(".npz"):
+                continue
+            st = os.stat(os.path.join(self.root, name))
+            entries.append((st.st_mtime, name[:-4], st.st_size))
+        for _, key, size in sorted(entries):
+            self._sizes[key] = size
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self._sizes.values())
+
+    def __contains__(self, key):
+        return key in self._sizes
+
+    def __len__(self):
+        return len(self._sizes)
+
+    @tracing.traced("artifact.load")
+    def load(self, key):
+        """The stored arrays as a dict, or ``None`` on a miss."""
+        with self._lock:
+            if key not in self._sizes:
+                self.misses += 1
+                return None
+            path = self._path(key)
+            try:
+                with np.load(path) as data:
+                    arrays = {name: data[name] for name in data.files}
+                os.utime(path)
+            except (OSError, ValueError):
+                # removed or truncated behind our back
+                self._sizes.pop(key, None)
+                self.misses += 1
+                return None
+            self._sizes.move_to_end(key)
+            self.hits += 1
+            return arrays
+
+    @tracing.traced("artifact.save")
+    def save(self, key, arrays):
+        buf = io.BytesIO()
+        np.savez(buf, **arrays)
+        data = buf.getvalue()
+        with self._lock:
+            path = self._path(key)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+            self._sizes[key] = len(data)
+            self._sizes.move_to_end(key)
+            self._evict()
+
+    def _evict(self):
+        total = self.total_bytes
+        while total > self.max_bytes and len(self._sizes) > 1:
+            key, size = self._sizes.popitem(last=False)
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._sizes):
+                try:
+                    os.remove(self._path(key))
+                except FileNotFoundError:
+                    pass
+            self._sizes.clear()
+
+    def stats(self):
+        return {"entries": len(self), "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes, "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions}
@@ -0,0 +1,124 @@
+import csv
+import io
+import math
+
+import numpy as np
+
+
+# Tello camera field of view (diagonal, degrees) and move command limits (cm).
+TELLO_FOV_DEG = 82.6
+MIN_MOVE_CM = 20
+MAX_MOVE_CM = 500
+
+# Image axis -> (action for a positive step, action for a negative step).
+# The camera faces the wall, so image x is left/right and image y is down/up.
+_AXIS_ACTIONS = (("move_right", "move_left"), ("move_down", "move_up"))
+
+
+def cm_per_pixel(distance_m, image_shape, fov_deg=TELLO_FOV_DEG):
+    """Size of one pixel on a wall ``distance_m`` away, for a pinhole camera."""
+    h, w = image_shape[:2]
+    focal_px = math.hypot(w, h) / 2 / math.tan(math.radians(fov_deg) / 2)
+    return distance_m * 100 / focal_px
+
+
+def simplify(points, tolerance):
+    """
+    Douglas-Peucker simplification of an (N, 2) polyline: the fewest vertices
+    that keep every dropped point within ``tolerance`` of the result.  Runs
+    of collinear pixels collapse to their two ends.
+    """
+    pts = np.asarray(points, dtype=float)
+    if len(pts) < 3:
+        return pts
+    keep = np.zeros(len(pts), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(pts) - 1)]
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        seg = pts[b] - pts[a]
+        rel = pts[a + 1:b] - pts[a]
+        norm = math.hypot(*seg)
+        if norm == 0:
+            dist = np.hypot(rel[:, 0], rel[:, 1])
+        else:
+            dist = np.abs(seg[0] * rel[:, 1] - seg[1] * rel[:, 0]) / norm
+        k = int(np.argmax(dist))
+        if dist[k] > tolerance:
+            m = a + 1 + k
+            keep[m] = True
+            stack.append((a, m))
+            stack.append((m, b))
+    return pts[keep]
+
+
+def _split(action, cm):
+    """One move as equal chunks no longer than ``MAX_MOVE_CM``."""
+    parts = math.ceil(cm / MAX_MOVE_CM)
+    base, extra = divmod(cm, parts)
+    return [(action, base + (1 if k < extra else 0)) for k in range(parts)]
+
+
+def compile_commands(movement, distance_m, image_shape,
+                     fov_deg=TELLO_FOV_DEG, tolerance_cm=5.0):
+    """
+    Tello ``(action, value)`` commands that fly a ``connect_points``
+    movement path on a wall ``distance_m`` metres away.
+
+    The pixel path is simplified (Douglas-Peucker, ``tolerance_cm`` on the
+    wall), each remaining leg is split into its horizontal and vertical
+    parts, and consecutive moves along the same direction are merged.  Legs
+    shorter than ``MIN_MOVE_CM`` are carried over into the next move on that
+    axis, so rounding never accumulates into drift; moves over
+    ``MAX_MOVE_CM`` are split into equal chunks.
+    """
+    if len(movement) < 2:
+        return []
+    scale = cm_per_pixel(distance_m, image_shape, fov_deg)
+    vertices = simplify(movement, tolerance_cm / scale) * scale
+
+    moves = []
+    pending = np.zeros(2)
+    for leg in np.diff(vertices, axis=0):
+        pending += leg
+        for axis in (0, 1):
+            cm = int(round(pending[axis]))
+            if abs(cm) < MIN_MOVE_CM:
+                continue
+            pending[axis] -= cm
+            action = _AXIS_ACTIONS[axis][0 if cm > 0 else 1]
+            if moves and moves[-1][0] == action:
+                moves[-1] = (action, moves[-1][1] + abs(cm))
+            else:
+                moves.append((action, abs(cm)))
+
+    # what is left is under MIN_MOVE_CM per axis; fly it if that gets closer
+    for axis in (0, 1):
+        if abs(pending[axis]) >= MIN_MOVE_CM / 2:
+            action = _AXIS_ACTIONS[axis][0 if pending[axis] > 0 else 1]
+            if moves and moves[-1][0] == action:
+                moves[-1] = (action, moves[-1][1] + MIN_MOVE_CM)
+            else:
+                moves.append((action, MIN_MOVE_CM))
+
+    commands = []
+    for action, cm in moves:
+        commands.extend(_split(action, cm))
+    return commands
+
+
+def commands_csv(commands) -> str:
+    """Commands in the ``action,value`` CSV format ``path_following`` reads."""
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    writer.writerow(["action", "value"])
+    writer.writerows(commands)
+    return buf.getvalue()
+
+
+def write_commands_csv(commands, path):
+    with open(path, "w", newline="") as f:
+        f.write(commands_csv(commands))
+    return path
@@ -1,118 +1,300 @@
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
 import cv2
 import numpy as np
-import itertools
-from skimage.graph import route_through_array
+from scipy import ndimage
+
+from . import tracing
+from .frame import as_bgr
+from .wall_mask import as_wall_mask
+from .draw_points import PointGrid
+from .tour_solver import TOUR_TIME_BUDGET, solve_tour
+from .routing import OFF_WALL_COST, LatticeRouter, route_pixels
+from .coverage import boustrophedon
+
 
+# Largest point count solved exactly with held_karp.  A node cap stands in
+# for the time budget: ~50 ms at 16 points, ~150 ms at 17, and roughly three
+# times slower (twice the memory) with every point after that, so "auto"
+# stays far inside TOUR_TIME_BUDGET without timing the exact solver.
+EXACT_LIMIT = 16
 
-def fast_path(mask, start, goal):
-    cost = np.where(mask, 1.0, 1e6).astype(float)
-    path_rc, _ = route_through_array(
-        cost,
-        (start[1], start[0]),
-        (goal[1], goal[0]),
-        fully_connected=True
-    )
-    return [(c, r) for r, c in path_rc]
+
+def fast_path(mask, start, goal, cost=None):
+    if cost is None:
+        cost = np.where(mask, 1.0, OFF_WALL_COST).astype(float)
+    path, _ = route_pixels(cost, start, goal)
+    return path
 
 
 def chebyshev(a, b):
     return max(abs(a[0] - b[0]), abs(a[1] - b[1]))
 
 
+def chebyshev_matrix(coords):
+    pts = np.asarray(coords)
+    return np.abs(pts[:, None, :] - pts[None, :, :]).max(axis=2)
+
+
+def _subsets_by_size(m):
+    masks = np.arange(1 << m)
+    size = np.zeros(1 << m, dtype=np.int8)
+    for b in range(m):
+        size += (masks >> b) & 1
+    order = np.argsort(size, kind="stable")
+    bounds = np.searchsorted(size[order], np.arange(m + 2))
+    return [order[bounds[s]:bounds[s + 1]] for s in range(m + 1)]
+
+
 def held_karp(dist):
+    """
+    Exact closed tour from node 0 through every node, as a node list that
+    starts and ends at 0.
+
+    Node 0 is fixed, so subsets are bitmasks over nodes 1..n-1.  ``cost[S, k]``
+    is the cheapest path from 0 through ``S`` ending at ``k`` and ``parent[S, k]``
+    the node before ``k`` on it; each subset size is relaxed for all masks at
+    once and the tour is only rebuilt from the parent pointers at the end.
+    """
+    dist = np.asarray(dist, dtype=float)
     n = len(dist)
-    C = {}
-    for k in range(1, n):
-        C[(1 << k, k)] = (dist[0][k], [0, k])
-    for m in range(2, n):
-        for subset in itertools.combinations(range(1, n), m):
-            bits = sum(1 << bit for bit in subset)
-            for k in subset:
-                prev = bits ^ (1 << k)
-                opts = []
-                for j in subset:
-                    if j == k:
-                        continue
-                    cost, path = C[(prev, j)]
-                    opts.append((cost + dist[j][k], path + [k]))
-                C[(bits, k)] = min(opts, key=lambda x: x[0])
-    bits = (1 << n) - 2
-    opts = []
-    for k in range(1, n):
-        cost, path = C[(bits, k)]
-        opts.append((cost + dist[k][0], path + [0]))
-    return min(opts, key=lambda x: x[0])[1]
-
-
-def nearest_neighbor_2opt(dist):
-    n = len(dist)
-    tour = [0]
-    unv = set(range(1, n))
-    cur = 0
-    while unv:
-        nxt = min(unv, key=lambda k: dist[cur][k])
-        unv.remove(nxt)
-        tour.append(nxt)
-        cur = nxt
-    tour.append(0)
-
-    improved = True
-    while improved:
-        improved = False
-        for i in range(1, n - 1):
-            for j in range(i + 1, n):
-                a, b = tour[i - 1], tour[i]
-                c, d = tour[j], tour[j + 1]
-                old = dist[a][b] + dist[c][d]
-                new = dist[a][c] + dist[b][d]
-                if new < old:
-                    tour[i: j + 1] = reversed(tour[i: j + 1])
-                    improved = True
-    return tour
-
-
-def connect_points(grid, results, image_path,
+    if n < 2:
+        return [0] * (n + 1)
+    m = n - 1
+    full = (1 << m) - 1
+    inner = dist[1:, 1:]
+
+    cost = np.full((1 << m, m), np.inf)
+    parent = np.full((1 << m, m), -1, dtype=np.int8)
+    singles = 1 << np.arange(m)
+    cost[singles, np.arange(m)] = dist[0, 1:]
+
+    for layer in _subsets_by_size(m)[2:]:
+        for k in range(m):
+            sel = layer[(layer >> k) & 1 == 1]
+            cand = cost[sel ^ (1 << k)] + inner[:, k]
+            best = cand.argmin(axis=1)
+            cost[sel, k] = cand[np.arange(len(sel)), best]
+            parent[sel, k] = best
+
+    k = int(np.argmin(cost[full] + dist[1:, 0]))
+    bits = full
+    rev = []
+    while k >= 0:
+        rev.append(k + 1)
+        k, bits = int(parent[bits, k]), bits ^ (1 << k)
+    return [0] + rev[::-1] + [0]
+
+
+def nearest_neighbor_2opt(dist=None, coords=None, time_budget=TOUR_TIME_BUDGET):
+    """
+    Heuristic closed tour for inputs too large for ``held_karp``.
+
+    Kept under its old name; the work is done by ``tour_solver.solve_tour``
+    (candidate lists, 2-opt + Or-opt, wall-clock budget).  Pass ``coords``
+    instead of ``dist`` to avoid building an n x n matrix for Chebyshev tours.
+    """
+    return solve_tour(coords=coords, dist=dist, time_budget=time_budget)
+
+
+def _solve(coords, dist, planner, exact_limit, time_budget):
+    """Closed tour over one set of waypoints; also the process-pool job."""
+    if planner == "auto":
+        planner = "held_karp" if len(coords) <= exact_limit else "nearest_neighbor_2opt"
+    if planner == "held_karp":
+        return held_karp(chebyshev_matrix(coords) if dist is None else dist)
+    if planner == "nearest_neighbor_2opt":
+        return nearest_neighbor_2opt(dist=dist, coords=coords,
+                                     time_budget=time_budget)
+    raise ValueError(f"Unknown planner {planner!r}; use 'auto', 'held_karp', "
+                     "'nearest_neighbor_2opt' or 'boustrophedon'")
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+# fork() from a threaded process (torch, Streamlit, StageScheduler workers)
+# can copy a lock some other thread holds; start workers from a clean server.
+_POOL_START_METHOD = ("forkserver" if "forkserver" in multiprocessing.get_all_start_methods()
+                      else "spawn")
+# Rough in-process heuristic solve time per node, and the cost of starting
+# the worker processes (cold) or of a round trip to running ones (warm).
+_SOLVE_S_PER_NODE = 3e-4
+_POOL_START_S = 1.0
+_POOL_CALL_S = 0.05
+
+
+def _process_pool(workers):
+    with _pools_lock:
+        if workers not in _pools:
+            _pools[workers] = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context(_POOL_START_METHOD))
+        return _pools[workers]
+
+
+def _drop_pool(workers, error):
+    print(f"Tour solver pool failed ({type(error).__name__}); solving in-process")
+    with _pools_lock:
+        pool = _pools.pop(workers, None)
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _pool_pays(sizes, workers, time_budget):
+    """Whether solving components of ``sizes`` nodes in parallel beats the pool's overhead."""
+    if (workers or os.cpu_count() or 1) < 2:
+        return False
+    est = sorted(min(time_budget, n * _SOLVE_S_PER_NODE) for n in sizes)
+    # every job but the longest runs alongside it
+    overhead = _POOL_CALL_S if workers in _pools else _POOL_START_S
+    return sum(est[:-1]) > overhead
+
+
+@atexit.register
+def close_pools():
+    """Shut down the tour solver's worker processes (also run at exit)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _join_cycles(cycles, coords, first):
+    """
+    Chain per-component cycles into one closed tour starting at node
+    ``first``: each next component is the one closest to where the previous
+    finished, entered at its closest node.
+    """
+    remaining = list(range(len(cycles)))
+    order = []
+    entry = first
+    k = next(c for c in remaining if entry in cycles[c])
+    while True:
+        remaining.remove(k)
+        cycle = cycles[k]
+        p = cycle.index(entry)
+        order.extend(cycle[p:] + cycle[:p])
+        if not remaining:
+            break
+        end = coords[order[-1]]
+        best = None
+        for c in remaining:
+            hops = np.abs(coords[cycles[c]] - end).max(axis=1)
+            j = int(np.argmin(hops))
+            if best is None or hops[j] < best[0]:
+                best = (hops[j], c, cycles[c][j])
+        _, k, entry = best
+    return order + [order[0]]
+
+
+def plan_components(grid, router, risk=1, dist=None, planner="auto",
+                    exact_limit=EXACT_LIMIT, time_budget=TOUR_TIME_BUDGET,
+                    workers=None):
+    """
+    Closed tour over ``router``'s waypoints, solved per connected wall region.
+
+    Waypoints are split into 8-connected components on the grid.  Components
+    that need the heuristic solver are solved in parallel in a process pool
+    (``workers`` processes, ``None`` for one per core, ``1`` to stay
+    in-process) when their estimated solve time outweighs starting the
+    workers; small ones are solved exactly in-process.  "Small" is a node
+    count, ``exact_limit``, not ``time_budget``: the budget only bounds the
+    heuristic solver.  A broken pool is dropped and its jobs solved
+    in-process.  The component tours are then chained nearest-first.
+    """
+    labels, count = ndimage.label(grid.selected(risk),
+                                  structure=np.ones((3, 3), dtype=int))
+    cells = grid.cells(risk)
+    component = labels[cells[:, 0], cells[:, 1]] - 1
+    coords = np.asarray(router.coords)
+    if count <= 1:
+        return _solve(router.coords, dist, planner, exact_limit, time_budget)
+
+    members = [np.flatnonzero(component == c) for c in range(count)]
+    jobs = []
+    for idx in members:
+        sub = None if dist is None else dist[np.ix_(idx, idx)]
+        jobs.append(([tuple(p) for p in coords[idx].tolist()], sub,
+                     planner, exact_limit, time_budget))
+
+    heavy = [c for c, idx in enumerate(members) if len(idx) > exact_limit]
+    futures = {}
+    if (workers != 1 and len(heavy) > 1
+            and _pool_pays([len(members[c]) for c in heavy], workers, time_budget)):
+        try:
+            pool = _process_pool(workers)
+            futures = {c: pool.submit(_solve, *jobs[c]) for c in heavy}
+        except (BrokenProcessPool, OSError, RuntimeError) as e:
+            _drop_pool(workers, e)
+            futures = {}
+
+    cycles = []
+    for c, idx in enumerate(members):
+        local = None
+        if c in futures:
+            try:
+                local = futures[c].result()
+            except BrokenProcessPool as e:
+                _drop_pool(workers, e)
+                futures = {}
+        if local is None:
+            local = _solve(*jobs[c])
+        cycles.append(idx[local[:-1]].tolist())
+    return _join_cycles(cycles, coords, first=0)
+
+
+def connect_points(grid, wall_mask, image,
                    gap=50,
                    point_radius=5,
                    line_color=(255, 255, 255),
                    alpha=0.5,
-                   risk=1):
+                   risk=1,
+                   exact_limit=EXACT_LIMIT,
+                   time_budget=TOUR_TIME_BUDGET,
+                   distance="chebyshev",
+                   planner="auto",
+                   workers=None):
 
-    masks = results[0].masks.data.cpu().numpy()
-    wall_mask = np.any(masks, axis=0)
-    H, W = wall_mask.shape
+    wall_mask = as_wall_mask(wall_mask)
 
-    ys = list(range(0, H, gap))
-    xs = list(range(0, W, gap))
-    coords = []
-    for i, y in enumerate(ys):
-        for j, x in enumerate(xs):
-            if grid[i][j] == 'G' or (risk == 1 and grid[i][j] == 'Y'):
-                coords.append((x, y))
+    if not isinstance(grid, PointGrid):
+        grid = PointGrid.from_strings(grid, gap)
+    router = LatticeRouter(wall_mask, grid, risk)
+    coords = router.coords
 
     n = len(coords)
     if n < 2:
-        return cv2.imread(image_path), []
+        return as_bgr(image).copy(), []
 
-    dist = [[0] * n for _ in range(n)]
-    for i in range(n):
-        for j in range(i + 1, n):
-            d = chebyshev(coords[i], coords[j])
-            dist[i][j] = dist[j][i] = d
-
-    if n <= 10:
-        tour = held_karp(dist)
+    if distance == "geodesic" and planner != "boustrophedon":
+        dist = router.geodesic_matrix()
+    elif distance in ("chebyshev", "geodesic"):
+        dist = None
     else:
-        tour = nearest_neighbor_2opt(dist)
+        raise ValueError(f"Unknown distance {distance!r}; "
+                         "use 'chebyshev' or 'geodesic'")
+
+    with tracing.span("tour.solve", planner=planner, distance=distance, nodes=n):
+        if planner == "boustrophedon":
+            cells = boustrophedon(grid.selected(risk))
+            tour = router.node_of[cells[:, 0], cells[:, 1]].tolist()
+            tour.append(tour[0])  # closed at node 0, like the other planners' tours
+        else:
+            tour = plan_components(grid, router, risk, dist, planner,
+                                   exact_limit, time_budget, workers)
 
-    movement = []
-    for u, v in zip(tour, tour[1:]):
-        seg = fast_path(wall_mask, coords[u], coords[v])
-        if movement:
-            movement.pop()
-        movement.extend(seg)
+    with tracing.span("route.follow", hops=len(tour) - 1):
+        movement = router.follow(tour)
+    tracing.counter("tour.points", n)
+    tracing.counter("tour.length_px", len(movement) - 1)
 
-    img = cv2.imread(image_path)
+    img = as_bgr(image).copy()
 
     for pt in coords:
         cv2.circle(img, pt, point_radius, (0, 255, 0), -1)
@@ -0,0 +1,94 @@
+import numpy as np
+
+
+def _row_runs(selected):
+    """Runs of True per row as ``runs[i] = [(j0, j1), ...]`` with inclusive ends."""
+    rows, cols = selected.shape
+    padded = np.zeros((rows, cols + 2), dtype=np.int8)
+    padded[:, 1:-1] = selected
+    step = np.diff(padded, axis=1)
+    starts = np.argwhere(step == 1)
+    ends = np.argwhere(step == -1)
+    runs = [[] for _ in range(rows)]
+    for (i, j0), (_, j1) in zip(starts.tolist(), ends.tolist()):
+        runs[i].append((j0, j1 - 1))
+    return runs
+
+
+def _link_rows(prev, cur):
+    """8-connected overlaps between the sorted runs of two consecutive rows."""
+    up = [[] for _ in cur]
+    down = [[] for _ in prev]
+    p = 0
+    for c, (a0, a1) in enumerate(cur):
+        while p < len(prev) and prev[p][1] < a0 - 1:
+            p += 1
+        q = p
+        while q < len(prev) and prev[q][0] <= a1 + 1:
+            up[c].append(q)
+            down[q].append(c)
+            q += 1
+    return up, down
+
+
+def decompose(selected):
+    """
+    Split the flyable grid cells into monotone cells: stacks of row runs in
+    which every run touches exactly one run above and one below.  A cell ends
+    wherever the wall splits or merges (around a window, at a door).
+    """
+    runs = _row_runs(selected)
+    cells = []
+    prev, prev_cells = [], []
+    for i, cur in enumerate(runs):
+        up, down = _link_rows(prev, cur)
+        cur_cells = []
+        for c, run in enumerate(cur):
+            if len(up[c]) == 1 and len(down[up[c][0]]) == 1:
+                cell = prev_cells[up[c][0]]
+            else:
+                cell = len(cells)
+                cells.append([])
+            cells[cell].append((i, run))
+            cur_cells.append(cell)
+        prev, prev_cells = cur, cur_cells
+    return cells
+
+
+def _sweep(cell):
+    """Serpentine (i, j) order over one monotone cell."""
+    order = []
+    for k, (i, (j0, j1)) in enumerate(cell):
+        js = range(j0, j1 + 1) if k % 2 == 0 else range(j1, j0 - 1, -1)
+        order.extend((i, j) for j in js)
+    return order
+
+
+def boustrophedon(selected):
+    """
+    Coverage order over every True cell of ``selected``, as an (N, 2) array of
+    ``(i, j)`` grid indices.  Each monotone cell is swept row by row in a
+    serpentine; cells are chained greedily, entering each from whichever end is
+    closest to where the previous sweep finished.  Work is linear in the
+    number of grid cells plus the (small) number of monotone cells squared.
+    The order is open and starts at the first row-major cell; ``connect_points``
+    closes it back there.
+    """
+    sweeps = [_sweep(cell) for cell in decompose(selected)]
+    if not sweeps:
+        return np.empty((0, 2), dtype=np.int64)
+
+    order = list(sweeps[0])
+    remaining = set(range(1, len(sweeps)))
+    while remaining:
+        ci, cj = order[-1]
+        best = None
+        for s in remaining:
+            for rev, (i, j) in ((False, sweeps[s][0]), (True, sweeps[s][-1])):
+                hop = max(abs(i - ci), abs(j - cj))
+                if best is None or hop < best[0]:
+                    best = (hop, s, rev)
+        _, s, rev = best
+        remaining.remove(s)
+        order.extend(sweeps[s][::-1] if rev else sweeps[s])
+    return np.asarray(order, dtype=np.int64)
@@ -0,0 +1,269 @@
+import os
+import types
+
+import numpy as np
+import psutil
+from PIL import Image
+
+from . import tracing
+
+
+# "torch": the transformers pipelines (fp32 on CPU).  "onnx": the same model
+# exported to ONNX and run by ONNX Runtime.  "onnx-int8": that export with
+# dynamically quantised int8 weights.
+INFERENCE_BACKENDS = ("torch", "onnx", "onnx-int8")
+DEFAULT_INFERENCE_BACKEND = os.environ.get("WALL_INFERENCE_BACKEND", "torch")
+
+DEFAULT_EXPORT_DIR = os.environ.get(
+    "WALL_EXPORT_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "wall-pipeline", "onnx"))
+
+ONNX_OPSET = 17
+
+
+def cpu_threads() -> int:
+    """Intra-op threads: ``WALL_CPU_THREADS``, else one per physical core."""
+    env = os.environ.get("WALL_CPU_THREADS")
+    if env:
+        return int(env)
+    return psutil.cpu_count(logical=False) or os.cpu_count() or 1
+
+
+def configure_torch_threads(threads: int | None = None):
+    """One intra-op thread per physical core (hyper-threads only contend) and
+    a single inter-op thread: concurrent stages come from StageScheduler."""
+    import torch
+    torch.set_num_threads(threads or cpu_threads())
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # only settable before the first parallel op
+    return torch.get_num_threads()
+
+
+def session_options(threads: int | None = None):
+    import onnxruntime as ort
+    opts = ort.SessionOptions()
+    opts.intra_op_num_threads = threads or cpu_threads()
+    opts.inter_op_num_threads = 1
+    opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return opts
+
+
+def export_path(model_name: str, backend: str, export_dir=DEFAULT_EXPORT_DIR):
+    variant = "int8" if backend == "onnx-int8" else "fp32"
+    return os.path.join(os.fspath(export_dir), f"{model_name.replace('/', '--')}-{variant}.onnx")
+
+
+def _export(module, example, path, output_name, dynamic_axes):
+    """``torch.onnx.export`` of ``module(pixel_values)``, written atomically."""
+    import torch
+
+    class OutputOnly(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, pixel_values):
+            return getattr(self.model(pixel_values=pixel_values), output_name)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with torch.no_grad():  # the tracer cannot use inference-mode tensors
+        torch.onnx.export(OutputOnly(module.eval()), (example,), tmp,
+                          input_names=["pixel_values"], output_names=[output_name],
+                          dynamic_axes=dynamic_axes, opset_version=ONNX_OPSET)
+    os.replace(tmp, path)
+
+
+def _quantize(fp32_path, int8_path):
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    tmp = f"{int8_path}.{os.getpid()}.tmp"
+    quantize_dynamic(fp32_path, tmp, weight_type=QuantType.QInt8)
+    os.replace(tmp, int8_path)
+
+
+def exported_model(model_name, backend, load_model, example, output_name,
+                   dynamic_axes, export_dir=DEFAULT_EXPORT_DIR):
+    """
+    Path of the ONNX file for ``model_name`` under ``backend``, exporting
+    (and quantising) on first use.  Files are keyed by model name and kept
+    in ``export_dir``, so later processes load them directly.
+    """
+    if backend not in INFERENCE_BACKENDS[1:]:
+        raise ValueError(f"Unknown ONNX backend {backend!r}, expected one of {INFERENCE_BACKENDS[1:]}")
+    fp32 = export_path(model_name, "onnx", export_dir)
+    if not os.path.exists(fp32):
+        with tracing.span("onnx.export", model=model_name):
+            print(f"Exporting {model_name} to {fp32} ...")
+            _export(load_model(), example, fp32, output_name, dynamic_axes)
+    if backend == "onnx":
+        return fp32
+    int8 = export_path(model_name, backend, export_dir)
+    if not os.path.exists(int8):
+        with tracing.span("onnx.quantize", model=model_name):
+            print(f"Quantising {fp32} to int8 ...")
+            _quantize(fp32, int8)
+    return int8
+
+
+def _session(path, threads=None):
+    import onnxruntime as ort
+    return ort.InferenceSession(path, session_options(threads),
+                                providers=["CPUExecutionProvider"])
+
+
+class _OnnxModel:
+    """``model(pixel_values=...)`` returning a namespace with one numpy output."""
+
+    def __init__(self, session, config, output_name):
+        self.session = session
+        self.config = config
+        self.output_name = output_name
+
+    def __call__(self, pixel_values):
+        out = self.session.run([self.output_name],
+                               {"pixel_values": np.asarray(pixel_values, dtype=np.float32)})
+        return types.SimpleNamespace(**{self.output_name: out[0]})
+
+
+class OnnxSegformer:
+    """
+    ``image-segmentation`` pipeline look-alike on an ONNX Runtime session.
+
+    ``image_processor``/``model`` serve ``pick_wall_point``'s logits mode
+    (``framework`` is "np"); calling it returns the pipeline's per-label
+    masks for the default mode.
+    """
+
+    framework = "np"
+
+    def __init__(self, session, processor, config):
+        self.image_processor = processor
+        self.model = _OnnxModel(session, config, "logits")
+
+    def __call__(self, image):
+        import cv2
+        w, h = image.size
+        inputs = self.image_processor(images=image, return_tensors="np")
+        logits = self.model(**inputs).logits[0]
+        # the pipeline upsamples the logits to the image before its argmax;
+        # only classes that win somewhere at logit resolution are upsampled
+        present = np.unique(logits.argmax(axis=0))
+        up = np.stack([cv2.resize(logits[c], (w, h), interpolation=cv2.INTER_LINEAR)
+                       for c in present])
+        labels = present[up.argmax(axis=0)]
+        results = []
+        for label in np.unique(labels):
+            mask = (labels == label).astype(np.uint8) * 255
+            results.append({"label": self.model.config.id2label[int(label)],
+                            "score": None, "mask": Image.fromarray(mask)})
+        return results
+
+
+class OnnxDepth:
+    """``depth-estimation`` pipeline look-alike on an ONNX Runtime session."""
+
+    framework = "np"
+
+    def __init__(self, session, processor, config):
+        self.image_processor = processor
+        self.model = _OnnxModel(session, config, "predicted_depth")
+
+    def __call__(self, image):
+        import torch
+        w, h = image.size
+        inputs = self.image_processor(images=image, return_tensors="np")
+        depth = self.model(**inputs).predicted_depth
+        # the pipeline's own post-processing (padding removal, resize to the image)
+        outputs = types.SimpleNamespace(predicted_depth=torch.from_numpy(depth))
+        predicted = self.image_processor.post_process_depth_estimation(
+            outputs, [(h, w)])[0]["predicted_depth"]
+        predicted = predicted.reshape(1, 1, *predicted.shape[-2:])
+        if predicted.shape[-2:] != (h, w):
+            predicted = torch.nn.functional.interpolate(predicted, size=(h, w), mode="bilinear")
+        return {"predicted_depth": predicted[0]}
+
+
+def load_semseg(model_name, backend, export_dir=DEFAULT_EXPORT_DIR, threads=None):
+    from transformers import AutoConfig, AutoImageProcessor, AutoModelForSemanticSegmentation
+    processor = AutoImageProcessor.from_pretrained(model_name)
+    example = processor(images=Image.new("RGB", (640, 480)), return_tensors="pt")["pixel_values"]
+    path = exported_model(
+        model_name, backend,
+        lambda: AutoModelForSemanticSegmentation.from_pretrained(model_name),
+        example, "logits",
+        {"pixel_values": {0: "batch", 2: "height", 3: "width"},
+         "logits": {0: "batch", 2: "logit_height", 3: "logit_width"}},
+        export_dir)
+    return OnnxSegformer(_session(path, threads), processor,
+                         AutoConfig.from_pretrained(model_name))
+
+
+def load_depth(model_name, backend, export_dir=DEFAULT_EXPORT_DIR, threads=None):
+    from transformers import AutoConfig, AutoImageProcessor, AutoModelForDepthEstimation
+    processor = AutoImageProcessor.from_pretrained(model_name)
+    example = processor(images=Image.new("RGB", (640, 480)), return_tensors="pt")["pixel_values"]
+    path = exported_model(
+        model_name, backend,
+        lambda: AutoModelForDepthEstimation.from_pretrained(model_name),
+        example, "predicted_depth",
+        {"pixel_values": {0: "batch", 2: "height", 3: "width"},
+         "predicted_depth": {0: "batch", 1: "depth_height", 2: "depth_width"}},
+        export_dir)
+    return OnnxDepth(_session(path, threads), processor,
+                     AutoConfig.from_pretrained(model_name))
+
+
+def mask_iou(a, b) -> float:
+    a = np.asarray(a, dtype=bool)
+    b = np.asarray(b, dtype=bool)
+    union = np.count_nonzero(a | b)
+    return 1.0 if union == 0 else np.count_nonzero(a & b) / union
+
+
+def depth_error(reference, depth, mask=None):
+    """Mean absolute relative error and largest absolute error (metres), over ``mask``."""
+    reference = np.asarray(reference, dtype=np.float64)
+    depth = np.asarray(depth, dtype=np.float64)
+    if mask is not None:
+        reference, depth = reference[mask], depth[mask]
+    diff = np.abs(depth - reference)
+    return {"abs_rel": float(np.mean(diff / np.maximum(reference, 1e-6))),
+            "max_abs_m": float(diff.max()) if diff.size else 0.0}
+
+
+def _outputs(backend, images, semseg_model, depth_model):
+    from .depth_engine import depth_array
+    from .model_registry import get_depth_pipeline
+    from .pick_wall_point import pick_wall_points
+    masks, depths = [], []
+    for image in images:
+        bw_image, _ = pick_wall_points(image, semseg_model, max_points=1,
+                                       mode="logits", backend=backend)
+        masks.append(np.asarray(bw_image) > 0)
+        if depth_model:
+            out = get_depth_pipeline(depth_model, backend=backend)(image)
+            depths.append(depth_array(out, image.size))
+    return masks, depths
+
+
+def validate(backend, images, semseg_model, depth_model=None):
+    """
+    Compare ``backend`` with the fp32 torch pipelines on ``images`` (PIL):
+    wall-mask IoU and depth error on the reference wall pixels.  The two
+    backends run one after the other, so only one copy of each model is
+    resident.
+    """
+    ref_masks, ref_depths = _outputs("torch", images, semseg_model, depth_model)
+    masks, depths = _outputs(backend, images, semseg_model, depth_model)
+    ious = [mask_iou(a, b) for a, b in zip(ref_masks, masks)]
+    report = {"backend": backend, "images": len(images),
+              "iou_mean": round(float(np.mean(ious)), 4),
+              "iou_min": round(float(np.min(ious)), 4)}
+    if depth_model:
+        errors = [depth_error(r, d, m) for r, d, m in zip(ref_depths, depths, ref_masks)]
+        report["depth_abs_rel_mean"] = round(float(np.mean([e["abs_rel"] for e in errors])), 4)
+        report["depth_max_abs_m"] = round(max(e["max_abs_m"] for e in errors), 4)
+    return report
@@ -0,0 +1,161 @@
+from dataclasses import dataclass, field
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from . import tracing
+from .frame import Frame
+from .model_registry import DEFAULT_DEPTH_MODEL, get_depth_pipeline
+from .wall_mask import as_wall_mask
+
+
+# Depth is inferred with the image's longer side scaled down to this many pixels.
+DEFAULT_MAX_SIDE = 768
+# Bins of the depth histogram the percentiles are read from.
+HISTOGRAM_BINS = 4096
+# Rows of the wall bounding box upsampled at a time.
+CHUNK_ROWS = 256
+
+
+@dataclass(frozen=True)
+class WallDepthStats:
+    """Depth (metres) over the wall pixels."""
+    count: int
+    min: float
+    max: float
+    mean: float
+    percentiles: dict = field(default_factory=dict)
+
+    @property
+    def median(self) -> float:
+        return self.percentiles[50]
+
+
+def depth_array(out, size=None):
+    """(H, W) float32 depth from a depth pipeline's output, resized to ``size`` (w, h) if given."""
+    depth = out["predicted_depth"]
+    depth = depth.float().cpu().numpy() if hasattr(depth, "cpu") else np.asarray(depth)
+    depth = np.squeeze(depth).astype(np.float32)
+    if size is not None and depth.shape != (size[1], size[0]):
+        depth = cv2.resize(depth, size, interpolation=cv2.INTER_LINEAR)
+    return depth
+
+
+def _percentile(hist, cum, lo, width, q):
+    target = q / 100 * cum[-1]
+    i = min(int(np.searchsorted(cum, target)), len(hist) - 1)
+    before = cum[i - 1] if i else 0
+    frac = (target - before) / hist[i] if hist[i] else 0.0
+    return float(lo + (i + frac) * width)
+
+
+class DepthEngine:
+    """
+    Wall distance statistics from one depth model.
+
+    ``model`` is a DepthAnythingV2-style model (``infer_image``) or a
+    depth-estimation pipeline; without one, the registry's pipeline for
+    ``model_name`` is used, so it is loaded once per process.
+
+    Depth is inferred on the frame scaled to ``max_side`` and bilinearly
+    upsampled (pixel centres aligned) only inside the wall mask's bounding
+    box, ``CHUNK_ROWS`` rows at a time.  Each chunk updates the running
+    min/max/sum and a fixed-range histogram, so the statistics take one pass
+    and neither a full-resolution depth map nor a full copy of the wall
+    depths is ever built.
+    """
+
+    def __init__(self, model=None, model_name: str = DEFAULT_DEPTH_MODEL,
+                 input_size: int = 518, max_side: int | None = DEFAULT_MAX_SIDE,
+                 percentiles=(5, 50, 95)):
+        self.model = model
+        self.model_name = model_name
+        self.input_size = input_size
+        self.max_side = max_side
+        self.percentiles = tuple(percentiles)
+
+    def infer(self, image):
+        """Depth map of ``image`` at inference resolution, and that resolution's (w, h)."""
+        frame = Frame.from_any(image)
+        h, w = frame.shape
+        scale = 1.0
+        if self.max_side and max(h, w) > self.max_side:
+            scale = self.max_side / max(h, w)
+        size = (max(1, round(w * scale)), max(1, round(h * scale)))
+        rgb = frame.rgb
+        if size != (w, h):
+            # area averaging only pays off (against aliasing) past 2x
+            interpolation = cv2.INTER_AREA if scale < 0.5 else cv2.INTER_LINEAR
+            rgb = cv2.resize(frame.bgr, size, interpolation=interpolation)[..., ::-1]
+
+        model = self.model if self.model is not None else get_depth_pipeline(self.model_name)
+        with tracing.span("depth.inference", width=size[0], height=size[1]):
+            if hasattr(model, "infer_image"):
+                depth = np.asarray(model.infer_image(rgb, self.input_size), dtype=np.float32)
+                if depth.shape != (size[1], size[0]):
+                    depth = cv2.resize(depth, size, interpolation=cv2.INTER_LINEAR)
+            else:
+                depth = depth_array(model(Image.fromarray(np.ascontiguousarray(rgb))), size)
+        return depth, size
+
+    def wall_stats(self, image, sam_results) -> WallDepthStats:
+        frame = Frame.from_any(image)
+        wall = as_wall_mask(sam_results)
+        if wall.shape != frame.shape:
+            raise ValueError(f"Wall mask shape {wall.shape} does not match "
+                             f"the image's {frame.shape}")
+        if wall.bbox is None:
+            raise ValueError("No wall pixels detected in the mask.")
+
+        depth, _ = self.infer(frame)
+        with tracing.span("depth.stats", pixels=wall.area):
+            return self._stats(depth, wall, frame.shape)
+
+    def _stats(self, depth, wall, shape):
+        h, w = shape
+        sh, sw = depth.shape
+        x0, y0, x1, y1 = wall.bbox
+
+        # source pixels feeding the box (bilinear taps), bounding the histogram range
+        sx = (np.arange(x0, x1) + 0.5) * (sw / w) - 0.5
+        sy = (np.arange(y0, y1) + 0.5) * (sh / h) - 0.5
+        src = depth[max(0, int(np.floor(sy[0]))):min(sh, int(np.floor(sy[-1])) + 2),
+                    max(0, int(np.floor(sx[0]))):min(sw, int(np.floor(sx[-1])) + 2)]
+        lo, hi = float(src.min()), float(src.max())
+        # bilinear values never leave [lo, hi], so hi lands in the last bin and no clip is needed
+        width = max(hi - lo, 1e-6) / (HISTOGRAM_BINS - 1)
+        inv_width = np.float32(1 / width)
+
+        hist = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+        count, total = 0, 0.0
+        vmin, vmax = np.inf, -np.inf
+        for r0 in range(y0, y1, CHUNK_ROWS):
+            r1 = min(y1, r0 + CHUNK_ROWS)
+            mask = wall.mask[r0:r1, x0:x1]
+            if not mask.any():
+                continue
+            if (sh, sw) == (h, w):
+                chunk = depth[r0:r1, x0:x1]
+            else:
+                # chunk pixel (i, j) samples depth at (sy[r0 - y0 + i], sx[j])
+                m = np.float32([[sw / w, 0, sx[0]], [0, sh / h, sy[r0 - y0]]])
+                chunk = cv2.warpAffine(depth, m, (x1 - x0, r1 - r0),
+                                       flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+                                       borderMode=cv2.BORDER_REPLICATE)
+            vals = chunk[mask]
+            count += vals.size
+            total += float(vals.sum(dtype=np.float64))
+            vmin = min(vmin, float(vals.min()))
+            vmax = max(vmax, float(vals.max()))
+            if not self.percentiles:
+                continue
+            bins = ((vals - np.float32(lo)) * inv_width).astype(np.intp)
+            hist += np.bincount(bins, minlength=HISTOGRAM_BINS)
+
+        cum = np.cumsum(hist) if self.percentiles else None
+        return WallDepthStats(
+            count=count, min=vmin, max=vmax, mean=total / count,
+            percentiles={q: min(vmax, max(vmin, _percentile(hist, cum, lo, width, q)))
+                         for q in self.percentiles})
+
@@ -1,40 +1,25 @@
-import cv2
-import numpy as np
+from .depth_engine import DepthEngine
 
 
 def distance_estimator(image_path,
                        sam_results,
                        depth_anything_model,
-                       input_size: int):
+                       input_size: int,
+                       max_side: int | None = None):
     """
     Given:
-      - image_path:         path to the RGB image file
-      - sam_results:        SAM.predict(...) output, with .masks.data (Tensor[N,H,W])
+      - image_path:         path to the image file, or an already decoded BGR array
+      - sam_results:        WallMask, or SAM.predict(...) output with .masks.data (Tensor[N,H,W])
       - depth_anything_model: an instance of DepthAnythingV2 already .to(DEVICE).eval()
       - input_size:         the int you passed to depth_anything.infer_image
+      - max_side:           infer depth on the image scaled to this longer side
+                            (None: depth_engine.DEFAULT_MAX_SIDE)
 
     Returns:
       (farthest_m, closest_m): tuple of floats, meters from camera→wall
     """
-    # 1) Load the image and convert to RGB numpy
-    frame_bgr = cv2.imread(image_path)
-    if frame_bgr is None:
-        raise FileNotFoundError(f"Could not read {image_path}")
-    frame_rgb = frame_bgr[..., ::-1]
-
-    # 2) Run the depth model
-    depth_map = depth_anything_model.infer_image(frame_rgb, input_size)
-    # depth_map is a 2D numpy array of floats (meters)
-
-    # 3) Build the boolean wall mask from SAM
-    masks = sam_results[0].masks.data.cpu().numpy()  # (N, H, W)
-    wall_mask = np.any(masks, axis=0)                # (H, W) bool
-
-    # 4) Extract wall depths and compute extremes
-    wall_vals = depth_map[wall_mask]
-    if wall_vals.size == 0:
-        raise ValueError("No wall pixels detected in the mask.")
-
-    farthest_m = float(wall_vals.max())
-    closest_m = float(wall_vals.min())
-    return farthest_m, closest_m
+    # only the extremes are needed, so the engine skips its percentile histogram
+    engine = DepthEngine(depth_anything_model, input_size=input_size, percentiles=(),
+                         **({} if max_side is None else {"max_side": max_side}))
+    stats = engine.wall_stats(image_path, sam_results)
+    return stats.max, stats.min
@@ -2,48 +2,143 @@
 import cv2
 import numpy as np
 
+from . import tracing
+from .frame import as_bgr
+from .wall_mask import as_wall_mask
 
-def draw_points(results, image_path, gap=50, point_radius=5, thickness=-1):
-    masks = results[0].masks.data.cpu().numpy()
-    combined_mask = np.any(masks, axis=0)
-    H, W = combined_mask.shape
-
-    ys = list(range(0, H, gap))
-    xs = list(range(0, W, gap))
-    grid = [['' for _ in xs] for _ in ys]
-
-    for i, y in enumerate(ys):
-        for j, x in enumerate(xs):
-            grid[i][j] = 'G' if combined_mask[y, x] else 'R'
-
-    neigh8 = [(-1, -1), (-1, 0), (-1, 1), (0, -1),
-              (0, 1), (1, -1), (1, 0), (1, 1)]
-    for i in range(len(ys)):
-        for j in range(len(xs)):
-            if grid[i][j] == 'G':
-                for dy, dx in neigh8:
-                    ni, nj = i+dy, j+dx
-                    if 0 <= ni < len(ys) and 0 <= nj < len(xs):
-                        if grid[ni][nj] == 'R':
-                            grid[i][j] = 'Y'
-                            break
-
-    last_i, last_j = len(ys)-1, len(xs)-1
-    for j in range(len(xs)):
-        grid[0][j] = 'R'
-        grid[last_i][j] = 'R'
-    for i in range(len(ys)):
-        grid[i][0] = 'R'
-        grid[i][last_j] = 'R'
-
-    img = cv2.imread(image_path)
-    color_map = {
-        'G': (0, 255,   0),
-        'Y': (0, 255, 255),
-        'R': (0,   0, 255),
-    }
-    for i, y in enumerate(ys):
-        for j, x in enumerate(xs):
-            col = color_map[grid[i][j]]
-            cv2.circle(img, (x, y), point_radius, col, thickness)
-    return img, grid
\ No newline at end of file
+
+LABEL_R, LABEL_Y, LABEL_G = 0, 1, 2
+LABEL_CHARS = np.array(['R', 'Y', 'G'])
+LABEL_COLORS = np.array([
+    (0,   0, 255),  # R
+    (0, 255, 255),  # Y
+    (0, 255,   0),  # G
+], dtype=np.uint8)
+
+
+class PointGrid:
+    """
+    Classified grid of waypoints spaced ``gap`` pixels apart.
+
+    ``labels`` is a ``uint8`` array of ``LABEL_R``/``LABEL_Y``/``LABEL_G``;
+    ``ys``/``xs`` are the pixel rows/columns of the grid lines.  Indexing the
+    grid (``grid[i][j]``) still yields the old ``'G'``/``'Y'``/``'R'`` strings.
+    """
+
+    def __init__(self, labels: np.ndarray, ys: np.ndarray, xs: np.ndarray, gap: int):
+        self.labels = labels
+        self.ys = ys
+        self.xs = xs
+        self.gap = gap
+
+    @classmethod
+    def from_strings(cls, rows, gap: int):
+        chars = np.array(rows, dtype='<U1')
+        labels = np.full(chars.shape, LABEL_R, dtype=np.uint8)
+        labels[chars == 'Y'] = LABEL_Y
+        labels[chars == 'G'] = LABEL_G
+        ys = np.arange(labels.shape[0]) * gap
+        xs = np.arange(labels.shape[1]) * gap
+        return cls(labels, ys, xs, gap)
+
+    @property
+    def shape(self):
+        return self.labels.shape
+
+    def __len__(self):
+        return self.labels.shape[0]
+
+    def __getitem__(self, i):
+        return LABEL_CHARS[self.labels[i]].tolist()
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def to_strings(self):
+        return LABEL_CHARS[self.labels].tolist()
+
+    def selected(self, risk=1) -> np.ndarray:
+        """Boolean grid of flyable cells: 'G', plus 'Y' when ``risk == 1``."""
+        if risk == 1:
+            return self.labels != LABEL_R
+        return self.labels == LABEL_G
+
+    def cells(self, risk=1) -> np.ndarray:
+        """(N, 2) ``(i, j)`` grid indices of the flyable cells, row-major."""
+        return np.argwhere(self.selected(risk))
+
+    def coords(self, risk=1) -> np.ndarray:
+        """(N, 2) ``(x, y)`` pixel coordinates of the flyable cells, row-major."""
+        cells = self.cells(risk)
+        return np.stack([self.xs[cells[:, 1]], self.ys[cells[:, 0]]], axis=1)
+
+
+@tracing.traced("grid.build")
+def classify_grid(mask: np.ndarray, gap: int) -> PointGrid:
+    samples = mask[::gap, ::gap]
+    H, W = mask.shape
+    ys = np.arange(0, H, gap)
+    xs = np.arange(0, W, gap)
+
+    # a wall cell with any 8-neighbour off the wall is a border ('Y') cell;
+    # erode() treats out-of-range neighbours as wall, matching the old check
+    samples_u8 = samples.astype(np.uint8)
+    interior = cv2.erode(samples_u8, np.ones((3, 3), np.uint8)).astype(bool)
+
+    labels = np.full(samples.shape, LABEL_R, dtype=np.uint8)
+    labels[samples] = LABEL_Y
+    labels[interior] = LABEL_G
+
+    labels[0, :] = labels[-1, :] = LABEL_R
+    labels[:, 0] = labels[:, -1] = LABEL_R
+    return PointGrid(labels, ys, xs, gap)
+
+
+def _circle_offsets(radius, thickness):
+    """(dy, dx) pixel offsets ``cv2.circle`` paints around a centre."""
+    extent = radius + max(thickness, 0)
+    stamp = np.zeros((2 * extent + 1, 2 * extent + 1), dtype=np.uint8)
+    cv2.circle(stamp, (extent, extent), radius, 1, thickness)
+    return np.argwhere(stamp) - extent
+
+
+def _lattice_slice(offset, start, size, gap, count):
+    """Grid indices and pixel slice of lattice points ``start + k*gap + offset`` inside ``size``."""
+    first = max(0, -((offset + start) // gap))
+    last = min(count - 1, (size - 1 - offset - start) // gap)
+    if last < first:
+        return None
+    pix = start + first * gap + offset
+    return slice(first, last + 1), slice(pix, pix + (last - first) * gap + 1, gap)
+
+
+def draw_points(wall_mask, image, gap=50, point_radius=5, thickness=-1):
+    grid = classify_grid(as_wall_mask(wall_mask).mask, gap)
+    tracing.counter("grid.points", int(grid.selected(1).sum()))
+
+    img = as_bgr(image).copy()
+    if thickness > 1:
+        # cv2 clips thick rings at the image edge into other shapes: draw them one by one
+        palette = [tuple(int(c) for c in col) for col in LABEL_COLORS]
+        ii, jj = np.indices(grid.shape)
+        xs = grid.xs[jj.ravel()].tolist()
+        ys = grid.ys[ii.ravel()].tolist()
+        for x, y, label in zip(xs, ys, grid.labels.ravel().tolist()):
+            cv2.circle(img, (x, y), point_radius, palette[label], thickness)
+        return img, grid
+
+    # every circle is the same stamp on a regular lattice, so each stamp pixel
+    # is one strided assignment for all cells; taking offsets from the bottom
+    # right lets the later (row-major) cell win where circles overlap, as
+    # cv2.circle calls in grid order do
+    colors = LABEL_COLORS[grid.labels]
+    H, W = img.shape[:2]
+    ny, nx = grid.shape
+    for dy, dx in sorted(map(tuple, _circle_offsets(point_radius, thickness).tolist()),
+                         reverse=True):
+        rows = _lattice_slice(dy, int(grid.ys[0]), H, gap, ny)
+        cols = _lattice_slice(dx, int(grid.xs[0]), W, gap, nx)
+        if rows is not None and cols is not None:
+            img[rows[1], cols[1]] = colors[rows[0], cols[0]]
+    return img, grid
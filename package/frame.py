@@ -0,0 +1,89 @@
+import hashlib
+import os
+
+import cv2
+import numpy as np
+from PIL import Image
+
+
+class Frame:
+    """
+    One decoded image shared by every pipeline stage.
+
+    The pixels are decoded exactly once into a BGR ``uint8`` array.  ``rgb`` is
+    a zero-copy view of the same buffer and ``pil`` is built lazily, so stages
+    can take whichever layout they need without another decode.  Stages that
+    draw must ``.copy()`` first; the shared buffer is never written to.
+    """
+
+    def __init__(self, bgr: np.ndarray, name: str = "frame"):
+        if bgr is None or bgr.ndim != 3 or bgr.shape[2] != 3:
+            raise ValueError("Frame expects an (H, W, 3) BGR array")
+        self.bgr = np.ascontiguousarray(bgr, dtype=np.uint8)
+        self.name = name
+        self._pil = None
+        self._digest = None
+
+    @classmethod
+    def from_path(cls, path):
+        bgr = cv2.imread(os.fspath(path), cv2.IMREAD_COLOR)
+        if bgr is None:
+            raise FileNotFoundError(f"Could not read {path}")
+        return cls(bgr, os.path.basename(os.fspath(path)))
+
+    @classmethod
+    def from_bytes(cls, data: bytes, name: str = "upload"):
+        buf = np.frombuffer(data, dtype=np.uint8)
+        bgr = cv2.imdecode(buf, cv2.IMREAD_COLOR)
+        if bgr is None:
+            raise ValueError(f"Could not decode {name}")
+        return cls(bgr, name)
+
+    @classmethod
+    def from_pil(cls, image: Image.Image, name: str = "image"):
+        frame = cls(cv2.cvtColor(np.asarray(image.convert("RGB")),
+                                 cv2.COLOR_RGB2BGR), name)
+        frame._pil = image.convert("RGB")
+        return frame
+
+    @classmethod
+    def from_any(cls, image):
+        if isinstance(image, Frame):
+            return image
+        if isinstance(image, np.ndarray):
+            return cls(image)
+        if isinstance(image, Image.Image):
+            return cls.from_pil(image)
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            return cls.from_bytes(bytes(image))
+        return cls.from_path(image)
+
+    @property
+    def shape(self):
+        return self.bgr.shape[:2]
+
+    @property
+    def rgb(self) -> np.ndarray:
+        return self.bgr[..., ::-1]
+
+    @property
+    def pil(self) -> Image.Image:
+        if self._pil is None:
+            self._pil = Image.fromarray(np.ascontiguousarray(self.rgb))
+        return self._pil
+
+    @property
+    def digest(self) -> str:
+        """Content hash of the decoded pixels."""
+        if self._digest is None:
+            h = hashlib.sha1(self.bgr.data)
+            h.update(str(self.bgr.shape).encode())
+            self._digest = h.hexdigest()
+        return self._digest
+
+
+def as_bgr(image) -> np.ndarray:
+    """BGR array for a path, PIL image, ``Frame`` or array (arrays pass through)."""
+    if isinstance(image, np.ndarray):
+        return image
+    return Frame.from_any(image).bgr
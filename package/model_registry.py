@@ -0,0 +1,217 @@
+import gc
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Hashable
+
+import psutil
+
+from . import cpu_backend, tracing
+
+
+DEFAULT_SEMSEG_MODEL = "nvidia/segformer-b0-finetuned-ade-512-512"
+DEFAULT_DEPTH_MODEL = "Intel/zoedepth-nyu"
+DEFAULT_SAM_WEIGHTS = "sam2_t.pt"
+
+
+@dataclass
+class ModelEntry:
+    slot: str
+    key: Hashable
+    model: Any
+    load_seconds: float
+    param_bytes: int
+    rss_delta_bytes: int
+    loaded_at: float = field(default_factory=time.time)
+
+    def as_dict(self):
+        return {
+            "slot": self.slot,
+            "key": self.key,
+            "load_seconds": round(self.load_seconds, 3),
+            "param_mb": round(self.param_bytes / 2**20, 1),
+            "rss_delta_mb": round(self.rss_delta_bytes / 2**20, 1),
+        }
+
+
+def _model_nbytes(model):
+    """Bytes held by the parameters and buffers of a torch model (or of the
+    ``.model`` attribute of a pipeline / ultralytics wrapper)."""
+    for candidate in (model, getattr(model, "model", None)):
+        if candidate is None or not hasattr(candidate, "parameters"):
+            continue
+        try:
+            tensors = list(candidate.parameters()) + list(candidate.buffers())
+        except Exception:
+            continue
+        return sum(t.numel() * t.element_size() for t in tensors)
+    return 0
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded models.
+
+    Every model lives in a named *slot* ("semseg", "depth", "sam", ...) and is
+    identified by a key (model name, weights path, device, ...).  Asking a slot
+    for a different key evicts the model currently held there, so switching
+    ``semseg_model`` never keeps two Segformers resident.  Loads are serialised
+    per slot, so concurrent callers wait for one load instead of racing.
+
+    ``pin(slot, model)`` installs a ready-made model (a stand-in for
+    benchmarks, a quantised variant, ...) that every ``get`` on the slot
+    returns whatever key it asks for, until ``unpin``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._slot_locks = {}
+        self._entries = {}
+        self._pinned = set()
+
+    def _slot_lock(self, slot):
+        with self._lock:
+            return self._slot_locks.setdefault(slot, threading.Lock())
+
+    def get(self, slot: str, key: Hashable, loader: Callable[[], Any]):
+        with self._slot_lock(slot):
+            entry = self._entries.get(slot)
+            if entry is not None and (entry.key == key or slot in self._pinned):
+                return entry.model
+            if entry is not None:
+                self._drop(slot)
+
+            process = psutil.Process()
+            rss_before = process.memory_info().rss
+            start = time.perf_counter()
+            with tracing.span("model.load", slot=slot, key=repr(key)):
+                model = loader()
+            load_seconds = time.perf_counter() - start
+            rss_delta = process.memory_info().rss - rss_before
+
+            entry = ModelEntry(slot, key, model, load_seconds,
+                               _model_nbytes(model), max(0, rss_delta))
+            with self._lock:
+                self._entries[slot] = entry
+            print(f"Loaded {slot} model {key!r} in {load_seconds:.2f}s "
+                  f"({entry.param_bytes / 2**20:.1f} MB params)")
+            return model
+
+    def pin(self, slot: str, model, key: Hashable = "pinned"):
+        with self._slot_lock(slot):
+            self._drop(slot)
+            entry = ModelEntry(slot, key, model, 0.0, _model_nbytes(model), 0)
+            with self._lock:
+                self._entries[slot] = entry
+                self._pinned.add(slot)
+        return model
+
+    def unpin(self, slot: str):
+        self.evict(slot)
+
+    def pinned(self, slot: str):
+        """The model pinned to ``slot``, or ``None``."""
+        return self.peek(slot) if slot in self._pinned else None
+
+    def peek(self, slot: str):
+        entry = self._entries.get(slot)
+        return None if entry is None else entry.model
+
+    def evict(self, slot: str):
+        with self._slot_lock(slot):
+            return self._drop(slot)
+
+    def clear(self):
+        for slot in list(self._entries):
+            self.evict(slot)
+
+    def _drop(self, slot):
+        with self._lock:
+            entry = self._entries.pop(slot, None)
+            self._pinned.discard(slot)
+        if entry is None:
+            return False
+        del entry
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+        return True
+
+    def stats(self):
+        with self._lock:
+            entries = list(self._entries.values())
+        return [entry.as_dict() for entry in entries]
+
+
+registry = ModelRegistry()
+
+
+def _torch_device():
+    import torch
+    return 0 if torch.cuda.is_available() else -1
+
+
+def get_semseg_pipeline(model_name: str = DEFAULT_SEMSEG_MODEL, backend: str | None = None):
+    """
+    The Segformer pipeline; ``backend`` (default ``WALL_INFERENCE_BACKEND``)
+    "onnx" or "onnx-int8" swaps in an ONNX Runtime look-alike, see cpu_backend.
+    """
+    if registry.pinned("semseg") is not None:
+        return registry.pinned("semseg")
+    backend = backend or cpu_backend.DEFAULT_INFERENCE_BACKEND
+    if backend != "torch":
+        return registry.get("semseg", (model_name, backend),
+                            lambda: cpu_backend.load_semseg(model_name, backend))
+    device = _torch_device()
+
+    def load():
+        from transformers.pipelines import pipeline
+        if device == -1:
+            cpu_backend.configure_torch_threads()
+        return pipeline("image-segmentation", model=model_name,
+                        device=device, reduce_labels=False)
+
+    return registry.get("semseg", (model_name, device), load)
+
+
+def get_depth_pipeline(model_name: str = DEFAULT_DEPTH_MODEL, backend: str | None = None):
+    if registry.pinned("depth") is not None:
+        return registry.pinned("depth")
+    backend = backend or cpu_backend.DEFAULT_INFERENCE_BACKEND
+    if backend != "torch":
+        return registry.get("depth", (model_name, backend),
+                            lambda: cpu_backend.load_depth(model_name, backend))
+    device = _torch_device()
+
+    def load():
+        from transformers.pipelines import pipeline
+        if device == -1:
+            cpu_backend.configure_torch_threads()
+        return pipeline("depth-estimation", model=model_name, device=device)
+
+    return registry.get("depth", (model_name, device), load)
+
+
+def get_sam(weights: str = DEFAULT_SAM_WEIGHTS):
+    def load():
+        from ultralytics import SAM
+        return SAM(weights)
+
+    return registry.get("sam", weights, load)
+
+
+def warm_up(semseg_model: str | None = DEFAULT_SEMSEG_MODEL,
+            sam_weights: str | None = DEFAULT_SAM_WEIGHTS,
+            depth_model: str | None = None):
+    """Load the requested models up front; pass ``None`` to skip one."""
+    if semseg_model:
+        get_semseg_pipeline(semseg_model)
+    if sam_weights:
+        get_sam(sam_weights)
+    if depth_model:
+        get_depth_pipeline(depth_model)
+    return registry.stats()
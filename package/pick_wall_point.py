@@ -1,39 +1,109 @@
 import numpy as np
-import torch
 import cv2
 from PIL import Image
-from transformers.pipelines import pipeline
 
+from . import tracing
+from .model_registry import DEFAULT_SEMSEG_MODEL, get_semseg_pipeline
 
-def pick_wall_point(image: Image.Image, semseg_model: str = "nvidia/segformer-b0-finetuned-ade-512-512"):
 
+# "pipeline": the transformers pipeline's per-label full-resolution masks.
+# "logits": one argmax over the model's (1/4 resolution) logits.
+SEMSEG_MODES = ("pipeline", "logits")
+
+
+def pick_wall_point(image: Image.Image, semseg_model: str = DEFAULT_SEMSEG_MODEL,
+                    mode: str = "pipeline", return_mask: bool = True):
+    bw_image, points = pick_wall_points(image, semseg_model, max_points=1,
+                                        mode=mode, return_mask=return_mask)
+    return bw_image, points[0]
+
+
+def pick_wall_points(image: Image.Image, semseg_model: str = DEFAULT_SEMSEG_MODEL,
+                     max_points: int = 4, min_area: float = 0.02,
+                     mode: str = "pipeline", return_mask: bool = True,
+                     backend: str | None = None):
+    """
+    One SAM prompt point per large Segformer wall component: the centroids
+    of the (up to ``max_points``) components covering at least ``min_area``
+    of the image, largest first.  The largest is always included.
+
+    ``mode="logits"`` finds the components on the model's low-resolution
+    logits and scales the centroids back, skipping the pipeline's per-label
+    upsampling.  The full-resolution mask is then built (one resize of the
+    wall logit margin) only if ``return_mask``; otherwise ``bw_image`` is None.
+    ``backend`` picks the inference backend (see ``get_semseg_pipeline``).
+    """
+    if mode not in SEMSEG_MODES:
+        raise ValueError(f"Unknown mode {mode!r}, expected one of {SEMSEG_MODES}")
     w, h = image.size
-    device = 0 if torch.cuda.is_available() else -1
-    semseg = pipeline(
-        "image-segmentation",
-        model=semseg_model,
-        device=device,
-        reduce_labels=False
-    )
-    sem = semseg(image)
-
-    wall_mask = np.zeros((h, w), dtype=bool)
-    for r in sem:  # type: ignore
-        if r["label"].lower() == "wall":  # type: ignore
-            mask = np.array(r["mask"].resize((w, h))).astype(  # type: ignore
-                bool)  # type: ignore
-            wall_mask |= mask
-
-    wall_uint = wall_mask.astype(np.uint8) * 255
+    semseg = get_semseg_pipeline(semseg_model, backend)
+
+    if mode == "logits":
+        with tracing.span("semseg.inference", width=w, height=h, mode=mode):
+            logits = _segformer_logits(semseg, image)
+        with tracing.span("pick_wall_point.mask", mode=mode):
+            wall_ids = [i for label, i in semseg.model.config.label2id.items()
+                        if label.lower() == "wall"]
+            wall_mask = np.isin(logits.argmax(axis=0), wall_ids)
+            full_mask = None
+            if return_mask:
+                others = np.delete(logits, wall_ids, axis=0)
+                margin = logits[wall_ids].max(axis=0) - others.max(axis=0)
+                full_mask = cv2.resize(margin, (w, h), interpolation=cv2.INTER_LINEAR) > 0
+    else:
+        with tracing.span("semseg.inference", width=w, height=h, mode=mode):
+            sem = semseg(image)
+        with tracing.span("pick_wall_point.mask", segments=len(sem), mode=mode):
+            wall_mask = np.zeros((h, w), dtype=bool)
+            for r in sem:  # type: ignore
+                if r["label"].lower() == "wall":  # type: ignore
+                    mask = np.array(r["mask"].resize((w, h))).astype(  # type: ignore
+                        bool)  # type: ignore
+                    wall_mask |= mask
+            full_mask = wall_mask if return_mask else None
+
+    with tracing.span("pick_wall_point.components", height=wall_mask.shape[0],
+                      width=wall_mask.shape[1]):
+        points = _component_points(wall_mask, (w, h), max_points, min_area)
+    bw_image = None
+    if full_mask is not None:
+        bw_image = Image.fromarray(full_mask.astype(np.uint8) * 255, mode="L")
+    return bw_image, points
+
+
+def _segformer_logits(semseg, image):
+    """(C, h, w) class logits of the model behind an image-segmentation pipeline."""
+    framework = getattr(semseg, "framework", "pt")
+    inputs = semseg.image_processor(images=image, return_tensors=framework)
+    if framework != "pt":
+        return np.asarray(semseg.model(**inputs).logits[0], dtype=np.float32)
+    import torch
+    with torch.inference_mode():
+        inputs = {k: v.to(semseg.device) for k, v in inputs.items()}
+        return semseg.model(**inputs).logits[0].float().cpu().numpy()
+
+
+def _component_points(wall_mask, size, max_points, min_area):
+    """Centroids of the largest components of ``wall_mask``, in ``size`` (w, h) pixels."""
+    w, h = size
+    mh, mw = wall_mask.shape
     num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(
         wall_mask.astype(np.uint8), 8)  # type: ignore
 
     areas = stats[1:, cv2.CC_STAT_AREA]
-    best_label = 1 + int(np.argmax(areas))
-    best_centroid = centroids[best_label]
-
-    cx, cy = map(int, best_centroid)
-    cx = max(0, min(w-1, cx))
-    cy = max(0, min(h-1, cy))
-    bw_image = Image.fromarray(wall_uint, mode="L")
-    return bw_image, (cx, cy)
+    if areas.size == 0:
+        raise ValueError("Segformer found no wall in the image")
+    order = 1 + np.argsort(-areas, kind="stable")
+    keep = [order[0]] + [lab for lab in order[1:max_points]
+                         if stats[lab, cv2.CC_STAT_AREA] >= min_area * mw * mh]
+
+    points = []
+    for label in keep:
+        cx, cy = centroids[label]
+        if (mw, mh) != (w, h):
+            # mask pixel x covers image pixels [x, x + 1) * w / mw
+            cx = (cx + 0.5) * w / mw - 0.5
+            cy = (cy + 0.5) * h / mh - 0.5
+        cx, cy = int(cx), int(cy)
+        points.append((max(0, min(w-1, cx)), max(0, min(h-1, cy))))
+    return points
@@ -0,0 +1,295 @@
+import itertools
+from functools import partial
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from . import tracing
+from .frame import Frame, as_bgr
+from .model_registry import DEFAULT_DEPTH_MODEL, DEFAULT_SAM_WEIGHTS, DEFAULT_SEMSEG_MODEL
+from .pick_wall_point import pick_wall_points
+from .draw_points import PointGrid, draw_points
+from .connect_points import connect_points
+from .command_compiler import compile_commands
+from .depth_engine import DepthEngine, WallDepthStats
+from .draw_result_on_image import draw_result_on_image
+from .save_image import draw_point
+from .segmentation_service import get_segmentation_service
+from .stage_cache import stage_key
+from .wall_mask import WallMask
+
+
+# stage -> stages whose outputs it consumes
+STAGE_DEPENDENCIES = {
+    "pick_wall_point": (),
+    "segment": ("pick_wall_point",),
+    "draw_points": ("segment",),
+    "connect_points": ("draw_points",),
+    "wall_depth": ("segment",),
+}
+
+
+def _jpeg(image):
+    ok, buf = cv2.imencode(".jpg", as_bgr(image), [cv2.IMWRITE_JPEG_QUALITY, 95])
+    return buf.ravel()
+
+
+def _unjpeg(buf):
+    return cv2.imdecode(buf, cv2.IMREAD_COLOR)
+
+
+def _packed(mask):
+    mask = np.asarray(mask, dtype=bool)
+    return {"mask": np.packbits(mask, axis=None), "shape": np.array(mask.shape)}
+
+
+def _unpacked(arrays):
+    return WallMask.from_packed(arrays["mask"], tuple(arrays["shape"])).mask
+
+
+# stage -> (encode, decode) between its cached value and ArtifactStore arrays.
+# Masks are stored as packed bits and step images as JPEG; SAM's raw results
+# are not stored, so ``pipeline.results`` is None after a disk hit.
+STAGE_CODECS = {
+    "pick_wall_point": (
+        lambda out: {**_packed(np.asarray(out[0]) > 0),
+                     "image": _jpeg(out[1]), "points": np.array(out[2]).reshape(-1, 2)},
+        lambda a: (Image.fromarray(_unpacked(a).astype(np.uint8) * 255, mode="L"),
+                   _unjpeg(a["image"]),
+                   [tuple(int(v) for v in p) for p in a["points"]]),
+    ),
+    "segment": (
+        lambda out: {**_packed(out[1].mask), "image": _jpeg(out[2])},
+        lambda a: (None, WallMask(_unpacked(a)),
+                   Image.fromarray(cv2.cvtColor(_unjpeg(a["image"]), cv2.COLOR_BGR2RGB))),
+    ),
+    "draw_points": (
+        lambda out: {"image": _jpeg(out[0]), "labels": out[1].labels,
+                     "ys": out[1].ys, "xs": out[1].xs, "gap": np.array(out[1].gap)},
+        lambda a: (_unjpeg(a["image"]),
+                   PointGrid(a["labels"], a["ys"], a["xs"], int(a["gap"]))),
+    ),
+    "connect_points": (
+        lambda out: {"image": _jpeg(out[0]),
+                     "movement": np.asarray(out[1], dtype=np.int32).reshape(-1, 2)},
+        lambda a: (_unjpeg(a["image"]), [tuple(p) for p in a["movement"].tolist()]),
+    ),
+    "wall_depth": (
+        lambda s: {"summary": np.array([s.count, s.min, s.max, s.mean]),
+                   "q": np.array(list(s.percentiles)), "p": np.array(list(s.percentiles.values()))},
+        lambda a: WallDepthStats(int(a["summary"][0]), *map(float, a["summary"][1:]),
+                                 percentiles=dict(zip(a["q"].tolist(), a["p"].tolist()))),
+    ),
+}
+
+
+class WallPipeline:
+    """
+    The four wall-inspection steps run on one in-memory frame.
+
+    The input is decoded once into ``self.frame`` and every step receives that
+    array (or a view of it) instead of a file path.  Step outputs are kept on
+    the instance so later steps reuse them; nothing is written to disk unless
+    an ``ImageSink`` is passed as ``sink``.
+
+    With a ``StageCache`` as ``cache``, each step is looked up by the frame's
+    content hash, its own parameters and the keys of the steps it depends on
+    (``STAGE_DEPENDENCIES``), so rerunning with only a new ``gap`` recomputes
+    just ``draw_points`` and ``connect_points``.  An ``ArtifactStore`` as
+    ``store`` backs the cache on disk, so results outlive the process.
+
+    ``max_points`` > 1 prompts SAM with one point per large Segformer wall
+    component (``pick_wall_points``) and segments their union.  Step 1 works
+    on Segformer's low-resolution logits unless ``semseg_mode="pipeline"``.
+
+    ``schedule`` adds the steps to a ``StageScheduler`` instead, so the
+    independent ones run concurrently.
+    """
+
+    def __init__(self, image,
+                 semseg_model: str = DEFAULT_SEMSEG_MODEL,
+                 sam_weights: str = DEFAULT_SAM_WEIGHTS,
+                 sink=None,
+                 cache=None,
+                 store=None,
+                 max_points: int = 1,
+                 semseg_mode: str = "logits"):
+        self.frame = Frame.from_any(image)
+        self.semseg_model = semseg_model
+        self.sam_weights = sam_weights
+        self.sink = sink
+        self.cache = cache
+        self.store = store
+        self.max_points = max_points
+        self.semseg_mode = semseg_mode
+
+        self.keys = {}
+        self.cached_stages = set()
+
+        self.bw_image = None
+        self.point = None
+        self.points = None
+        self.results = None
+        self.wall_mask = None
+        self.grid = None
+        self.grid_gap = None
+        self.movement = None
+        self.depth_stats = None
+        self.scheduler = None
+        self._writes = itertools.count()
+
+    def _emit(self, name, image):
+        if self.sink is not None:
+            # only from inside a scheduled stage: the scheduler is running and
+            # the write can go after it; later direct calls write in place
+            current = self.scheduler.current() if self.scheduler is not None else None
+            if current is not None:
+                self.scheduler.add(f"save {name} #{next(self._writes)}",
+                                   partial(self.sink.write, name, image), (current,))
+            else:
+                self.sink.write(name, image)
+        return image
+
+    def _pick_params(self):
+        return {"semseg_model": self.semseg_model, "max_points": self.max_points,
+                "semseg_mode": self.semseg_mode}
+
+    def _stored(self, stage, params):
+        """Whether ``stage`` (one without dependencies) would be a cache or store hit."""
+        key = stage_key(stage, params, [self.frame.digest])
+        return ((self.cache is not None and key in self.cache)
+                or (self.store is not None and key in self.store))
+
+    def _run(self, stage, params, compute):
+        with tracing.span(f"stage.{stage}", params=repr(params)) as sp:
+            out = self._lookup_or_compute(stage, params, compute)
+            sp.set(cached=stage in self.cached_stages)
+        return out
+
+    def _lookup_or_compute(self, stage, params, compute):
+        upstream = [self.frame.digest]
+        upstream += [self.keys[dep] for dep in STAGE_DEPENDENCIES[stage]]
+        key = stage_key(stage, params, upstream)
+        self.keys[stage] = key
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.cached_stages.add(stage)
+                return cached
+        encode, decode = STAGE_CODECS[stage]
+        if self.store is not None:
+            arrays = self.store.load(key)
+            if arrays is not None:
+                out = decode(arrays)
+                if self.cache is not None:
+                    self.cache.put(key, out)
+                self.cached_stages.add(stage)
+                return out
+        self.cached_stages.discard(stage)
+        out = compute()
+        if self.cache is not None:
+            self.cache.put(key, out)
+        if self.store is not None:
+            self.store.save(key, encode(out))
+        return out
+
+    def pick_wall_point(self):
+        def compute():
+            bw_image, points = pick_wall_points(self.frame.pil, self.semseg_model,
+                                                max_points=self.max_points,
+                                                mode=self.semseg_mode)
+            point_img = self.frame.bgr
+            for point in points:
+                point_img = draw_point(point_img, point)
+            return bw_image, point_img, points
+
+        self.bw_image, point_img, self.points = self._run(
+            "pick_wall_point", self._pick_params(), compute)
+        self.point = self.points[0]
+        self._emit("01_black_and_white.jpg", self.bw_image)
+        self._emit("02_best_point.jpg", point_img)
+        return self.bw_image, point_img, self.point
+
+    def segment(self, point=None, points=None):
+        """
+        SAM masks for ``point``, ``points`` or the picked points.  The image
+        embedding is cached by the segmentation service, so prompting the
+        same frame again only runs the prompt decoder.
+        """
+        if "pick_wall_point" not in self.keys:
+            self.pick_wall_point()
+        if points is None:
+            points = [point] if point is not None else self.points
+        points = tuple(tuple(int(v) for v in p) for p in points)
+
+        def compute():
+            service = get_segmentation_service(self.sam_weights)
+            wall_mask, results = service.segment(self.frame, points)
+            return results, wall_mask, draw_result_on_image(self.frame.bgr, wall_mask)
+
+        self.results, self.wall_mask, seg_image = self._run(
+            "segment", {"sam_weights": self.sam_weights, "points": points},
+            compute)
+        self._emit("03_segmentation.jpg", seg_image)
+        return seg_image
+
+    def draw_points(self, gap=50):
+        if self.wall_mask is None:
+            self.segment()
+        img, self.grid = self._run(
+            "draw_points", {"gap": gap},
+            lambda: draw_points(self.wall_mask, self.frame.bgr, gap))
+        self.grid_gap = gap
+        self._emit("04_points.jpg", img)
+        return img
+
+    def connect_points(self, gap=50, **kwargs):
+        if self.grid is None or self.grid_gap != gap:
+            self.draw_points(gap)
+        img, self.movement = self._run(
+            "connect_points", {"gap": gap, **kwargs},
+            lambda: connect_points(self.grid, self.wall_mask,
+                                   self.frame.bgr, gap, **kwargs))
+        self._emit("05_path.jpg", img)
+        return img
+
+    def wall_depth(self, depth_model: str = DEFAULT_DEPTH_MODEL, **kwargs):
+        """``WallDepthStats`` of the segmented wall, see ``DepthEngine``."""
+        if self.wall_mask is None:
+            self.segment()
+        self.depth_stats = self._run(
+            "wall_depth", {"depth_model": depth_model, **kwargs},
+            lambda: DepthEngine(model_name=depth_model, **kwargs).wall_stats(
+                self.frame, self.wall_mask))
+        return self.depth_stats
+
+    def schedule(self, scheduler, gap=50, depth_model=None, **kwargs):
+        """
+        Add the steps to ``scheduler`` as stages named after the methods:
+        Segformer (``pick_wall_point``) runs alongside SAM's image encoder,
+        ``wall_depth`` (with a ``depth_model``) alongside ``draw_points`` and
+        ``connect_points``, and sink writes alongside the next step.  Returns
+        the scheduler; each stage's future holds its method's return value.
+        """
+        self.scheduler = scheduler
+        deps = ("pick_wall_point",)
+        if not self._stored("pick_wall_point", self._pick_params()):
+            # a new frame: encode it while Segformer looks for the wall
+            service = get_segmentation_service(self.sam_weights)
+            scheduler.add("sam_encode", partial(service.embed, self.frame))
+            deps += ("sam_encode",)
+        scheduler.add("pick_wall_point", self.pick_wall_point)
+        scheduler.add("segment", self.segment, deps)
+        scheduler.add("draw_points", partial(self.draw_points, gap), ("segment",))
+        scheduler.add("connect_points", partial(self.connect_points, gap, **kwargs),
+                      ("draw_points",))
+        if depth_model:
+            scheduler.add("wall_depth", partial(self.wall_depth, depth_model), ("segment",))
+        return scheduler
+
+    def flight_commands(self, distance_m, **kwargs):
+        """The Step 4 path as Tello ``(action, value)`` commands, see ``compile_commands``."""
+        if self.movement is None:
+            raise ValueError("connect_points() has to run before flight_commands()")
+        return compile_commands(self.movement, distance_m, self.frame.shape, **kwargs)
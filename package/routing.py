@@ -0,0 +1,204 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra, shortest_path
+from skimage.graph import route_through_array
+
+from . import tracing
+
+
+# Routing cost of one off-wall pixel (wall pixels cost 1).
+OFF_WALL_COST = 1e6
+
+# Lattice neighbour offsets (di, dj); the other four are their reverses.
+_LATTICE_STEPS = ((0, 1), (1, 0), (1, 1), (1, -1))
+
+
+def route_pixels(cost, start, goal, offset=(0, 0)):
+    """
+    Cheapest 8-connected pixel route on ``cost`` between two ``(x, y)``
+    points, returned as ``(x, y)`` tuples plus the route cost.  ``offset`` is
+    the ``(x0, y0)`` of ``cost`` inside the full image when it is a window.
+    """
+    x0, y0 = offset
+    with tracing.span("route.fast_path", pixels=int(cost.size)):
+        path_rc, total = route_through_array(
+            cost,
+            (start[1] - y0, start[0] - x0),
+            (goal[1] - y0, goal[0] - x0),
+            fully_connected=True
+        )
+    return [(int(c) + x0, int(r) + y0) for r, c in path_rc], float(total)
+
+
+def _straight(a, b):
+    n = max(abs(b[0] - a[0]), abs(b[1] - a[1]))
+    sx = (b[0] > a[0]) - (b[0] < a[0])
+    sy = (b[1] > a[1]) - (b[1] < a[1])
+    return [(a[0] + sx * t, a[1] + sy * t) for t in range(n + 1)]
+
+
+class LatticeRouter:
+    """
+    Pixel routes between grid waypoints, planned on the waypoint lattice.
+
+    Neighbouring waypoints (8-connected on the ``gap`` lattice) are joined by
+    lattice edges weighing one lattice step (``gap``, Chebyshev pixels).  An
+    edge whose straight segment stays on the wall is walked as that segment;
+    one that crosses off-wall pixels weighs ``gap * OFF_WALL_COST`` and is
+    routed at pixel level, inside a window around the edge, only when a hop
+    first needs it.  Longer hops follow a Dijkstra path over the lattice;
+    when the lattice cannot connect two waypoints without leaving the wall,
+    they are joined by a pixel route inside a window around both.  All routes
+    are cached per node pair.
+    """
+
+    def __init__(self, wall_mask, grid, risk=1):
+        self.wall_mask = wall_mask
+        self.grid = grid
+        self.gap = grid.gap
+        cells = grid.cells(risk)
+        self.coords = [(int(grid.xs[j]), int(grid.ys[i])) for i, j in cells]
+        self.n = len(self.coords)
+
+        self.node_of = np.full(grid.shape, -1, dtype=np.int64)
+        self.node_of[cells[:, 0], cells[:, 1]] = np.arange(self.n)
+
+        self._edge_paths = {}
+        self._edge_costs = {}
+        self._edge_weights = {}
+        self._routes = {}
+        self._predecessors = {}
+        self._geodesic = None
+        with tracing.span("route.lattice", nodes=self.n):
+            self.graph = self._build_graph(cells)
+
+    def _build_graph(self, cells):
+        mask = self.wall_mask.mask
+        rows, cols = self.grid.shape
+        xs = self.grid.xs[cells[:, 1]]
+        ys = self.grid.ys[cells[:, 0]]
+        steps = np.arange(self.gap + 1)
+
+        heads, tails, weights = [], [], []
+        for di, dj in _LATTICE_STEPS:
+            ni, nj = cells[:, 0] + di, cells[:, 1] + dj
+            ok = (ni >= 0) & (ni < rows) & (nj >= 0) & (nj < cols)
+            a = np.flatnonzero(ok)
+            b = self.node_of[ni[ok], nj[ok]]
+            keep = b >= 0
+            a, b = a[keep], b[keep]
+            if a.size == 0:
+                continue
+
+            px = xs[a, None] + dj * steps[None, :]
+            py = ys[a, None] + di * steps[None, :]
+            clean = mask[py, px].all(axis=1)
+            w = np.where(clean, float(self.gap), float(self.gap) * OFF_WALL_COST)
+            for ea, eb, ew in zip(a.tolist(), b.tolist(), w.tolist()):
+                self._edge_weights[(ea, eb)] = self._edge_weights[(eb, ea)] = ew
+            heads.append(a)
+            tails.append(b)
+            weights.append(w)
+
+        if not heads:
+            return csr_matrix((self.n, self.n))
+        return csr_matrix((np.concatenate(weights),
+                           (np.concatenate(heads), np.concatenate(tails))),
+                          shape=(self.n, self.n))
+
+    def _route_window(self, a, b, margin):
+        """Pixel route between two waypoints inside their padded bounding box."""
+        (xa, ya), (xb, yb) = self.coords[a], self.coords[b]
+        H, W = self.wall_mask.shape
+        x0 = max(0, min(xa, xb) - margin)
+        y0 = max(0, min(ya, yb) - margin)
+        x1 = min(W, max(xa, xb) + margin + 1)
+        y1 = min(H, max(ya, yb) + margin + 1)
+        window = self.wall_mask.cost(OFF_WALL_COST)[y0:y1, x0:x1]
+        return route_pixels(window, self.coords[a], self.coords[b], (x0, y0))
+
+    def _edge_path(self, a, b):
+        if (a, b) in self._edge_paths:
+            return self._edge_paths[(a, b)]
+        if (b, a) in self._edge_paths:
+            return self._edge_paths[(b, a)][::-1]
+        if self._edge_weights[(a, b)] >= OFF_WALL_COST:
+            # an edge that leaves the wall: routed on first use
+            self._edge_paths[(a, b)], self._edge_costs[(a, b)] = self._route_window(a, b, self.gap)
+            return self._edge_paths[(a, b)]
+        return _straight(self.coords[a], self.coords[b])
+
+    def _edge_cost(self, a, b):
+        """Pixel route cost of an off-wall lattice edge, routing it if needed."""
+        self._edge_path(a, b)
+        return self._edge_costs.get((a, b), self._edge_costs.get((b, a)))
+
+    @tracing.traced("route.geodesic_matrix")
+    def geodesic_matrix(self):
+        """
+        All-pairs shortest-path lengths over the lattice, from one
+        ``shortest_path`` call.  Pairs the lattice can only join by leaving
+        the wall get their Chebyshev distance plus ``OFF_WALL_COST``, so tour
+        solvers still see a finite but strongly penalised hop.
+        """
+        if self._geodesic is None:
+            dist, pred = shortest_path(self.graph, method="D", directed=False,
+                                       return_predecessors=True)
+            pts = np.asarray(self.coords)
+            cheb = np.abs(pts[:, None, :] - pts[None, :, :]).max(axis=2)
+            blocked = ~np.isfinite(dist) | (dist >= OFF_WALL_COST)
+            dist[blocked] = cheb[blocked] + OFF_WALL_COST
+            self._geodesic = dist
+            for u in range(self.n):
+                self._predecessors[u] = (dist[u], pred[u])
+        return self._geodesic
+
+    def _lattice_path(self, u, v):
+        if u not in self._predecessors:
+            dist, pred = dijkstra(self.graph, directed=False, indices=u,
+                                  return_predecessors=True)
+            self._predecessors[u] = (dist, pred)
+        dist, pred = self._predecessors[u]
+        if not np.isfinite(dist[v]) or dist[v] >= OFF_WALL_COST:
+            return None
+        nodes = [v]
+        while nodes[-1] != u:
+            nodes.append(int(pred[nodes[-1]]))
+        return nodes[::-1]
+
+    def route(self, u, v):
+        """Pixel path from waypoint ``u`` to waypoint ``v`` (node indices)."""
+        if (u, v) in self._routes:
+            return self._routes[(u, v)]
+        if (v, u) in self._routes:
+            return self._routes[(v, u)][::-1]
+
+        weight = self._edge_weights.get((u, v))
+        if weight is not None and (weight < OFF_WALL_COST
+                                   or self._edge_cost(u, v) < OFF_WALL_COST):
+            # a clean edge, or one whose pixel route detours on the wall
+            path = self._edge_path(u, v)
+        else:
+            nodes = self._lattice_path(u, v)
+            if nodes is None and weight is not None:
+                path = self._edge_path(u, v)
+            elif nodes is None:
+                # no on-wall lattice path (e.g. separate wall regions): the
+                # hop has to cross off-wall pixels anyway, so keep it local
+                path, _ = self._route_window(u, v, 2 * self.gap)
+            else:
+                path = [self.coords[u]]
+                for a, b in zip(nodes, nodes[1:]):
+                    path.extend(self._edge_path(a, b)[1:])
+        self._routes[(u, v)] = path
+        return path
+
+    def follow(self, tour):
+        """Concatenated pixel path along a node tour, as ``connect_points`` returns it."""
+        movement = []
+        for u, v in zip(tour, tour[1:]):
+            seg = self.route(u, v)
+            if movement:
+                movement.pop()
+            movement.extend(seg)
+        return movement
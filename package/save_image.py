@@ -1,14 +1,38 @@
+import os
+
 import cv2
 import numpy as np
 
+from . import tracing
+
+
 def save_image(image, path):
     if not isinstance(image, np.ndarray):
         image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
     cv2.imwrite(path, image)
 
-def save_image_with_point(image, pt, path, color=(0, 0, 255), radius=5, thickness=-1):
+
+def draw_point(image, pt, color=(0, 0, 255), radius=5, thickness=-1):
     if not isinstance(image, np.ndarray):
         image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
     img_copy = image.copy()
     cv2.circle(img_copy, pt, radius, color, thickness)
-    cv2.imwrite(path, img_copy)
+    return img_copy
+
+
+def save_image_with_point(image, pt, path, color=(0, 0, 255), radius=5, thickness=-1):
+    cv2.imwrite(path, draw_point(image, pt, color, radius, thickness))
+
+
+class ImageSink:
+    """Optional on-disk sink for pipeline outputs; nothing is encoded unless one is attached."""
+
+    def __init__(self, directory):
+        self.directory = os.fspath(directory)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def write(self, name, image):
+        path = os.path.join(self.directory, name)
+        with tracing.span("encode.save", file=name):
+            save_image(image, path)
+        return path
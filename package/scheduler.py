@@ -0,0 +1,171 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+
+from . import cpu_backend, tracing
+
+
+# (scheduler, stage name) the current thread is running, for stages added from inside it.
+_current = contextvars.ContextVar("current_stage", default=None)
+
+
+class StageError(RuntimeError):
+    """A stage did not run because one of its dependencies failed."""
+
+
+@dataclass
+class Stage:
+    name: str
+    fn: object
+    deps: tuple
+    future: Future = field(default_factory=Future)
+    context: object = None
+    waiting: int = 0
+    ready: float | None = None
+    start: float | None = None
+    end: float | None = None
+
+    @property
+    def run_s(self) -> float:
+        return 0.0 if self.start is None or self.end is None else self.end - self.start
+
+
+class StageScheduler:
+    """
+    Runs named stages on a thread pool as soon as their dependencies finish.
+
+    ``add(name, fn, deps)`` returns a ``Future`` of ``fn()``; dependencies
+    must be added first, so the stages always form a DAG.  Stages may be
+    added while others run (e.g. a JPEG write for a finished step).  Torch
+    and OpenCV release the GIL, so independent stages overlap for real.
+    A failed stage fails its dependents with ``StageError``.  Each stage
+    runs in the context it was added from, so tracing requests carry over.
+
+    ``workers`` defaults to the physical cores (at most 4): on one core the
+    stages run one after another, since threads would only add GIL switching.
+    """
+
+    def __init__(self, workers: int | None = None):
+        workers = workers or min(4, cpu_backend.cpu_threads())
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="stage")
+        self._lock = threading.Lock()
+        self.stages = {}
+        self.t0 = time.perf_counter()
+
+    def add(self, name, fn, deps=()):
+        deps = tuple(deps)
+        with self._lock:
+            if name in self.stages:
+                raise ValueError(f"Stage {name!r} was already added")
+            missing = [d for d in deps if d not in self.stages]
+            if missing:
+                raise ValueError(f"Stage {name!r} depends on unknown stages {missing}")
+            stage = Stage(name, fn, deps, context=contextvars.copy_context(),
+                          waiting=len(deps))
+            self.stages[name] = stage
+            dep_futures = [self.stages[d].future for d in deps]
+        if not dep_futures:
+            self._submit(stage)
+        for future in dep_futures:
+            future.add_done_callback(lambda _, stage=stage: self._dep_done(stage))
+        return stage.future
+
+    def _dep_done(self, stage):
+        with self._lock:
+            stage.waiting -= 1
+            if stage.waiting:
+                return
+        for dep in stage.deps:
+            error = self.stages[dep].future.exception()
+            if error is not None:
+                stage.future.set_exception(StageError(f"{stage.name} skipped: {dep} failed ({error})"))
+                return
+        self._submit(stage)
+
+    def _submit(self, stage):
+        stage.ready = time.perf_counter()
+        self._pool.submit(stage.context.run, self._call, stage)
+
+    def _call(self, stage):
+        stage.start = time.perf_counter()
+        _current.set((self, stage.name))
+        try:
+            with tracing.span(f"scheduler.{stage.name}",
+                              queued_ms=round((stage.start - stage.ready) * 1000, 3)):
+                result = stage.fn()
+        except BaseException as e:
+            stage.end = time.perf_counter()
+            stage.future.set_exception(e)
+        else:
+            stage.end = time.perf_counter()
+            stage.future.set_result(result)
+
+    def current(self):
+        """Name of this scheduler's stage running in this thread, or ``None`` outside one."""
+        running = _current.get()
+        return running[1] if running is not None and running[0] is self else None
+
+    def future(self, name) -> Future:
+        return self.stages[name].future
+
+    def as_completed(self, names=None, timeout=None):
+        """``(name, future)`` pairs of ``names`` (default: all added so far) as they finish."""
+        with self._lock:
+            by_future = {self.stages[n].future: n
+                         for n in (names if names is not None else list(self.stages))}
+        for future in as_completed(by_future, timeout=timeout):
+            yield by_future[future], future
+
+    def wait(self, timeout=None):
+        """Wait for every stage, including ones added while waiting."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                pending = [s.future for s in self.stages.values() if not s.future.done()]
+            if not pending:
+                return
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            for _ in as_completed(pending, timeout=remaining):
+                pass
+
+    def critical_path(self):
+        """
+        The chain of finished stages that decided the total time: from the
+        last stage to finish, back through the dependency that finished last.
+        """
+        done = [s for s in self.stages.values() if s.end is not None]
+        if not done:
+            return []
+        path = [max(done, key=lambda s: s.end)]
+        while True:
+            deps = [self.stages[d] for d in path[-1].deps if self.stages[d].end is not None]
+            if not deps:
+                break
+            path.append(max(deps, key=lambda s: s.end))
+        return path[::-1]
+
+    def report(self):
+        """Per-stage start/run times (seconds from creation), busy time and the critical path."""
+        done = [s for s in self.stages.values() if s.end is not None]
+        path = self.critical_path()
+        elapsed = max((s.end for s in done), default=self.t0) - self.t0
+        return {
+            "elapsed_s": round(elapsed, 3),
+            "busy_s": round(sum(s.run_s for s in done), 3),
+            "critical_path": [s.name for s in path],
+            "critical_s": round(sum(s.run_s for s in path), 3),
+            "stages": {s.name: {"start_s": round(s.start - self.t0, 3),
+                                "run_s": round(s.run_s, 3)} for s in done},
+        }
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        return False
@@ -0,0 +1,137 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from . import tracing
+from .frame import Frame
+from .model_registry import DEFAULT_SAM_WEIGHTS, get_sam, registry
+from .wall_mask import WallMask
+
+
+class _UltralyticsPrompter:
+    """``embed``/``decode`` on top of an ultralytics SAM / SAM2 predictor."""
+
+    def __init__(self, sam):
+        # what SAM.predict would build, but kept so its features can be swapped
+        overrides = dict(conf=0.25, task="segment", mode="predict", imgsz=1024,
+                         save=False, verbose=False)
+        self.predictor = sam._smart_load("predictor")(overrides=overrides,
+                                                      _callbacks=sam.callbacks)
+        self.predictor.setup_model(model=sam.model, verbose=False)
+
+    def embed(self, bgr):
+        self.predictor.set_image(bgr)
+        return self.predictor.features
+
+    def decode(self, bgr, features, points):
+        # (N, 1, 2): N objects with one positive point each, one decoder batch
+        pts = np.asarray(points, dtype=np.float32).reshape(-1, 1, 2)
+        self.predictor.features = features
+        return self.predictor(source=bgr, points=pts,
+                              labels=np.ones(pts.shape[:2], dtype=np.int32))
+
+
+class _PredictPrompter:
+    """Fallback for models with only ``predict``: no encoder reuse."""
+
+    def __init__(self, sam):
+        self.sam = sam
+
+    def embed(self, bgr):
+        return None
+
+    def decode(self, bgr, features, points):
+        return self.sam.predict(source=bgr, points=[tuple(p) for p in points],
+                                save=False, verbose=False)
+
+
+def _prompter(sam):
+    if hasattr(sam, "embed") and hasattr(sam, "decode"):
+        return sam
+    if hasattr(sam, "_smart_load"):
+        return _UltralyticsPrompter(sam)
+    return _PredictPrompter(sam)
+
+
+class SegmentationService:
+    """
+    SAM prompting with the image encoder run once per frame.
+
+    The encoder output for the last ``max_images`` frames is kept, keyed by
+    the frame's content hash, so re-prompting a frame (another seed point,
+    extra points) runs only the prompt decoder.  Several points are decoded
+    in one batch, one mask each; ``segment`` returns their union.
+    """
+
+    def __init__(self, weights: str = DEFAULT_SAM_WEIGHTS, max_images: int = 4):
+        self.weights = weights
+        self.max_images = max_images
+        self._features = OrderedDict()
+        self._lock = threading.Lock()
+        self._model = None
+        self._prompter = None
+        self.encodes = 0
+        self.hits = 0
+
+    def _current_prompter(self):
+        sam = get_sam(self.weights)
+        if sam is not self._model:
+            # another model (or a pinned stand-in): old embeddings don't apply
+            self._model = sam
+            self._prompter = _prompter(sam)
+            self._features.clear()
+        return self._prompter
+
+    def _embedding(self, prompter, frame):
+        key = frame.digest
+        if key in self._features:
+            self._features.move_to_end(key)
+            self.hits += 1
+            return self._features[key]
+        with tracing.span("sam.encode", width=frame.shape[1], height=frame.shape[0]):
+            features = prompter.embed(frame.bgr)
+        self.encodes += 1
+        self._features[key] = features
+        while len(self._features) > self.max_images:
+            self._features.popitem(last=False)
+        return features
+
+    def embed(self, image):
+        """Run (or reuse) the image encoder for ``image`` ahead of any prompt."""
+        frame = Frame.from_any(image)
+        with self._lock:
+            self._embedding(self._current_prompter(), frame)
+
+    def predict(self, image, points):
+        """SAM results for ``points`` [(x, y), ...], one mask per point."""
+        frame = Frame.from_any(image)
+        if len(points) == 0:
+            raise ValueError("At least one prompt point is needed")
+        with self._lock:
+            prompter = self._current_prompter()
+            features = self._embedding(prompter, frame)
+            with tracing.span("sam.decode", points=len(points)):
+                return prompter.decode(frame.bgr, features, points)
+
+    def segment(self, image, points):
+        """Union of the masks for ``points`` as a ``WallMask``, and the raw results."""
+        results = self.predict(image, points)
+        return WallMask.from_results(results), results
+
+    def forget(self, image=None):
+        """Drop the cached embedding of ``image``, or all of them."""
+        with self._lock:
+            if image is None:
+                self._features.clear()
+            else:
+                self._features.pop(Frame.from_any(image).digest, None)
+
+    def stats(self):
+        return {"images": len(self._features), "max_images": self.max_images,
+                "encodes": self.encodes, "hits": self.hits}
+
+
+def get_segmentation_service(weights: str = DEFAULT_SAM_WEIGHTS):
+    """The process-wide service for ``weights``; switching weights drops the old one."""
+    return registry.get("sam_service", weights, lambda: SegmentationService(weights))
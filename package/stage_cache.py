@@ -0,0 +1,60 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def stage_key(stage, params, upstream=()):
+    """
+    Cache key of one pipeline stage: its name, its own parameters and the
+    keys of the stages it consumes.  A change anywhere upstream (a new image,
+    another Segformer) therefore changes every downstream key, while a change
+    to a late parameter (``gap``) leaves the earlier keys untouched.
+    """
+    h = hashlib.sha1(stage.encode())
+    h.update(repr(sorted(params.items())).encode())
+    for key in upstream:
+        h.update(key.encode())
+    return h.hexdigest()
+
+
+class StageCache:
+    """In-memory LRU of stage outputs, shared by every pipeline that uses it."""
+
+    def __init__(self, max_entries: int = 48):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {"entries": len(self), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,254 @@
+import time
+from collections import deque
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from . import tracing
+
+
+# Default wall-clock budget (seconds) for improving a large tour.
+TOUR_TIME_BUDGET = 2.0
+
+_EPS = 1e-9
+
+# Above this many nodes a distance matrix is indexed in place instead of
+# being converted to (much larger) nested Python lists.
+_LIST_MATRIX_LIMIT = 2000
+
+
+def _distance_fn(coords, dist):
+    if dist is not None:
+        dist = np.asarray(dist, dtype=float)
+        if len(dist) > _LIST_MATRIX_LIMIT:
+            return lambda a, b: dist[a, b]
+        rows = dist.tolist()
+        return lambda a, b: rows[a][b]
+    xs = [int(x) for x in coords[:, 0]]
+    ys = [int(y) for y in coords[:, 1]]
+    return lambda a, b: max(abs(xs[a] - xs[b]), abs(ys[a] - ys[b]))
+
+
+def candidate_lists(coords=None, dist=None, k=8):
+    """
+    The ``k`` nearest other nodes of every node, closest first.
+
+    Uses a Chebyshev KD-tree on ``coords`` when no distance matrix is given,
+    otherwise a row-wise partial sort of ``dist``.
+    """
+    n = len(dist) if dist is not None else len(coords)
+    k = min(k, n - 1)
+    if k <= 0:
+        return [[] for _ in range(n)]
+    if dist is None:
+        _, idx = cKDTree(coords).query(coords, k=k + 1, p=np.inf)
+    else:
+        d = np.array(dist, dtype=float)
+        np.fill_diagonal(d, -1.0)
+        idx = np.argpartition(d, k, axis=1)[:, :k + 1]
+        order = np.argsort(np.take_along_axis(d, idx, axis=1), axis=1)
+        idx = np.take_along_axis(idx, order, axis=1)
+    return [[int(j) for j in row if j != i][:k] for i, row in enumerate(idx)]
+
+
+def _nearest_neighbour_tour(coords, dist):
+    n = len(dist) if dist is not None else len(coords)
+    visited = np.zeros(n, dtype=bool)
+    tour = [0]
+    visited[0] = True
+    if dist is not None:
+        d = np.asarray(dist, dtype=float)
+        cur = 0
+        for _ in range(n - 1):
+            row = np.where(visited, np.inf, d[cur])
+            cur = int(np.argmin(row))
+            visited[cur] = True
+            tour.append(cur)
+        return tour
+
+    tree = cKDTree(coords)
+    cur = 0
+    for _ in range(n - 1):
+        k = 8
+        nxt = -1
+        while nxt < 0 and k < n:
+            _, idx = tree.query(coords[cur], k=min(k, n), p=np.inf)
+            for j in np.atleast_1d(idx):
+                if not visited[j]:
+                    nxt = int(j)
+                    break
+            k *= 4
+        if nxt < 0:
+            left = np.flatnonzero(~visited)
+            gaps = np.abs(coords[left] - coords[cur]).max(axis=1)
+            nxt = int(left[np.argmin(gaps)])
+        visited[nxt] = True
+        tour.append(nxt)
+        cur = nxt
+    return tour
+
+
+class _Tour:
+    """Cyclic tour as a node list plus node -> position index."""
+
+    def __init__(self, order):
+        self.t = list(order)
+        self.n = len(self.t)
+        self.pos = [0] * self.n
+        for p, node in enumerate(self.t):
+            self.pos[node] = p
+
+    def succ(self, a):
+        return self.t[(self.pos[a] + 1) % self.n]
+
+    def pred(self, a):
+        return self.t[self.pos[a] - 1]
+
+    def _reindex(self, lo, hi):
+        t, pos = self.t, self.pos
+        for p in range(lo, hi + 1):
+            pos[t[p]] = p
+
+    def reverse(self, p, q):
+        """Reverse positions ``p+1 .. q`` (2-opt on edges at ``p`` and ``q``)."""
+        p, q = p % self.n, q % self.n
+        if p > q:
+            p, q = q, p
+        self.t[p + 1:q + 1] = self.t[p + 1:q + 1][::-1]
+        self._reindex(p + 1, q)
+
+    def move_segment(self, i, length, after, reverse):
+        """Move ``t[i:i+length]`` to just after node ``after``."""
+        seg = self.t[i:i + length]
+        if reverse:
+            seg.reverse()
+        j = self.pos[after]
+        del self.t[i:i + length]
+        if j > i:
+            j -= length
+        self.t[j + 1:j + 1] = seg
+        self._reindex(min(i, j + 1), max(i + length - 1, j + length))
+
+    def closed_from(self, start):
+        p = self.pos[start]
+        return self.t[p:] + self.t[:p] + [start]
+
+
+def _improve(tour, d, neigh, deadline):
+    n = tour.n
+    active = deque(tour.t)
+    queued = [True] * n
+
+    def wake(*nodes):
+        for v in nodes:
+            if not queued[v]:
+                queued[v] = True
+                active.append(v)
+
+    while active:
+        if time.perf_counter() > deadline:
+            return False
+        a = active.popleft()
+        queued[a] = False
+        improved = False
+
+        # 2-opt: try a -> c for each candidate c, on both sides of a
+        for direction in (0, 1):
+            a_nb = tour.succ(a) if direction == 0 else tour.pred(a)
+            d_a = d(a, a_nb)
+            for c in neigh[a]:
+                g1 = d_a - d(a, c)
+                if g1 <= _EPS:
+                    break
+                c_nb = tour.succ(c) if direction == 0 else tour.pred(c)
+                if c_nb == a or c == a_nb:
+                    continue
+                delta = d(a_nb, c_nb) - d(c, c_nb) - g1
+                if delta < -_EPS:
+                    pa, pc = tour.pos[a], tour.pos[c]
+                    if direction == 0:
+                        tour.reverse(pa, pc)
+                    else:
+                        tour.reverse(pa - 1, pc - 1)
+                    wake(a, a_nb, c, c_nb)
+                    improved = True
+                    break
+            if improved:
+                break
+        if improved:
+            continue
+
+        # Or-opt: move a segment of 1-3 nodes starting at a elsewhere
+        i = tour.pos[a]
+        for length in (1, 2, 3):
+            if i == 0 or i + length >= n or length >= n - 2:
+                break
+            seg = tour.t[i:i + length]
+            s0, s1 = seg[0], seg[-1]
+            p, nx = tour.t[i - 1], tour.t[i + length]
+            removed = d(p, s0) + d(s1, nx) - d(p, nx)
+            best = None
+            for end in (s0, s1):
+                for c in neigh[end]:
+                    if c in seg:
+                        continue
+                    e = tour.succ(c)
+                    if e in seg:
+                        continue
+                    for rev in (False, True):
+                        first, last = (s1, s0) if rev else (s0, s1)
+                        added = d(c, first) + d(last, e) - d(c, e)
+                        gain = removed - added
+                        if gain > _EPS and (best is None or gain > best[0]):
+                            best = (gain, c, rev)
+            if best is not None:
+                _, c, rev = best
+                e = tour.succ(c)
+                tour.move_segment(i, length, c, rev)
+                wake(p, nx, c, e, *seg)
+                improved = True
+                break
+    return True
+
+
+def solve_tour(coords=None, dist=None, time_budget=TOUR_TIME_BUDGET,
+               neighbours=8, return_stats=False):
+    """
+    Closed tour through every node, starting and ending at node 0.
+
+    Builds a nearest-neighbour tour (KD-tree on ``coords``, or ``dist`` rows
+    when a distance matrix is given), then improves it with 2-opt and Or-opt
+    moves restricted to each node's ``neighbours`` nearest candidates, using
+    don't-look bits.  Improvement stops at ``time_budget`` seconds and the best
+    tour so far is returned.
+    """
+    start = time.perf_counter()
+    deadline = start + time_budget
+    if coords is not None:
+        coords = np.asarray(coords, dtype=np.int64)
+    n = len(dist) if dist is not None else len(coords)
+    if n < 3:
+        tour = list(range(n)) + [0] if n else []
+        return (tour, {"converged": True, "seconds": 0.0}) if return_stats else tour
+
+    d = _distance_fn(coords, dist)
+    with tracing.span("tour.construct", nodes=n):
+        neigh = candidate_lists(coords, dist, neighbours)
+        tour = _Tour(_nearest_neighbour_tour(coords, dist))
+    with tracing.span("tour.improve", nodes=n) as sp:
+        converged = _improve(tour, d, neigh, deadline)
+        sp.set(converged=converged)
+
+    closed = tour.closed_from(0)
+    if return_stats:
+        return closed, {"converged": converged,
+                        "seconds": time.perf_counter() - start}
+    return closed
+
+
+def tour_length(tour, coords=None, dist=None):
+    if dist is not None:
+        dist = np.asarray(dist)
+        return float(dist[tour[:-1], tour[1:]].sum())
+    pts = np.asarray(coords)[tour]
+    return float(np.abs(np.diff(pts, axis=0)).max(axis=1).sum())
@@ -0,0 +1,180 @@
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+
+# Tracing is off unless WALL_TRACE is set or enable() is called.
+_enabled = bool(os.environ.get("WALL_TRACE"))
+
+# Oldest events are dropped past this many, so a long-running app stays bounded.
+MAX_EVENTS = 200_000
+
+_events = deque(maxlen=MAX_EVENTS)
+_request = contextvars.ContextVar("trace_request", default=None)
+_pid = os.getpid()
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def reset():
+    _events.clear()
+
+
+def _now_us():
+    return time.perf_counter_ns() / 1000
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = _now_us()
+        return self
+
+    def set(self, **args):
+        """Attach more arguments (sizes, results) to the span before it closes."""
+        self.args.update(args)
+
+    def __exit__(self, exc_type, *exc):
+        end = _now_us()
+        request = _request.get()
+        if request is not None:
+            self.args["request"] = request
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        _events.append({"name": self.name, "ph": "X", "ts": self.start,
+                        "dur": end - self.start, "pid": _pid,
+                        "tid": threading.get_ident(), "args": self.args})
+        return False
+
+
+def span(name, **args):
+    """
+    Context manager timing one piece of work; spans opened inside it (on the
+    same thread) nest under it in the trace viewer.  Costs one flag check
+    when tracing is disabled.
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, args)
+
+
+def traced(name=None):
+    """Decorator form of ``span``, named after the function by default."""
+    def wrap(fn):
+        label = name or f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__name__}"
+
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Span(label, {}):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def counter(name, value):
+    """Record a sampled value (points, tour length, frame age, ...)."""
+    if not _enabled:
+        return
+    args = {name: value}
+    request = _request.get()
+    _events.append({"name": name, "ph": "C", "ts": _now_us(), "pid": _pid,
+                    "tid": threading.get_ident(), "args": args,
+                    **({"request": request} if request is not None else {})})
+
+
+class request:
+    """Tags every span and counter recorded inside it (on this thread/task) with ``name``."""
+
+    def __init__(self, name):
+        self.name = name
+        self._token = None
+
+    def __enter__(self):
+        self._token = _request.set(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        _request.reset(self._token)
+        return False
+
+
+def events(request_name=None):
+    evs = list(_events)
+    if request_name is None:
+        return evs
+    return [e for e in evs
+            if e.get("request", e["args"].get("request")) == request_name]
+
+
+def summary(request_name=None):
+    """
+    Per-span-name ``count``/``total_ms``/``max_ms`` and per-counter
+    ``last``/``max``, over all events or one request's, slowest spans first.
+    """
+    spans = defaultdict(lambda: {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+    counters = {}
+    for e in events(request_name):
+        if e["ph"] == "X":
+            s = spans[e["name"]]
+            ms = e["dur"] / 1000
+            s["count"] += 1
+            s["total_ms"] += ms
+            s["max_ms"] = max(s["max_ms"], ms)
+        else:
+            value = e["args"][e["name"]]
+            c = counters.setdefault(e["name"], {"last": value, "max": value})
+            c["last"] = value
+            c["max"] = max(c["max"], value)
+    ordered = sorted(spans.items(), key=lambda kv: -kv[1]["total_ms"])
+    return {"spans": {k: {**v, "total_ms": round(v["total_ms"], 3),
+                          "max_ms": round(v["max_ms"], 3)} for k, v in ordered},
+            "counters": counters}
+
+
+def chrome_trace(request_name=None):
+    """The events as a Chrome / Perfetto ``traceEvents`` JSON document."""
+    evs = [{k: v for k, v in e.items() if k != "request"} for e in events(request_name)]
+    return {"traceEvents": evs, "displayTimeUnit": "ms"}
+
+
+def export_chrome(path, request_name=None):
+    with open(path, "w") as f:
+        json.dump(chrome_trace(request_name), f, default=str)
+    return path
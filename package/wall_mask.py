@@ -0,0 +1,102 @@
+import cv2
+import numpy as np
+
+from . import tracing
+
+
+class WallMask:
+    """
+    Union of the SAM masks for one result, computed once and shared.
+
+    The N masks are OR-reduced on the device that produced them, so only one
+    (H, W) boolean plane is ever copied to the host.  Derived views (grid
+    samples, distance transform, routing cost, coloured overlay) are built on
+    first use and cached on the instance.
+    """
+
+    def __init__(self, mask: np.ndarray):
+        mask = np.asarray(mask)
+        if mask.ndim == 3:
+            mask = np.any(mask, axis=0)
+        if mask.ndim != 2:
+            raise ValueError(f"Expected an (H, W) mask, got shape {mask.shape}")
+        self.mask = np.ascontiguousarray(mask, dtype=bool)
+        self._views = {}
+
+    @classmethod
+    def from_results(cls, results):
+        data = results[0].masks.data
+        if isinstance(data, np.ndarray):
+            return cls(np.any(data, axis=0))
+        # torch tensor: reduce on its device, then one (H, W) transfer
+        with tracing.span("mask.transfer", masks=int(data.shape[0])):
+            return cls(data.any(dim=0).cpu().numpy())
+
+    @classmethod
+    def from_packed(cls, packed: np.ndarray, shape):
+        h, w = shape
+        bits = np.unpackbits(packed, count=h * w)
+        return cls(bits.reshape(h, w).astype(bool))
+
+    def packbits(self) -> np.ndarray:
+        return np.packbits(self.mask, axis=None)
+
+    @property
+    def shape(self):
+        return self.mask.shape
+
+    @property
+    def area(self) -> int:
+        return int(np.count_nonzero(self.mask))
+
+    @property
+    def bbox(self):
+        """(x0, y0, x1, y1) of the wall pixels, exclusive upper bounds."""
+        if "bbox" not in self._views:
+            rows = np.flatnonzero(self.mask.any(axis=1))
+            cols = np.flatnonzero(self.mask.any(axis=0))
+            if rows.size == 0:
+                self._views["bbox"] = None
+            else:
+                self._views["bbox"] = (int(cols[0]), int(rows[0]),
+                                       int(cols[-1]) + 1, int(rows[-1]) + 1)
+        return self._views["bbox"]
+
+    def samples(self, gap: int) -> np.ndarray:
+        """Mask values on the ``gap``-spaced grid, as a strided view."""
+        key = ("samples", gap)
+        if key not in self._views:
+            self._views[key] = self.mask[::gap, ::gap]
+        return self._views[key]
+
+    def distance_transform(self) -> np.ndarray:
+        """Euclidean distance (pixels) from each wall pixel to the nearest non-wall pixel."""
+        if "distance" not in self._views:
+            self._views["distance"] = cv2.distanceTransform(
+                self.mask.view(np.uint8), cv2.DIST_L2, 5)
+        return self._views["distance"]
+
+    def cost(self, off_wall: float = 1e6) -> np.ndarray:
+        """Per-pixel routing cost: 1 on the wall, ``off_wall`` elsewhere."""
+        key = ("cost", off_wall)
+        if key not in self._views:
+            self._views[key] = np.where(self.mask, 1.0, off_wall)
+        return self._views[key]
+
+    def overlay(self, color=(0, 255, 0)) -> np.ndarray:
+        """BGR image that is ``color`` on the wall and black elsewhere."""
+        key = ("overlay", tuple(color))
+        if key not in self._views:
+            colored = np.zeros(self.shape + (3,), dtype=np.uint8)
+            colored[self.mask] = color
+            self._views[key] = colored
+        return self._views[key]
+
+
+def as_wall_mask(obj) -> WallMask:
+    """Accept a ``WallMask``, a boolean array or raw ``SAM.predict`` results."""
+    if isinstance(obj, WallMask):
+        return obj
+    if isinstance(obj, np.ndarray):
+        return WallMask(obj)
+    return WallMask.from_results(obj)
@@ -1,3 +1,9 @@
+from .backends import DroneBackend, SimulatedTello, TelloBackend, create_backend
 from .drone import Drone
+from .frame_buffer import FrameBuffer, FrameReader, FrameRef
+from .telemetry import StaleTelemetry, Telemetry, TelemetryCache
 
-__all__ = ["Drone"]
+
+__all__ = ["Drone", "DroneBackend", "SimulatedTello", "TelloBackend", "create_backend",
+           "FrameBuffer", "FrameReader", "FrameRef",
+           "StaleTelemetry", "Telemetry", "TelemetryCache"]
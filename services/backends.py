@@ -0,0 +1,287 @@
+import glob
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+# Which backend ``create_backend()`` builds when none is named.
+DEFAULT_BACKEND = os.environ.get("DRONE_BACKEND", "tello")
+
+
+class DroneBackend:
+    """
+    The slice of the djitellopy ``Tello`` API this project uses: ``connect``,
+    ``streamon``/``streamoff``, ``get_frame_read``, ``takeoff``/``land``,
+    ``move_*``, ``rotate_*``, ``send_rc_control``, ``get_battery``,
+    ``get_current_state`` and ``end``.  Subclasses implement ``move`` and
+    ``rotate``; the named moves map onto them.  Creating a backend never
+    touches the network, ``connect()`` does.
+    """
+
+    def move(self, direction, cm):
+        raise NotImplementedError
+
+    def rotate(self, deg):
+        raise NotImplementedError
+
+    def move_up(self, cm):
+        return self.move("up", cm)
+
+    def move_down(self, cm):
+        return self.move("down", cm)
+
+    def move_left(self, cm):
+        return self.move("left", cm)
+
+    def move_right(self, cm):
+        return self.move("right", cm)
+
+    def move_forward(self, cm):
+        return self.move("forward", cm)
+
+    def move_back(self, cm):
+        return self.move("back", cm)
+
+    def rotate_clockwise(self, deg):
+        return self.rotate(deg)
+
+    def rotate_counter_clockwise(self, deg):
+        return self.rotate(-deg)
+
+
+class TelloBackend(DroneBackend):
+    """A real Tello through djitellopy, created on first use."""
+
+    def __init__(self, response_timeout=None):
+        self.response_timeout = response_timeout
+        self._tello = None
+
+    @property
+    def tello(self):
+        if self._tello is None:
+            from djitellopy import Tello
+            self._tello = Tello()
+            if self.response_timeout is not None:
+                self._tello.RESPONSE_TIMEOUT = self.response_timeout
+        return self._tello
+
+    def __getattr__(self, name):
+        # connect, takeoff, get_battery, ... go straight to djitellopy
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.tello, name)
+
+    def move(self, direction, cm):
+        return self.tello.move(direction, cm)
+
+    def rotate(self, deg):
+        if deg >= 0:
+            return self.tello.rotate_clockwise(deg)
+        return self.tello.rotate_counter_clockwise(-deg)
+
+
+class _FrameRead:
+    """Stand-in for djitellopy's ``BackgroundFrameRead``: ``.frame`` is the newest frame."""
+
+    def __init__(self):
+        self.frame = None
+        self.stopped = False
+
+
+class SimulatedTello(DroneBackend):
+    """
+    In-process Tello for running missions without hardware.
+
+    The video stream replays the JPEGs in ``frames_dir`` (``sample_input/``
+    by default) in a loop at ``fps``.  Every command blocks like the real
+    SDK call until its "ok": ``ack_latency`` plus the flight time at
+    ``speed_cm_s`` (or ``yaw_deg_s``).  After a move the state stream keeps
+    reporting velocity and tilt for ``settle_s``, so settle detection has
+    something to wait for.  Battery drains ``drain_per_s`` percent per second
+    airborne plus ``drain_per_m`` per metre flown.
+
+    ``time_scale`` shrinks every delay (0.1 runs ten times faster) for CI.
+    """
+
+    def __init__(self, frames_dir="sample_input", fps=30.0,
+                 ack_latency=0.1, speed_cm_s=70.0, yaw_deg_s=90.0,
+                 takeoff_s=4.0, land_s=3.0, settle_s=0.6,
+                 battery=100.0, drain_per_s=0.08, drain_per_m=0.3,
+                 time_scale=1.0, frame_size=(960, 720)):
+        self.frames_dir = frames_dir
+        self.fps = fps
+        self.ack_latency = ack_latency
+        self.speed_cm_s = speed_cm_s
+        self.yaw_deg_s = yaw_deg_s
+        self.takeoff_s = takeoff_s
+        self.land_s = land_s
+        self.settle_s = settle_s
+        self.battery = battery
+        self.drain_per_s = drain_per_s
+        self.drain_per_m = drain_per_m
+        self.time_scale = time_scale
+        self.frame_size = frame_size
+
+        self.connected = False
+        self.flying = False
+        self.position = np.zeros(3)  # x (right), y (forward), z (up), cm
+        self.yaw = 0.0
+        self.commands = []
+
+        self._lock = threading.Lock()
+        self._frames = None
+        self._frame_read = None
+        self._stream_stop = threading.Event()
+        self._stream_thread = None
+        self._airborne_since = None
+        self._flight_start = None
+        self._moving_until = 0.0
+        self._velocity = np.zeros(3)
+
+    def _wait(self, seconds):
+        time.sleep(seconds * self.time_scale)
+
+    def _require(self, flying=True):
+        if not self.connected:
+            raise RuntimeError("Simulated Tello is not connected")
+        if flying and not self.flying:
+            raise RuntimeError("Simulated Tello is not flying")
+        if self.battery <= 0:
+            raise RuntimeError("Simulated Tello battery is empty")
+
+    def _drain(self, metres=0.0):
+        with self._lock:
+            now = time.monotonic()
+            if self._airborne_since is not None:
+                airborne = (now - self._airborne_since) / self.time_scale
+                self.battery -= airborne * self.drain_per_s
+                self._airborne_since = now
+            self.battery = max(0.0, self.battery - metres * self.drain_per_m)
+
+    def _load_frames(self):
+        paths = sorted(glob.glob(os.path.join(self.frames_dir, "*.jpg")))
+        frames = [cv2.imread(p, cv2.IMREAD_COLOR) for p in paths]
+        frames = [f for f in frames if f is not None]
+        if not frames:
+            w, h = self.frame_size
+            frames = [np.full((h, w, 3), 127, dtype=np.uint8)]
+        return frames
+
+    def _stream(self):
+        k = 0
+        period = 1.0 / self.fps
+        while not self._stream_stop.is_set():
+            # a fresh array per frame, like the decoder hands out
+            self._frame_read.frame = self._frames[k % len(self._frames)].copy()
+            k += 1
+            self._stream_stop.wait(period * self.time_scale)
+
+    def connect(self):
+        self._wait(self.ack_latency)
+        self.connected = True
+
+    def streamon(self):
+        self._require(flying=False)
+        if self._stream_thread is None:
+            if self._frames is None:
+                self._frames = self._load_frames()
+            self._frame_read = _FrameRead()
+            self._stream_stop.clear()
+            self._stream_thread = threading.Thread(target=self._stream, name="SimVideo",
+                                                   daemon=True)
+            self._stream_thread.start()
+
+    def streamoff(self):
+        self._stream_stop.set()
+        if self._stream_thread is not None:
+            self._stream_thread.join()
+            self._frame_read.stopped = True
+        self._stream_thread = None
+
+    def get_frame_read(self):
+        if self._stream_thread is None:
+            self.streamon()
+        return self._frame_read
+
+    def _command(self, name, value, seconds, velocity=(0, 0, 0)):
+        self.commands.append((name, value))
+        self._wait(self.ack_latency + seconds)
+        with self._lock:
+            self._moving_until = time.monotonic() + self.settle_s * self.time_scale
+            self._velocity = np.asarray(velocity, dtype=float)
+
+    def takeoff(self):
+        self._require(flying=False)
+        self._command("takeoff", 0, self.takeoff_s)
+        self.flying = True
+        self._airborne_since = self._flight_start = time.monotonic()
+        self.position[2] = 80
+
+    def land(self):
+        self._require()
+        self._command("land", 0, self.land_s)
+        self._drain()
+        self.flying = False
+        self._airborne_since = None
+        self.position[2] = 0
+
+    def move(self, direction, cm):
+        self._require()
+        if not 20 <= cm <= 500:
+            raise ValueError(f"move {direction} {cm}: out of range (20-500 cm)")
+        axis, sign = {"right": (0, 1), "left": (0, -1), "forward": (1, 1),
+                      "back": (1, -1), "up": (2, 1), "down": (2, -1)}[direction]
+        step = np.zeros(3)
+        step[axis] = sign * cm
+        # residual drift after the move, in dm/s like the Tello state stream
+        self._command(f"move_{direction}", cm, cm / self.speed_cm_s, step / cm * 3)
+        self.position += step
+        self._drain(cm / 100)
+
+    def rotate(self, deg):
+        self._require()
+        if not 1 <= abs(deg) <= 360:
+            raise ValueError(f"rotate {deg}: out of range (1-360 degrees)")
+        name = "rotate_clockwise" if deg > 0 else "rotate_counter_clockwise"
+        self._command(name, abs(deg), abs(deg) / self.yaw_deg_s)
+        self.yaw = (self.yaw + deg) % 360
+        self._drain()
+
+    def send_rc_control(self, lr, fb, ud, yaw):
+        self._require(flying=False)
+
+    def get_battery(self):
+        self._drain()
+        return int(round(self.battery))
+
+    def get_current_state(self):
+        with self._lock:
+            moving = time.monotonic() < self._moving_until
+            vgx, vgy, vgz = (self._velocity if moving else np.zeros(3)).round().astype(int)
+            tilt = 4 if moving else 0
+            flown = 0.0 if self._flight_start is None else time.monotonic() - self._flight_start
+        return {"vgx": int(vgx), "vgy": int(vgy), "vgz": int(vgz),
+                "pitch": tilt, "roll": tilt, "yaw": int(self.yaw),
+                "h": int(self.position[2]), "bat": self.get_battery(),
+                "time": int(flown / self.time_scale)}
+
+    def end(self):
+        self.streamoff()
+        self.connected = False
+
+
+def create_backend(kind=None, **kwargs):
+    """
+    A drone backend by name: ``"tello"`` (djitellopy) or ``"sim"``
+    (``SimulatedTello``); defaults to the ``DRONE_BACKEND`` environment
+    variable, else ``"tello"``.  Nothing connects until ``connect()``.
+    """
+    kind = kind or DEFAULT_BACKEND
+    if kind == "tello":
+        return TelloBackend(**kwargs)
+    if kind == "sim":
+        return SimulatedTello(**kwargs)
+    raise ValueError(f"Unknown drone backend {kind!r}; use 'tello' or 'sim'")
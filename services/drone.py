@@ -1,69 +1,107 @@
-from djitellopy import Tello
 import time
 
+from .backends import create_backend
+from .frame_buffer import FrameBuffer, FrameReader
+from .telemetry import TelemetryCache
 
-class Drone():
-    global drone
-
-    drone = Tello()
-    drone.connect()
-    drone.streamon()
 
-    if drone.get_battery() > 80:
-        print(f"\033[92mBattery level: {drone.get_battery()}%\033[0m")
-    elif drone.get_battery() > 0 and drone.get_battery() < 80:
-        print(f"\033[93mBattery level: {drone.get_battery()}%\033[0m")
-    else:
-        print(f"\033[91mBattery level: {drone.get_battery()}%\033[0m")
-        print("Please charge the drone 🙏")
-        exit()
+class Drone():
+    # connected on first use, not at import; DRONE_BACKEND=sim picks the simulator
+    backend = None
+    frames = FrameBuffer()
+    frame_reader = None
+    telemetry = None
+
+    @classmethod
+    def use_backend(cls, backend):
+        """Replace the backend (e.g. a ``SimulatedTello``) before the first command."""
+        cls.backend = backend
+
+    @classmethod
+    def connect(cls):
+        if cls.backend is None:
+            cls.backend = create_backend()
+        drone = cls.backend
+        if cls.frame_reader is not None:
+            return drone
+
+        drone.connect()
+        drone.streamon()
+
+        # battery, height, attitude, ... from the state stream, read without round trips
+        cls.telemetry = TelemetryCache(drone).start()
+        try:
+            battery = cls.telemetry.refresh().battery
+            if battery is None:
+                print("\033[93mBattery level: unknown\033[0m")
+            elif battery > 80:
+                print(f"\033[92mBattery level: {battery}%\033[0m")
+            elif battery > 0:
+                print(f"\033[93mBattery level: {battery}%\033[0m")
+            else:
+                print(f"\033[91mBattery level: {battery}%\033[0m")
+                print("Please charge the drone 🙏")
+                raise RuntimeError(f"Battery level too low to fly: {battery}%")
+
+            # newest decoded frames, filled in the background and shared by every reader
+            cls.frame_reader = FrameReader(lambda: drone.get_frame_read().frame, cls.frames)
+            cls.frame_reader.start()
+        except BaseException:
+            # not connected: the next connect() starts over instead of adding a thread
+            cls.telemetry.stop()
+            cls.telemetry = None
+            cls.frame_reader = None
+            raise
+        return drone
 
     @staticmethod
     def takeoff():
-        drone.takeoff()
+        Drone.connect().takeoff()
 
     @staticmethod
     def move_up(height):
-        drone.move_up(height)
+        Drone.connect().move_up(height)
 
     @staticmethod
     def move_down(height):
-        drone.move_down(height)
+        Drone.connect().move_down(height)
 
     @staticmethod
     def move_left(height):
-        drone.move_left(height)
+        Drone.connect().move_left(height)
 
     @staticmethod
     def move_right(height):
-        drone.move_right(height)
+        Drone.connect().move_right(height)
 
     @staticmethod
     def move_forward(height):
-        drone.move_forward(height)
+        Drone.connect().move_forward(height)
 
     @staticmethod
     def land():
-        drone.land()
+        Drone.connect().land()
 
     @staticmethod
-    def take_image():
-        time.sleep(2)
-
-        try:
-            _ = drone.get_frame_read().frame
-            time.sleep(0.5)
-
-            frame = drone.get_frame_read().frame
-            return frame
-        except Exception as e:
-            print(f"Error capturing frame: {e}")
+    def take_image(settle=2.0, timeout=5.0):
+        """First frame captured ``settle`` seconds from now, as a private copy."""
+        Drone.connect()
+        ref = Drone.frames.wait_for(after=time.monotonic() + settle,
+                                    timeout=settle + timeout)
+        if ref is None:
+            print(f"Error capturing frame: no frame within {settle + timeout}s")
             return None
+        image = Drone.frames.copy(ref)
+        if image is None:
+            # its slot was reused before the copy: a newer frame is just as good
+            image = Drone.frames.copy(Drone.frames.latest())
+        return image
 
     @staticmethod
     def is_drone_connected():
-        return drone.connect()
+        return Drone.connect().connect()
 
     @staticmethod
-    def get_battery():
-        return drone.get_battery()
+    def get_battery(max_age=None):
+        Drone.connect()
+        return Drone.telemetry.battery(max_age)
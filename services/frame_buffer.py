@@ -0,0 +1,157 @@
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class FrameRef:
+    """One buffered frame: a read-only view into its ring slot plus metadata."""
+    seq: int
+    timestamp: float
+    image: np.ndarray
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.timestamp
+
+
+class FrameBuffer:
+    """
+    Fixed ring of preallocated frame slots shared by a producer (the video
+    reader) and any number of consumers.
+
+    ``put`` copies a frame into the next slot and stamps it with a sequence
+    number and a ``time.monotonic()`` capture time.  Consumers get
+    ``FrameRef``s whose ``image`` is a read-only view of the slot, so reading
+    costs nothing; a view stays valid until ``capacity`` newer frames have
+    arrived (``is_current(seq)``).  To keep a frame, take ``copy(ref)``: a
+    copy made outside the lock can be overwritten halfway by ``put``.
+
+    ``dropped`` counts frames overwritten before any consumer looked at them.
+    """
+
+    def __init__(self, capacity: int = 8):
+        self.capacity = capacity
+        self._slots = None
+        self._seqs = np.full(capacity, -1, dtype=np.int64)
+        self._times = np.zeros(capacity)
+        self._read = np.zeros(capacity, dtype=bool)
+        self._next = 0
+        self._cond = threading.Condition()
+        self.dropped = 0
+
+    def put(self, frame, timestamp=None) -> int:
+        frame = np.asarray(frame)
+        if timestamp is None:
+            timestamp = time.monotonic()
+        with self._cond:
+            if self._slots is None or self._slots.shape[1:] != frame.shape:
+                self._slots = np.empty((self.capacity,) + frame.shape, dtype=frame.dtype)
+                self._seqs[:] = -1
+                self._read[:] = False
+            seq = self._next
+            i = seq % self.capacity
+            if self._seqs[i] >= 0 and not self._read[i]:
+                self.dropped += 1
+            np.copyto(self._slots[i], frame)
+            self._seqs[i] = seq
+            self._times[i] = timestamp
+            self._read[i] = False
+            self._next += 1
+            self._cond.notify_all()
+        return seq
+
+    def _ref(self, i) -> FrameRef:
+        self._read[i] = True
+        view = self._slots[i].view()
+        view.flags.writeable = False
+        return FrameRef(int(self._seqs[i]), float(self._times[i]), view)
+
+    def latest(self):
+        """The newest frame, or ``None`` before the first one arrives."""
+        with self._cond:
+            if self._next == 0:
+                return None
+            return self._ref((self._next - 1) % self.capacity)
+
+    def get(self, seq):
+        """Frame ``seq`` if it is still in the ring, else ``None``."""
+        with self._cond:
+            i = seq % self.capacity
+            if seq < 0 or self._seqs[i] != seq:
+                return None
+            return self._ref(i)
+
+    def copy(self, ref):
+        """A private copy of ``ref``'s image, or ``None`` if its slot has been reused."""
+        with self._cond:
+            i = ref.seq % self.capacity
+            if self._seqs[i] != ref.seq:
+                return None
+            return self._slots[i].copy()
+
+    def is_current(self, seq) -> bool:
+        with self._cond:
+            return seq >= 0 and self._seqs[seq % self.capacity] == seq
+
+    def wait_for(self, after=None, timeout=None):
+        """
+        The first frame captured strictly after monotonic time ``after``
+        (default: now), waiting up to ``timeout`` seconds; ``None`` on timeout.
+        """
+        if after is None:
+            after = time.monotonic()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                for seq in range(max(0, self._next - self.capacity), self._next):
+                    i = seq % self.capacity
+                    if self._seqs[i] == seq and self._times[i] > after:
+                        return self._ref(i)
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def stats(self):
+        with self._cond:
+            last = (self._next - 1) % self.capacity
+            age = time.monotonic() - float(self._times[last]) if self._next else None
+            return {"frames": self._next, "dropped": self.dropped,
+                    "age_ms": None if age is None else round(age * 1000, 1)}
+
+
+class FrameReader(threading.Thread):
+    """
+    Daemon thread that polls ``read_frame()`` every ``interval`` seconds and
+    pushes new frames into ``buffer``.  A source that hands back the same
+    array object again (no new decode yet) is not copied twice.
+    """
+
+    def __init__(self, read_frame, buffer: FrameBuffer, interval: float = 0.03,
+                 stop_event=None):
+        super().__init__(name="FrameReaderThread", daemon=True)
+        self.read_frame = read_frame
+        self.buffer = buffer
+        self.interval = interval
+        self.stop_event = stop_event or threading.Event()
+        self.errors = 0
+
+    def run(self):
+        last = None
+        while not self.stop_event.is_set():
+            try:
+                frame = self.read_frame()
+                if frame is not None and frame is not last:
+                    self.buffer.put(frame)
+                    last = frame
+            except Exception as e:
+                # transient stream errors should not end the mission
+                self.errors += 1
+                print(f"Error fetching frame: {e}")
+            self.stop_event.wait(self.interval)
+
+    def stop(self):
+        self.stop_event.set()
@@ -0,0 +1,161 @@
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import cv2
+import numpy as np
+
+from package import tracing
+
+
+WRITE_MODES = ("jpeg", "raw", "video")
+
+_STOP = object()
+
+
+class FrameWriter:
+    """
+    Background frame persistence fed by a bounded queue.
+
+    ``submit`` copies the frame, queues it and returns at once with a
+    ``Future`` that resolves when the frame is on disk: to the file path in
+    ``"jpeg"`` mode (``frame_00000.jpg``, ``frame_00001.jpg``, ...) or to the
+    frame's index in the recording otherwise.  A full queue never blocks the
+    caller; the frame is counted in ``dropped`` and its future fails with
+    ``queue.Full``.
+
+    ``"raw"`` appends every frame to one ``recording.raw`` file with a JSON
+    sidecar (read it back as a memory map with ``load_recording``), and
+    ``"video"`` appends to ``recording.mp4``.  Both keep submit order, so
+    they use a single worker.
+    """
+
+    def __init__(self, directory, mode="jpeg", workers=2, max_queue=32,
+                 fps=30.0, jpeg_quality=95):
+        if mode not in WRITE_MODES:
+            raise ValueError(f"Unknown mode {mode!r}; use one of {WRITE_MODES}")
+        self.directory = os.fspath(directory)
+        os.makedirs(self.directory, exist_ok=True)
+        self.mode = mode
+        self.fps = fps
+        self.jpeg_quality = jpeg_quality
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._next_index = 0
+        self._raw = None
+        self._video = None
+        self._shape = None
+        self._times = []
+
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.write_seconds = 0.0
+
+        n = workers if mode == "jpeg" else 1
+        self._threads = [threading.Thread(target=self._work, name=f"FrameWriter-{k}",
+                                          daemon=True) for k in range(n)]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, image, timestamp=None, copy=True) -> Future:
+        """Queues ``image``; ``copy=False`` hands over an array the caller no longer touches."""
+        future = Future()
+        frame = np.array(image, copy=True) if copy else image
+        with self._lock:
+            index = self._next_index
+            try:
+                self._queue.put_nowait((index, frame, timestamp, future))
+            except queue.Full as e:
+                self.dropped += 1
+                future.set_exception(e)
+                return future
+            self._next_index += 1
+            self.submitted += 1
+        return future
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            index, frame, timestamp, future = item
+            start = time.perf_counter()
+            try:
+                with tracing.span("frame.save", mode=self.mode, index=index):
+                    result = self._write(index, frame, timestamp)
+            except Exception as e:
+                print(f"Error saving frame {index}: {e}")
+                future.set_exception(e)
+                continue
+            with self._lock:
+                self.written += 1
+                self.write_seconds += time.perf_counter() - start
+            future.set_result(result)
+
+    def _write(self, index, frame, timestamp):
+        if self.mode == "jpeg":
+            path = os.path.join(self.directory, f"frame_{index:05d}.jpg")
+            cv2.imwrite(path, frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            return path
+
+        if self._shape is None:
+            self._shape = frame.shape
+            if self.mode == "raw":
+                self._raw = open(os.path.join(self.directory, "recording.raw"), "wb")
+            else:
+                h, w = frame.shape[:2]
+                self._video = cv2.VideoWriter(
+                    os.path.join(self.directory, "recording.mp4"),
+                    cv2.VideoWriter_fourcc(*"mp4v"), self.fps, (w, h))
+        if frame.shape != self._shape:
+            raise ValueError(f"Frame shape {frame.shape} differs from the "
+                             f"recording's {self._shape}")
+        if self._raw is not None:
+            self._raw.write(np.ascontiguousarray(frame, dtype=np.uint8).data)
+        else:
+            self._video.write(frame)
+        self._times.append(timestamp)
+        return len(self._times) - 1
+
+    def close(self):
+        """Write everything still queued, then release the files."""
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for t in self._threads:
+            t.join()
+        if self._raw is not None:
+            self._raw.close()
+            with open(os.path.join(self.directory, "recording.json"), "w") as f:
+                json.dump({"shape": [len(self._times), *self._shape],
+                           "dtype": "uint8", "timestamps": self._times}, f)
+        if self._video is not None:
+            self._video.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def stats(self):
+        with self._lock:
+            mean = self.write_seconds / self.written if self.written else 0.0
+            return {"mode": self.mode, "submitted": self.submitted,
+                    "written": self.written, "dropped": self.dropped,
+                    "queued": self._queue.qsize(),
+                    "mean_write_ms": round(mean * 1000, 1)}
+
+
+def load_recording(directory):
+    """A ``"raw"`` recording as a read-only (N, H, W, 3) memory map plus timestamps."""
+    directory = os.fspath(directory)
+    with open(os.path.join(directory, "recording.json")) as f:
+        meta = json.load(f)
+    frames = np.memmap(os.path.join(directory, "recording.raw"), mode="r",
+                       dtype=meta["dtype"], shape=tuple(meta["shape"]))
+    return frames, meta["timestamps"]
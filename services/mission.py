@@ -0,0 +1,250 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+
+from package import tracing
+
+from .telemetry import StaleTelemetry
+
+
+# Commands that take a distance (cm) or angle (degrees) argument.
+VALUE_ACTIONS = ("move_up", "move_down", "move_left", "move_right",
+                 "move_forward", "move_back",
+                 "rotate_clockwise", "rotate_counter_clockwise")
+PLAIN_ACTIONS = ("takeoff", "land")
+
+# Settled means |vgx|, |vgy|, |vgz| <= SETTLE_SPEED (dm/s, Tello state units)
+# and |pitch|, |roll| <= SETTLE_ATTITUDE (degrees) for SETTLE_HOLD seconds.
+SETTLE_SPEED = 1
+SETTLE_ATTITUDE = 3
+SETTLE_HOLD = 0.3
+# Give up waiting for a settle after this long and carry on (the old fixed sleep).
+SETTLE_MAX = 3.0
+COMMAND_TIMEOUT = 20.0
+# No command but "land" is sent below this battery level (percent).
+MIN_BATTERY = 15
+
+
+class MissionError(RuntimeError):
+    pass
+
+
+@dataclass
+class CommandTiming:
+    action: str
+    value: int
+    ack_s: float = 0.0
+    settle_s: float = 0.0
+    save_s: float = 0.0
+    settled: bool = False
+    frames: list = field(default_factory=list)
+
+    @property
+    def total_s(self):
+        return self.ack_s + self.settle_s + self.save_s
+
+
+class MissionEngine:
+    """
+    Runs a command list on the drone, moving on as soon as each step is done
+    instead of after fixed sleeps.
+
+    Per command: queue the "before" frame (written in the background), send
+    the command and wait for the drone's ACK (djitellopy's blocking call, run
+    in a worker thread, bounded by ``command_timeout``), poll the state
+    stream until velocity and attitude stay below the settle thresholds, then
+    save the "after" frame and wait for the writer's acknowledgement.  A
+    command without an ACK in ``command_timeout`` raises ``MissionError``,
+    but only once its call has returned, so nothing (not even ``land``)
+    is sent to the drone while it is still in flight.
+
+    Every phase is timed; ``timings`` holds one ``CommandTiming`` per command
+    and ``summary()`` formats them.  A frame the writer drops or fails to
+    save is logged and recorded as ``None`` in ``frames``; the mission goes on.
+
+    With a ``TelemetryCache`` as ``telemetry``, settle detection reads the
+    cached state and every command except ``land`` is refused (``MissionError``)
+    when the battery is under ``min_battery`` or its reading is stale.
+    """
+
+    def __init__(self, drone, frame_buffer, frame_writer,
+                 command_timeout=COMMAND_TIMEOUT,
+                 settle_speed=SETTLE_SPEED,
+                 settle_attitude=SETTLE_ATTITUDE,
+                 settle_hold=SETTLE_HOLD,
+                 settle_max=SETTLE_MAX,
+                 poll=0.05,
+                 cancel_event=None,
+                 telemetry=None,
+                 min_battery=MIN_BATTERY):
+        self.drone = drone
+        self.frame_buffer = frame_buffer
+        self.frame_writer = frame_writer
+        self.command_timeout = command_timeout
+        self.settle_speed = settle_speed
+        self.settle_attitude = settle_attitude
+        self.settle_hold = settle_hold
+        self.settle_max = settle_max
+        self.poll = poll
+        self.cancel_event = cancel_event
+        self.telemetry = telemetry
+        self.min_battery = min_battery
+        self.timings = []
+        self.mission_s = 0.0
+
+    def _send(self, action, value):
+        with tracing.span("drone.ack", action=action, value=value):
+            if action in VALUE_ACTIONS:
+                getattr(self.drone, action)(int(value))
+            else:
+                getattr(self.drone, action)()
+
+    def check_safe(self, action):
+        if self.telemetry is None or action == "land":
+            return
+        try:
+            battery = self.telemetry.battery()
+        except StaleTelemetry as e:
+            raise MissionError(f"Refusing {action}: {e}") from None
+        if battery < self.min_battery:
+            raise MissionError(f"Refusing {action}: battery {battery}% "
+                               f"is below {self.min_battery}%")
+
+    def _is_still(self):
+        if self.telemetry is not None:
+            sample = self.telemetry.latest()
+            if sample is None or sample.age > self.telemetry.max_age["vgx"]:
+                return False
+            speeds = (sample.vgx, sample.vgy, sample.vgz)
+            angles = (sample.pitch, sample.roll)
+        else:
+            state = self.drone.get_current_state()
+            speeds = (state.get("vgx"), state.get("vgy"), state.get("vgz"))
+            angles = (state.get("pitch"), state.get("roll"))
+        if None in speeds + angles:
+            return False  # no reading is not a still drone
+        return (max(abs(v) for v in speeds) <= self.settle_speed
+                and max(abs(a) for a in angles) <= self.settle_attitude)
+
+    async def settle(self):
+        """Waits until the drone has been still for ``settle_hold`` seconds; False on ``settle_max``."""
+        start = time.monotonic()
+        still_since = None
+        while time.monotonic() - start < self.settle_max:
+            now = time.monotonic()
+            if self._is_still():
+                still_since = still_since or now
+                if now - still_since >= self.settle_hold:
+                    return True
+            else:
+                still_since = None
+            await asyncio.sleep(self.poll)
+        return False
+
+    async def save_frame(self, label, timeout=2.0):
+        """Queues the next captured frame for saving; awaitable ack, or None without a frame."""
+        ref = await asyncio.to_thread(self.frame_buffer.wait_for, None, timeout)
+        if ref is None:
+            print(f"No frame within {timeout}s, {label} frame not saved.")
+            return None
+        image = self.frame_buffer.copy(ref)
+        if image is None:
+            print(f"{label} frame was overwritten before it could be copied, not saved.")
+            return None
+        print(f"Queued {label} frame (seq {ref.seq}, {ref.age * 1000:.0f} ms old)")
+        tracing.counter("frame.age_ms", round(ref.age * 1000, 1))
+        return asyncio.wrap_future(
+            self.frame_writer.submit(image, timestamp=ref.timestamp, copy=False))
+
+    async def saved(self, ack, label):
+        """The writer's result for a queued frame, or None if it could not be saved."""
+        try:
+            return await ack
+        except Exception as e:
+            # a full queue or a disk error loses this frame, not the mission
+            print(f"{label} frame not saved: {e!r}")
+            return None
+
+    async def run_command(self, action, value):
+        """Runs one command; its ``CommandTiming``, or None if the action is unknown."""
+        timing = CommandTiming(action, int(value))
+        if action not in VALUE_ACTIONS and action not in PLAIN_ACTIONS:
+            print(f"Unknown action: '{action}'. Skipping.")
+            return None
+        self.check_safe(action)
+        self.timings.append(timing)
+
+        before = await self.save_frame("before-action")
+
+        start = time.monotonic()
+        send = asyncio.ensure_future(asyncio.to_thread(self._send, action, value))
+        done, _ = await asyncio.wait({send}, timeout=self.command_timeout)
+        if not done:
+            # the blocking SDK call cannot be interrupted; let it return first
+            # so the move cannot reach the drone after the landing it triggers
+            print(f"No ACK for {action} {value} within {self.command_timeout}s, "
+                  "waiting for the call to return...")
+            await asyncio.wait({send})
+            if send.exception() is not None:
+                print(f"{action} {value} failed late: {send.exception()!r}")
+            raise MissionError(f"No ACK for {action} {value} "
+                               f"within {self.command_timeout}s")
+        send.result()
+        timing.ack_s = time.monotonic() - start
+
+        if action == "land":
+            if before is not None:
+                timing.frames.append(await self.saved(before, "before-action"))
+            return timing
+
+        start = time.monotonic()
+        with tracing.span("drone.settle", action=action) as sp:
+            timing.settled = await self.settle()
+            sp.set(settled=timing.settled)
+        timing.settle_s = time.monotonic() - start
+
+        start = time.monotonic()
+        after = await self.save_frame("after-action")
+        for label, ack in (("before-action", before), ("after-action", after)):
+            if ack is not None:
+                timing.frames.append(await self.saved(ack, label))
+        timing.save_s = time.monotonic() - start
+        return timing
+
+    async def run(self, commands):
+        """Runs ``(action, value)`` pairs in order; stops after ``land`` or on cancel."""
+        mission_start = time.monotonic()
+        try:
+            initial = await self.save_frame("initial")
+            if initial is not None:
+                await initial
+            for action, value in commands:
+                if self.cancel_event is not None and self.cancel_event.is_set():
+                    print("Mission cancelled, skipping remaining commands.")
+                    break
+                try:
+                    self.drone.send_rc_control(0, 0, 0, 0)
+                except Exception as e:
+                    print(f"Error sending RC control: {e}")
+
+                print(f"Executing: {action} {value}")
+                timing = await self.run_command(action, value)
+                if timing is None:
+                    continue
+                print(f"Done: {action} {value} in {timing.total_s:.2f}s "
+                      f"(ack {timing.ack_s:.2f}s, settle {timing.settle_s:.2f}s"
+                      f"{'' if timing.settled else ' timed out'}, "
+                      f"save {timing.save_s:.2f}s)")
+                if action == "land":
+                    break
+        finally:
+            self.mission_s = time.monotonic() - mission_start
+        return self.timings
+
+    def summary(self):
+        lines = [f"{'action':<26}{'value':>6}{'ack':>8}{'settle':>8}{'save':>8}{'total':>8}"]
+        for t in self.timings:
+            lines.append(f"{t.action:<26}{t.value:>6}{t.ack_s:>8.2f}{t.settle_s:>8.2f}"
+                         f"{t.save_s:>8.2f}{t.total_s:>8.2f}")
+        lines.append(f"mission: {len(self.timings)} commands in {self.mission_s:.2f}s")
+        return "\n".join(lines)
@@ -0,0 +1,151 @@
+import threading
+import time
+from dataclasses import dataclass
+
+
+# Tello state-stream key -> telemetry field.
+STATE_FIELDS = {
+    "bat": "battery",
+    "h": "height",
+    "pitch": "pitch",
+    "roll": "roll",
+    "yaw": "yaw",
+    "vgx": "vgx",
+    "vgy": "vgy",
+    "vgz": "vgz",
+    "time": "flight_time",
+}
+
+# Default staleness limit (seconds) per field; anything older is refused.
+MAX_AGE = {
+    "battery": 10.0,
+    "flight_time": 10.0,
+    "height": 1.0,
+    "pitch": 0.5,
+    "roll": 0.5,
+    "yaw": 0.5,
+    "vgx": 0.5,
+    "vgy": 0.5,
+    "vgz": 0.5,
+}
+
+
+class StaleTelemetry(RuntimeError):
+    pass
+
+
+@dataclass(frozen=True)
+class Telemetry:
+    """
+    One state-stream sample; ``timestamp`` is ``time.monotonic()`` at receipt.
+    A field the packet did not carry is ``None`` (unknown), never 0.
+    """
+    timestamp: float
+    battery: int | None = None
+    height: int | None = None
+    pitch: int | None = None
+    roll: int | None = None
+    yaw: int | None = None
+    vgx: int | None = None
+    vgy: int | None = None
+    vgz: int | None = None
+    flight_time: int | None = None
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.timestamp
+
+
+class TelemetryCache:
+    """
+    Latest drone state, refreshed in the background from the backend's state
+    stream (``get_current_state()``, which djitellopy fills from the 10 Hz
+    UDP state packets without sending anything to the drone).
+
+    djitellopy replaces the state dict for every packet it receives, so a
+    sample is stamped only when the dict object changes: polling the same
+    dict again keeps the old timestamp and lets the sample go stale.
+
+    Readers never touch the drone: ``get(field)`` returns the cached value or
+    raises ``StaleTelemetry`` when the last sample is older than that
+    field's limit in ``max_age`` or did not carry the field.
+    """
+
+    def __init__(self, backend, interval: float = 0.1, max_age=None):
+        self.backend = backend
+        self.interval = interval
+        self.max_age = {**MAX_AGE, **(max_age or {})}
+        self._latest = None
+        self._last_state = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.samples = 0
+        self.errors = 0
+
+    def update(self, state):
+        """
+        Stores a state dict (Tello key names) and returns the latest sample.
+        The dict already stored, or an empty one, is no new packet.
+        """
+        with self._lock:
+            if not state or state is self._last_state:
+                return self._latest
+        values = {field: int(state[key]) for key, field in STATE_FIELDS.items()
+                  if state.get(key) is not None}
+        sample = Telemetry(time.monotonic(), **values)
+        with self._lock:
+            self._latest = sample
+            self._last_state = state
+            self.samples += 1
+        return sample
+
+    def refresh(self):
+        sample = self.update(self.backend.get_current_state())
+        if sample is None:
+            raise StaleTelemetry("No telemetry received yet")
+        return sample
+
+    def _poll(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                # no state yet, or a dropped packet: keep the last sample
+                self.errors += 1
+                if self.errors == 1:
+                    print(f"Telemetry read failed: {e}")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._poll, name="TelemetryThread",
+                                            daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def latest(self):
+        """The newest ``Telemetry`` sample, or ``None`` before the first one."""
+        with self._lock:
+            return self._latest
+
+    def get(self, field, max_age=None):
+        limit = self.max_age.get(field, 1.0) if max_age is None else max_age
+        sample = self.latest()
+        if sample is None:
+            raise StaleTelemetry(f"No telemetry received yet for {field}")
+        if sample.age > limit:
+            raise StaleTelemetry(f"{field} is {sample.age:.1f}s old (limit {limit}s)")
+        value = getattr(sample, field)
+        if value is None:
+            raise StaleTelemetry(f"The state stream carries no {field} reading")
+        return value
+
+    def battery(self, max_age=None) -> int:
+        return self.get("battery", max_age)